@@ -1,4 +1,8 @@
 VERSION = "0.1.5-alpha" # Updated version
 
-from .core.logger import get_logger, setup_logging
-from .core.config_manager import ConfigManager
+# Re-exports are resolved on first use so `import akita_ares` (CLI --version, configtest) stays cheap
+_LAZY = {'get_logger': '.core.logger', 'setup_logging': '.core.logger', 'ConfigManager': '.core.config_manager'}
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib; value = getattr(importlib.import_module(_LAZY[name], __name__), name); globals()[name] = value; return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,4 @@
-import argparse, os, sys, json 
+import argparse, os, sys 
 from akita_ares import VERSION 
 DEFAULT_CONFIG_PATH_CLI = os.path.join(os.path.dirname(__file__),"..","..","examples","sample_config.json")
 DEFAULT_SCHEMA_PATH_CLI = os.path.join(os.path.dirname(__file__),"..","..","examples","config_schema.json")
@@ -16,21 +16,16 @@ def parse_args(args=None):
     status_parser = subparsers.add_parser('status', help="Show ARES status (NI).")
     status_parser.set_defaults(func=handle_status_command)
     args_list = args if args is not None else sys.argv[1:]
-    if not any(cmd in args_list for cmd in subparsers.choices): args_list.insert(0,'start')
+    if not any(cmd in args_list for cmd in subparsers.choices): args_list = list(args_list) + ['start'] # after global options, so --version/--config still parse
     parsed_args = parser.parse_args(args_list)
     return parsed_args
 def handle_start_command(args, app_class): print(f"CLI: Preparing to start ARES...") 
 def handle_configtest_command(args, app_class):
-    from akita_ares.core.config_manager import ConfigManager; from akita_ares.core.logger import setup_logging, get_logger; import jsonschema
+    from akita_ares.core.config_manager import ConfigManager; from akita_ares.core.logger import setup_logging, get_logger
     setup_logging(level=args.loglevel or 'INFO', console_output=True, log_file=None); logger = get_logger("ConfigTest"); logger.info("Performing config test...")
-    cfg_path = args.config or DEFAULT_CONFIG_PATH_CLI; schema_path = args.schema; pre_conf={}
-    if not schema_path:
-        try:
-            if os.path.exists(cfg_path):
-                with open(cfg_path,'r') as f: pre_conf=json.load(f)
-                schema_path=pre_conf.get('ares_core',{}).get('config_schema_path')
-        except Exception: pass
-        if not schema_path: schema_path=DEFAULT_SCHEMA_PATH_CLI
+    cfg_path = args.config or DEFAULT_CONFIG_PATH_CLI; schema_path = args.schema
+    manager = ConfigManager(config_fp=cfg_path, schema_fp=None, validate_on_load=False); pre_conf = manager.get_config() # single parse; validated below
+    if not schema_path: schema_path=pre_conf.get('ares_core',{}).get('config_schema_path') or DEFAULT_SCHEMA_PATH_CLI
     if not os.path.isabs(schema_path) and '~' not in schema_path:
          if args.schema: pass 
          elif pre_conf.get('ares_core',{}).get('config_schema_path'): schema_path=os.path.join(os.path.dirname(cfg_path),schema_path)
@@ -40,13 +35,12 @@ def handle_configtest_command(args, app_class):
     elif schema_path: logger.warning(f"Schema file not found: {os.path.expanduser(schema_path)}.")
     else: logger.info("No schema specified.")
     try:
-        manager = ConfigManager(config_fp=cfg_path, schema_fp=schema_path)
+        manager.set_schema(schema_path)
         if not manager.config and os.path.exists(cfg_path): logger.error("Config test FAILED: File exists but failed load/parse."); sys.exit(1)
         elif not os.path.exists(cfg_path): logger.error(f"Config test FAILED: File not found: {cfg_path}"); sys.exit(1)
         if manager.schema: logger.info("Config test successful: Parsed and validated.")
         else: logger.info("Config test successful: Parsed (schema validation skipped/failed load).")
         sys.exit(0)
-    except jsonschema.exceptions.ValidationError as e: logger.error(f"Config validation FAILED: {e.message} path {list(e.path)}"); sys.exit(1)
     except Exception as e: logger.error(f"Config test FAILED: {e}"); sys.exit(1)
 def handle_status_command(args, app_class): print("CLI: 'status' command recognized (Not Implemented).")
 if __name__ == "__main__":
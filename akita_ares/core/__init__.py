@@ -1,3 +1,11 @@
-from .config_manager import ConfigManager
 from .logger import get_logger, setup_logging, update_module_log_levels
-from .circuit_breaker import CircuitBreaker, CircuitBreakerOpenException
+from .circuit_breaker import CircuitBreaker, CircuitBreakerOpenException, CircuitBreakerRegistry
+from .retry_budget import RetryBudget
+from .deadline import Deadline, DeadlineExceededException, deadline_scope, current_deadline
+from .tracing import Tracer, Span
+
+def __getattr__(name):
+    # ConfigManager pulls in jsonschema's validator machinery; only load it when asked for
+    if name == 'ConfigManager':
+        from .config_manager import ConfigManager; globals()[name] = ConfigManager; return ConfigManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,7 +1,10 @@
 import time
 import logging
+import threading
+from collections import deque
 from enum import Enum
 from akita_ares.core.logger import get_logger
+from akita_ares.core.deadline import DeadlineExceededException, current_deadline
 
 logger = get_logger("CircuitBreaker")
 
@@ -13,7 +16,13 @@ class CircuitBreakerState(Enum):
 
 
 class CircuitBreaker:
-    """Simple circuit breaker.
+    """Thread-safe circuit breaker.
+
+    Opens after `failure_threshold` consecutive failures, or when at least
+    `min_calls` of the last `window_size` calls were recorded and their failure
+    rate reaches `failure_rate_threshold` (None disables the rate trigger).
+    After `recovery_timeout_seconds` a single trial call is let through
+    (HALF_OPEN); concurrent callers are rejected until the trial resolves.
 
     Attributes expected by tests:
       - state: CircuitBreakerState
@@ -22,86 +31,252 @@ class CircuitBreaker:
       - recovery_timeout_seconds: float
     """
 
-    def __init__(self, failure_threshold: int, recovery_timeout_seconds: float, name: str = "DefCB"):
+    __slots__ = ("failure_threshold", "recovery_timeout_seconds", "name", "failure_rate_threshold", "min_calls",
+                 "state", "failure_count", "last_failure_time", "last_activity", "_window", "_window_failures",
+                 "_trial_started", "_lock")
+
+    def __init__(self, failure_threshold: int, recovery_timeout_seconds: float, name: str = "DefCB",
+                 failure_rate_threshold=None, window_size: int = 20, min_calls: int = 10):
         self.failure_threshold = int(failure_threshold)
         self.recovery_timeout_seconds = float(recovery_timeout_seconds)
         self.name = name
+        self.failure_rate_threshold = float(failure_rate_threshold) if failure_rate_threshold is not None else None
+        self.min_calls = int(min_calls)
 
         self.state = CircuitBreakerState.CLOSED
         self.failure_count = 0
         self.last_failure_time = None
+        self.last_activity = time.monotonic()
+        self._window = deque(maxlen=int(window_size))
+        self._window_failures = 0
+        self._trial_started = None
+        self._lock = threading.Lock()
 
-        logger.info(f"CB '{self.name}' init: thr={self.failure_threshold}, t/o={self.recovery_timeout_seconds}s")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"CB '{self.name}' init: thr={self.failure_threshold}, rate={self.failure_rate_threshold}, t/o={self.recovery_timeout_seconds}s")
 
     def execute(self, func, *args, **kwargs):
         """Execute `func`. Behavior:
         - If OPEN and recovery timeout hasn't elapsed -> raise CircuitBreakerOpenException
-        - If OPEN and timeout elapsed -> move to HALF_OPEN and try one call
-        - In HALF_OPEN a failure re-opens the circuit, success closes it
-        - In CLOSED failures increment failure_count and open circuit when threshold reached
+        - If OPEN and timeout elapsed -> move to HALF_OPEN and let exactly one trial call through
+        - In HALF_OPEN a failure re-opens the circuit, success closes it; other callers are rejected meanwhile
+        - In CLOSED failures increment failure_count and open circuit when a threshold is reached
+        - If the enclosing `deadline_scope` has already expired -> raise DeadlineExceededException
+          without calling `func`; deadline misses are the caller's budget and never count as failures
         """
-        # If OPEN, check timeout
-        if self.state == CircuitBreakerState.OPEN:
-            if self.last_failure_time and (time.monotonic() - self.last_failure_time) > self.recovery_timeout_seconds:
-                self._to_half_open()
-            else:
-                raise CircuitBreakerOpenException(f"CB '{self.name}' is OPEN")
-
-        # HALF_OPEN: single trial
-        if self.state == CircuitBreakerState.HALF_OPEN:
-            try:
-                result = func(*args, **kwargs)
-            except Exception as exc:
-                self._record_failure()
-                logger.error(f"CB '{self.name}' HALF_OPEN trial failed: {exc}")
-                raise
-            else:
-                self._record_success()
-                return result
-
-        # CLOSED: normal operation
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceededException(f"CB '{self.name}' call skipped: deadline expired")
+        if not self.allow_request():
+            raise CircuitBreakerOpenException(f"CB '{self.name}' is {self.state.value}")
         try:
             result = func(*args, **kwargs)
-        except Exception:
-            self._record_failure()
-            logger.warning(f"CB '{self.name}' caught exception; failure_count={self.failure_count}")
+        except DeadlineExceededException:
+            self.release_trial()
+            raise
+        except Exception as exc:
+            self.record_failure()
+            logger.warning(f"CB '{self.name}' caught exception ({exc.__class__.__name__}); failure_count={self.failure_count}")
             raise
-        else:
-            # on success while CLOSED, reset failure_count
-            if self.state == CircuitBreakerState.CLOSED and self.failure_count > 0:
-                self.failure_count = 0
-                self.last_failure_time = None
-                logger.info(f"CB '{self.name}' success — failure counter reset")
-            return result
-
-    # --- internal helpers -------------------------------------------------
-    def _record_success(self):
-        if self.state == CircuitBreakerState.HALF_OPEN:
-            self._to_closed()
-        elif self.state == CircuitBreakerState.CLOSED:
-            self.failure_count = 0
-            self.last_failure_time = None
-
-    def _record_failure(self):
-        self.failure_count += 1
-        self.last_failure_time = time.monotonic()
-        logger.warning(f"CB '{self.name}' failure. Count: {self.failure_count}/{self.failure_threshold}")
-        if self.failure_count >= self.failure_threshold and self.state != CircuitBreakerState.OPEN:
-            self._to_open()
+        self.record_success()
+        return result
+
+    def allow_request(self) -> bool:
+        """Return True if a call may proceed now. In HALF_OPEN only the single trial caller gets True."""
+        state = self.state
+        if state is CircuitBreakerState.CLOSED:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if self.state is CircuitBreakerState.OPEN:
+                if self.last_failure_time is None or (now - self.last_failure_time) <= self.recovery_timeout_seconds:
+                    return False
+                self._to_half_open()
+            if self.state is CircuitBreakerState.HALF_OPEN:
+                # A trial that never reported back (caller died) must not wedge the breaker forever
+                if self._trial_started is not None and (now - self._trial_started) <= self.recovery_timeout_seconds:
+                    return False
+                self._trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.last_activity = time.monotonic()
+            if self.state is CircuitBreakerState.HALF_OPEN:
+                self._to_closed()
+            elif self.state is CircuitBreakerState.CLOSED:
+                self._push_outcome(False)
+                if self.failure_count > 0:
+                    self.failure_count = 0
+                    self.last_failure_time = None
+                    logger.info(f"CB '{self.name}' success — failure counter reset")
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self.failure_count += 1
+            self.last_failure_time = now
+            self.last_activity = now
+            if self.state is CircuitBreakerState.HALF_OPEN:
+                logger.error(f"CB '{self.name}' HALF_OPEN trial failed")
+                self._to_open()
+                return
+            if self.state is CircuitBreakerState.OPEN:
+                return
+            self._push_outcome(True)
+            logger.warning(f"CB '{self.name}' failure. Count: {self.failure_count}/{self.failure_threshold}")
+            if self.failure_count >= self.failure_threshold or self._rate_tripped():
+                self._to_open()
+
+    def release_trial(self):
+        """Give up a HALF_OPEN trial slot without recording an outcome."""
+        with self._lock:
+            self._trial_started = None
+
+    def reconfigure(self, failure_threshold, recovery_timeout_seconds, failure_rate_threshold=None, window_size=20, min_calls=10):
+        """Apply new settings in place, keeping the current state and the most recent `window_size` outcomes."""
+        with self._lock:
+            self.failure_threshold = int(failure_threshold)
+            self.recovery_timeout_seconds = float(recovery_timeout_seconds)
+            self.failure_rate_threshold = float(failure_rate_threshold) if failure_rate_threshold is not None else None
+            self.min_calls = int(min_calls)
+            if int(window_size) != self._window.maxlen:
+                self._window = deque(self._window, maxlen=int(window_size))
+                self._window_failures = sum(self._window)
+
+    def failure_rate(self):
+        """Failure rate over the sliding window, or None until `min_calls` calls were seen."""
+        n = len(self._window)
+        return self._window_failures / n if n and n >= self.min_calls else None
+
+    # --- internal helpers (caller holds self._lock) -----------------------
+    def _push_outcome(self, failed: bool):
+        if len(self._window) == self._window.maxlen and self._window[0]:
+            self._window_failures -= 1
+        self._window.append(failed)
+        if failed:
+            self._window_failures += 1
+
+    def _rate_tripped(self) -> bool:
+        if self.failure_rate_threshold is None:
+            return False
+        rate = self.failure_rate()
+        return rate is not None and rate >= self.failure_rate_threshold
+
+    def _reset_window(self):
+        self._window.clear()
+        self._window_failures = 0
 
     def _to_closed(self):
         logger.info(f"CB '{self.name}' -> CLOSED")
         self.state = CircuitBreakerState.CLOSED
         self.failure_count = 0
         self.last_failure_time = None
+        self._trial_started = None
+        self._reset_window()
 
     def _to_open(self):
         logger.warning(f"CB '{self.name}' -> OPEN for {self.recovery_timeout_seconds}s")
         self.state = CircuitBreakerState.OPEN
+        self._trial_started = None
+        self._reset_window()
 
     def _to_half_open(self):
         logger.info(f"CB '{self.name}' -> HALF_OPEN")
         self.state = CircuitBreakerState.HALF_OPEN
+        self._trial_started = None
+
+
+class CircuitBreakerRegistry:
+    """Breakers keyed by destination hash, proxy route alias, etc.
+
+    Breakers are created lazily on the first recorded failure; keys that have
+    never failed cost a single dict lookup. `update_config` applies new
+    settings to existing breakers too, without resetting their state. Idle CLOSED breakers are evicted
+    by `evict_idle`, and the least recently active ones are dropped once
+    `max_breakers` is exceeded.
+    """
+
+    def __init__(self, config=None):
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.update_config(config or {})
+
+    def update_config(self, config):
+        self.failure_threshold = config.get('failure_threshold', 5)
+        self.recovery_timeout_seconds = config.get('recovery_timeout_seconds', 30)
+        self.failure_rate_threshold = config.get('failure_rate_threshold', 0.5)
+        self.window_size = config.get('window_size', 20)
+        self.min_calls = config.get('min_calls', 10)
+        self.max_breakers = config.get('max_breakers', 1024)
+        self.idle_eviction_seconds = config.get('idle_eviction_seconds', 600)
+        for cb in list(self._breakers.values()):
+            cb.reconfigure(self.failure_threshold, self.recovery_timeout_seconds, failure_rate_threshold=self.failure_rate_threshold,
+                           window_size=self.window_size, min_calls=self.min_calls)
+        logger.info(f"CB registry cfg: thr={self.failure_threshold}, rate={self.failure_rate_threshold}, max={self.max_breakers}")
+
+    def __len__(self):
+        return len(self._breakers)
+
+    def get(self, key) -> CircuitBreaker:
+        """Return the breaker for `key`, creating it if needed."""
+        cb = self._breakers.get(key)
+        if cb is None:
+            with self._lock:
+                cb = self._breakers.get(key)
+                if cb is None:
+                    if len(self._breakers) >= self.max_breakers:
+                        self._evict_lru()
+                    cb = CircuitBreaker(self.failure_threshold, self.recovery_timeout_seconds, name=str(key),
+                                        failure_rate_threshold=self.failure_rate_threshold, window_size=self.window_size, min_calls=self.min_calls)
+                    self._breakers[key] = cb
+        return cb
+
+    def peek(self, key):
+        return self._breakers.get(key)
+
+    def allow_request(self, key) -> bool:
+        cb = self._breakers.get(key)
+        return True if cb is None else cb.allow_request()
+
+    def record_success(self, key):
+        cb = self._breakers.get(key)
+        if cb is not None:
+            cb.record_success()
+
+    def record_failure(self, key):
+        self.get(key).record_failure()
+
+    def release_trial(self, key):
+        cb = self._breakers.get(key)
+        if cb is not None:
+            cb.release_trial()
+
+    def discard(self, key):
+        """Forget the breaker for `key` (e.g. a route whose target changed)."""
+        with self._lock:
+            self._breakers.pop(key, None)
+
+    def evict_idle(self) -> int:
+        """Drop CLOSED breakers with no failures that have been idle past `idle_eviction_seconds`."""
+        cutoff = time.monotonic() - self.idle_eviction_seconds
+        with self._lock:
+            stale = [k for k, cb in self._breakers.items()
+                     if cb.state is CircuitBreakerState.CLOSED and cb.failure_count == 0 and cb.last_activity < cutoff]
+            for k in stale:
+                del self._breakers[k]
+        if stale:
+            logger.debug(f"CB registry evicted {len(stale)} idle breakers ({len(self._breakers)} left)")
+        return len(stale)
+
+    def states(self):
+        return {k: cb.state.value for k, cb in list(self._breakers.items())}
+
+    def _evict_lru(self):
+        # Prefer healthy breakers; an OPEN one is only dropped if everything is open
+        victims = sorted(self._breakers.items(), key=lambda kv: (kv[1].state is not CircuitBreakerState.CLOSED, kv[1].last_activity))
+        for k, _ in victims[:max(1, len(self._breakers) - self.max_breakers + 1)]:
+            del self._breakers[k]
 
 
 class CircuitBreakerOpenException(Exception):
@@ -0,0 +1,67 @@
+from collections import namedtuple
+
+SectionDiff = namedtuple("SectionDiff", ["added", "removed", "changed"])  # {key: new}, {key: old}, {key: (old, new)}
+ListDiff = namedtuple("ListDiff", ["added", "removed", "changed"])  # {id: new}, {id: old}, {id: (old, new)}
+
+
+class ConfigDiff:
+    """Per-section, per-key difference between two loaded configs.
+
+    Top-level values that are dicts are diffed key by key; anything else
+    (including a section that is not a dict) is treated as a single key named
+    by the section itself. Values are compared with ==, so a list such as
+    `proxy_routes` shows up as one changed key; use `diff_keyed_list` to break
+    it down further.
+    """
+
+    def __init__(self, old, new):
+        old = old or {}
+        new = new or {}
+        self.sections = {}
+        for name in set(old) | set(new):
+            o, n = old.get(name), new.get(name)
+            if o == n:
+                continue
+            if isinstance(o, dict) or isinstance(n, dict):
+                o = o if isinstance(o, dict) else {}
+                n = n if isinstance(n, dict) else {}
+                sd = SectionDiff({k: n[k] for k in n.keys() - o.keys()}, {k: o[k] for k in o.keys() - n.keys()},
+                                 {k: (o[k], n[k]) for k in o.keys() & n.keys() if o[k] != n[k]})
+            else:
+                sd = SectionDiff({}, {}, {name: (o, n)})
+            self.sections[name] = sd
+
+    def __bool__(self):
+        return bool(self.sections)
+
+    def __contains__(self, section):
+        return section in self.sections
+
+    def section(self, name) -> SectionDiff:
+        return self.sections.get(name, SectionDiff({}, {}, {}))
+
+    def changed_keys(self, name) -> set:
+        sd = self.section(name)
+        return set(sd.added) | set(sd.removed) | set(sd.changed)
+
+    def only_changed(self, name, keys) -> bool:
+        """True if section `name` changed and every changed key is in `keys`."""
+        changed = self.changed_keys(name)
+        return bool(changed) and changed <= set(keys)
+
+    def describe(self):
+        """One human-readable line per changed key, for logging."""
+        lines = []
+        for name, sd in sorted(self.sections.items()):
+            lines += [f"{name}.{k}: added" for k in sorted(sd.added)]
+            lines += [f"{name}.{k}: removed" for k in sorted(sd.removed)]
+            lines += [f"{name}.{k}: {o!r} -> {n!r}" for k, (o, n) in sorted(sd.changed.items())]
+        return lines
+
+
+def diff_keyed_list(old, new, key):
+    """Diff two lists of dicts identified by `key` (e.g. proxy routes by alias)."""
+    o = {item.get(key): item for item in old or [] if isinstance(item, dict)}
+    n = {item.get(key): item for item in new or [] if isinstance(item, dict)}
+    return ListDiff({k: n[k] for k in n.keys() - o.keys()}, {k: o[k] for k in o.keys() - n.keys()},
+                    {k: (o[k], n[k]) for k in o.keys() & n.keys() if o[k] != n[k]})
@@ -1,29 +1,46 @@
 import json, os
-from jsonschema import validate, exceptions as jsonschema_exceptions
 from .logger import get_logger
+from .config_diff import ConfigDiff
 logger = get_logger("ConfigManager")
+def _jsonschema():
+    import jsonschema.validators  # deferred: costs more than the rest of startup, and only needed when a schema is in use
+    return jsonschema
 class ConfigManager:
     def __init__(self, config_fp, schema_fp=None, validate_on_load=True):
         self.config_fp=os.path.expanduser(config_fp); self.schema_path=os.path.expanduser(schema_fp) if schema_fp else None
-        self.config={}; self.schema=None; self.validate_on_load=validate_on_load
+        self.config={}; self.schema=None; self._validator=None; self.validate_on_load=validate_on_load; self.last_diff=ConfigDiff({}, {})
         if self.schema_path and os.path.exists(self.schema_path): self._load_schema()
         self.load_config()
+    def set_schema(self, schema_fp):
+        """Attach a schema after the config was loaded without one, and validate the already-parsed config against it.
+
+        Lets callers read `ares_core.config_schema_path` from the config and then validate, without parsing the file twice.
+        A config that fails validation is discarded, as it would have been by loading with the schema.
+        """
+        self.schema_path = os.path.expanduser(schema_fp) if schema_fp else None; self.schema = None; self._validator = None; self.validate_on_load = True
+        if not (self.schema_path and os.path.exists(self.schema_path)): return
+        self._load_schema()
+        if self.schema and self.config:
+            try: self.validate_config_schema(self.config)
+            except _jsonschema().exceptions.ValidationError as e: logger.error(f"Config validation err: {e.message} (Path:{list(e.path)})"); self.config = {}
     def _load_schema(self):
         logger.debug(f"Loading schema: {self.schema_path}")
         try:
             with open(self.schema_path,'r') as f: self.schema=json.load(f)
+            cls=_jsonschema().validators.validator_for(self.schema); cls.check_schema(self.schema); self._validator=cls(self.schema)  # compiled once, reused on every reload
             logger.info(f"Schema loaded: {self.schema_path}")
-        except Exception as e: logger.error(f"Err loading schema {self.schema_path}: {e}"); self.schema=None
+        except Exception as e: logger.error(f"Err loading schema {self.schema_path}: {e}"); self.schema=None; self._validator=None
     def load_config(self):
         logger.debug(f"Loading config: {self.config_fp}")
         tmp_cfg={}
         try:
             if not os.path.exists(self.config_fp): logger.error(f"Config file not found: {self.config_fp}"); self.config={}; return
             with open(self.config_fp,'r') as f: tmp_cfg=json.load(f)
-            if self.schema and self.validate_on_load: self.validate_config_schema(tmp_cfg)
+            if self.schema and self.validate_on_load:
+                try: self.validate_config_schema(tmp_cfg)
+                except _jsonschema().exceptions.ValidationError as e: logger.error(f"Config validation err: {e.message} (Path:{list(e.path)})"); self._handle_load_fail(); return
             self.config=tmp_cfg; logger.info(f"Config loaded: {self.config_fp}")
         except json.JSONDecodeError as e: logger.error(f"JSON decode err in {self.config_fp}: {e}"); self._handle_load_fail()
-        except jsonschema_exceptions.ValidationError as e: logger.error(f"Config validation err: {e.message} (Path:{list(e.path)})"); self._handle_load_fail()
         except IOError as e: logger.error(f"IOError reading {self.config_fp}: {e}"); self._handle_load_fail()
         except Exception as e: logger.error(f"Unexpected err loading config: {e}"); self._handle_load_fail()
     def _handle_load_fail(self):
@@ -39,12 +56,14 @@ class ConfigManager:
             return
 
         logger.debug("Validating config vs schema...")
-        validate(instance=cfg_data, schema=self.schema)
+        self._validator.validate(cfg_data)
         logger.info("Config schema validation OK.")
     def get_config(self): return self.config
     def get_section(self, sec_name, default=None): return self.config.get(sec_name,default if default is not None else {})
     def reload_config(self):
-        logger.info(f"Reloading config: {self.config_fp}..."); old_chk=hash(json.dumps(self.config,sort_keys=True))
-        self.load_config(); new_chk=hash(json.dumps(self.config,sort_keys=True))
-        logger.info("Config changed after reload.") if old_chk!=new_chk else logger.info("Config unchanged after reload.")
+        """Re-read the config file; the per-section/key changes are left in `last_diff` (empty if nothing changed or the load failed)."""
+        logger.info(f"Reloading config: {self.config_fp}..."); old_cfg=self.config
+        self.load_config(); self.last_diff=ConfigDiff(old_cfg, self.config)
+        if self.last_diff: logger.info(f"Config changed after reload: {'; '.join(self.last_diff.describe())}")
+        else: logger.info("Config unchanged after reload.")
         return self.get_config()
@@ -0,0 +1,71 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_deadline = ContextVar("ares_deadline", default=None)
+
+
+class DeadlineExceededException(Exception):
+    pass
+
+
+class Deadline:
+    """Absolute point on the monotonic clock by which an operation must finish.
+
+    Deadlines cross process boundaries as a relative remaining-time in
+    milliseconds (see `to_wire_ms` / `from_wire_ms`), so peers do not need
+    synchronised clocks.
+    """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, timeout_s: float):
+        self.expires_at = time.monotonic() + float(timeout_s)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def cap(self, timeout_s=None) -> float:
+        """Shrink `timeout_s` to the remaining time (or return remaining time if `timeout_s` is None)."""
+        rem = self.remaining()
+        return rem if timeout_s is None else min(float(timeout_s), rem)
+
+    def to_wire_ms(self) -> int:
+        return int(self.remaining() * 1000)
+
+    @classmethod
+    def from_wire_ms(cls, remaining_ms):
+        return cls(float(remaining_ms) / 1000.0)
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.3f}s)"
+
+
+def earliest(*deadlines):
+    """Return the earliest of the given deadlines, ignoring None (None if all are None)."""
+    live = [d for d in deadlines if d is not None]
+    return min(live, key=lambda d: d.expires_at) if live else None
+
+
+def current_deadline():
+    """The deadline bound to the current context by `deadline_scope`, if any."""
+    return _current_deadline.get()
+
+
+def effective_deadline(deadline=None, timeout_s=None):
+    """Combine an explicit deadline, a local timeout and the context deadline into the earliest one."""
+    return earliest(deadline, Deadline(timeout_s) if timeout_s is not None else None, _current_deadline.get())
+
+
+@contextmanager
+def deadline_scope(timeout_s=None, deadline=None):
+    """Bind a deadline for the enclosed block. Nested scopes can only shorten the inherited deadline."""
+    eff = effective_deadline(deadline, timeout_s)
+    token = _current_deadline.set(eff)
+    try:
+        yield eff
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,53 @@
+class SpaceSaving:
+    """Space-Saving heavy-hitters sketch (Metwally et al.) over at most `capacity` keys.
+
+    Memory is bounded by `capacity` no matter how many distinct keys are
+    offered. Counts are over-estimates by at most the key's `error`, and any
+    key whose true frequency exceeds total/capacity is guaranteed to be
+    tracked. Not thread-safe; callers serialise access.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self.total = 0
+        self._counts = {}  # key -> [count, error]
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, key):
+        return key in self._counts
+
+    def offer(self, key, n: int = 1):
+        """Count `n` occurrences of `key`. Returns the key evicted to make room, if any."""
+        self.total += n
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += n
+            return None
+        if len(self._counts) < self.capacity:
+            self._counts[key] = [n, 0]
+            return None
+        victim = min(self._counts, key=lambda k: self._counts[k][0])
+        floor = self._counts.pop(victim)[0]
+        self._counts[key] = [floor + n, floor]
+        return victim
+
+    def count(self, key) -> int:
+        entry = self._counts.get(key)
+        return entry[0] if entry else 0
+
+    def top(self, k: int):
+        """The `k` heaviest keys as [(key, count, error)], heaviest first."""
+        ranked = sorted(self._counts.items(), key=lambda kv: kv[1][0], reverse=True)[:k]
+        return [(key, c, e) for key, (c, e) in ranked]
+
+    def resize(self, capacity: int):
+        """Change capacity; shrinking drops the lightest keys. Returns the dropped keys."""
+        self.capacity = max(1, int(capacity))
+        dropped = []
+        if len(self._counts) > self.capacity:
+            for key, _, _ in self.top(len(self._counts))[self.capacity:]:
+                del self._counts[key]
+                dropped.append(key)
+        return dropped
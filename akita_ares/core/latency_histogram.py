@@ -0,0 +1,95 @@
+import math
+import threading
+
+
+class LogLinearHistogram:
+    """HDR-style latency histogram with bounded relative error.
+
+    Values (seconds) are bucketed in units of `lowest_s`. Below `sub_buckets`
+    units buckets are linear; above that every power of two is split into
+    `sub_buckets` linear slots, so the relative error of any reported
+    percentile is at most 1/sub_buckets (~6% by default) across the whole
+    `lowest_s`..`highest_s` range. Larger values are clamped into the last
+    bucket; min/max/sum stay exact. Recording is O(1) with no allocation.
+    """
+
+    def __init__(self, lowest_s: float = 1e-5, highest_s: float = 600.0, sub_buckets: int = 16):
+        self.lowest_s = float(lowest_s)
+        self.highest_s = float(highest_s)
+        self._sub_bits = max(1, int(sub_buckets - 1).bit_length())
+        self.sub_buckets = 1 << self._sub_bits
+        self._counts = [0] * (self._index(self.highest_s / self.lowest_s) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def record(self, value_s: float):
+        if value_s < 0:
+            value_s = 0.0
+        idx = min(self._index(value_s / self.lowest_s), len(self._counts) - 1)
+        with self._lock:
+            self._counts[idx] += 1
+            self.count += 1
+            self.sum += value_s
+            if self.min is None or value_s < self.min:
+                self.min = value_s
+            if self.max is None or value_s > self.max:
+                self.max = value_s
+
+    def percentile(self, q: float, default=None):
+        """Value at percentile `q` (0-100): the bucket midpoint clamped to the observed min/max (max for the overflow bucket)."""
+        with self._lock:
+            if not self.count:
+                return default
+            rank = max(1, math.ceil(q / 100.0 * self.count))
+            seen = 0
+            for idx, c in enumerate(self._counts):
+                seen += c
+                if seen >= rank:
+                    if idx == len(self._counts) - 1:
+                        return self.max  # overflow bucket holds everything clamped above highest_s
+                    lo, hi = self._bounds(idx)
+                    return min(max((lo + hi) / 2.0, self.min), self.max)
+            return self.max
+
+    def cumulative_counts(self, upper_bounds):
+        """[(bound, observations <= bound)] for ascending `upper_bounds`, e.g. to export coarse Prometheus buckets.
+
+        A fine bucket is counted under a bound once its upper edge fits, so counts may lag by one fine bucket.
+        """
+        with self._lock:
+            counts = list(self._counts)
+        out, seen, idx = [], 0, 0
+        for bound in upper_bounds:
+            while idx < len(counts) and self._bounds(idx)[1] <= bound:
+                seen += counts[idx]
+                idx += 1
+            out.append((bound, seen))
+        return out
+
+    def summary(self, percentiles=(50, 90, 99)) -> dict:
+        out = {'count': self.count, 'min': self.min, 'max': self.max, 'mean': self.sum / self.count if self.count else None}
+        for q in percentiles:
+            out[f'p{q:g}'] = self.percentile(q)
+        return out
+
+    # --- internal helpers -------------------------------------------------
+    def _index(self, units: float) -> int:
+        if units < self.sub_buckets:
+            return int(units)
+        mantissa, exp = math.frexp(units)  # units = mantissa * 2**exp, mantissa in [0.5, 1)
+        return ((exp - self._sub_bits) << self._sub_bits) + int((mantissa * 2.0 - 1.0) * self.sub_buckets)
+
+    def _bounds(self, idx: int):
+        """(lower, upper) edge of bucket `idx` in seconds."""
+        if idx < self.sub_buckets:
+            return idx * self.lowest_s, (idx + 1) * self.lowest_s
+        exp, sub = divmod(idx, self.sub_buckets)
+        width = 1 << (exp - 1)
+        lo = (self.sub_buckets + sub) * width
+        return lo * self.lowest_s, (lo + width) * self.lowest_s
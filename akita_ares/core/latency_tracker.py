@@ -0,0 +1,37 @@
+import threading
+import time
+from collections import deque
+
+
+class LatencyTracker:
+    """Sliding window of recent latency samples with percentile lookup.
+
+    Keeps the last ``window`` samples; the sorted view is rebuilt lazily on the
+    first percentile query after new samples arrive.
+    """
+
+    def __init__(self, window: int = 256):
+        self._samples = deque(maxlen=int(window))
+        self._sorted = None
+        self._lock = threading.Lock()
+        self.last_activity = time.monotonic()
+
+    def record(self, value_s: float):
+        with self._lock:
+            self._samples.append(float(value_s))
+            self._sorted = None
+            self.last_activity = time.monotonic()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float, default=None):
+        """Return the ``q``-th percentile (0-100) of the window, or ``default`` if empty."""
+        with self._lock:
+            if not self._samples:
+                return default
+            if self._sorted is None:
+                self._sorted = sorted(self._samples)
+            data = self._sorted
+        idx = min(len(data) - 1, max(0, int(round(q / 100.0 * (len(data) - 1)))))
+        return data[idx]
@@ -1,7 +1,70 @@
-import logging, logging.handlers, sys, os
-ARES_LOGGER_NAME="ARES"
-def setup_logging(level='INFO',log_file='ares.log',max_bytes=10485760,backup_count=5,console_output=True,module_levels=None):
-    root_logger=logging.getLogger(ARES_LOGGER_NAME)
+import logging, logging.handlers, sys, os, queue, threading, time, atexit
+from .striped_counter import StripedCounter
+ARES_LOGGER_NAME="ARES"; DROP_REASONS=('queue_full','rate_limited')
+_dropped=StripedCounter(); _listener=None; _listener_lock=threading.Lock()
+class RateLimitFilter(logging.Filter):
+    """Per call-site (pathname, lineno) token bucket for repetitive messages.
+
+    Each site may log `rate_per_second` records with bursts up to `burst`. Once a site is over its budget only every
+    `sample_every`-th record gets through, tagged with how many were suppressed since the last one; the rest are
+    counted as dropped (`rate_limited`). WARNING and above are never limited.
+    """
+    MAX_SITES = 4096
+    def __init__(self, rate_per_second=10.0, burst=20, sample_every=100):
+        super().__init__(); self.rate = float(rate_per_second); self.burst = float(burst); self.sample_every = max(1, int(sample_every))
+        self._sites = {}; self._lock = threading.Lock()  # site -> [tokens, last_refill, suppressed]
+    def filter(self, record):
+        if record.levelno >= logging.WARNING: return True
+        decided = getattr(record, '_ares_rate_ok', None)  # shared by several handlers: decide once per record
+        if decided is not None: return decided
+        record._ares_rate_ok = ok = self._admit(record); return ok
+    def _admit(self, record):
+        site = (record.pathname, record.lineno); now = time.monotonic()
+        with self._lock:
+            st = self._sites.get(site)
+            if st is None:
+                if len(self._sites) >= self.MAX_SITES: self._sites.clear()
+                st = self._sites[site] = [self.burst, now, 0]
+            st[0] = min(self.burst, st[0] + (now - st[1]) * self.rate); st[1] = now
+            if st[0] >= 1.0:
+                st[0] -= 1.0; suppressed, st[2] = st[2], 0
+            else:
+                st[2] += 1
+                if st[2] % self.sample_every: _dropped.inc('rate_limited'); return False
+                suppressed, st[2] = st[2] - 1, 0
+        if suppressed: record.msg = f"{record.msg} [{suppressed} similar suppressed]"
+        return True
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record and counts it (`queue_full`).
+
+    Only the message is rendered on the calling thread; timestamps, layout and I/O happen on the listener thread.
+    """
+    def enqueue(self, record):
+        try: self.queue.put_nowait(record)
+        except queue.Full: _dropped.inc('queue_full')  # any logging thread can land here: per-thread cells, no lost increments
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__); record.msg = record.getMessage(); record.args = None
+        if record.exc_info: record.exc_text = logging.Formatter().formatException(record.exc_info); record.exc_info = None
+        return record
+def get_dropped_log_counts(): counts = _dropped.snapshot(); return {reason: counts.get(reason, 0) for reason in DROP_REASONS}
+def shutdown_logging():
+    """Stop the background log writer (if any) after flushing queued records."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            try: _listener.stop()
+            except queue.Full: time.sleep(0.05); _listener.stop()
+            for h in _listener.handlers: h.close()
+            _listener = None
+atexit.register(shutdown_logging)
+def setup_logging(level='INFO',log_file='ares.log',max_bytes=10485760,backup_count=5,console_output=True,module_levels=None,async_output=False,queue_size=10000,rate_limit=None):
+    """Configure the ARES logger tree.
+
+    With `async_output` the console/file handlers run on a background QueueListener behind a bounded, non-blocking
+    queue. `rate_limit` is an optional dict of RateLimitFilter kwargs (rate_per_second, burst, sample_every).
+    """
+    global _listener
+    shutdown_logging(); root_logger=logging.getLogger(ARES_LOGGER_NAME)
     if root_logger.hasHandlers(): root_logger.handlers.clear()
     log_level=getattr(logging,level.upper(),logging.INFO); root_logger.setLevel(log_level)
     formatter=logging.Formatter('%(asctime)s-%(name)s-%(levelname)s-%(module)s:%(lineno)d-%(message)s')
@@ -15,7 +78,13 @@ def setup_logging(level='INFO',log_file='ares.log',max_bytes=10485760,backup_cou
         except Exception as e:
             print(f"CRITICAL: Failed file logger {log_file}: {e}.",file=sys.stderr)
             if not any(isinstance(h,logging.StreamHandler) for h in root_logger.handlers): ch=logging.StreamHandler(sys.stdout); ch.setFormatter(formatter); root_logger.addHandler(ch); print("WARNING: Fallback console logging.",file=sys.stderr)
-    update_module_log_levels(module_levels); root_logger.info(f"ARES logging init. Root Level: {level.upper()}.")
+    if async_output and root_logger.handlers:
+        outputs = list(root_logger.handlers); root_logger.handlers.clear(); qh = DroppingQueueHandler(queue.Queue(maxsize=queue_size)); root_logger.addHandler(qh)
+        with _listener_lock: _listener = logging.handlers.QueueListener(qh.queue, *outputs, respect_handler_level=True); _listener.start()
+    if rate_limit:
+        rl = RateLimitFilter(**rate_limit)
+        for h in root_logger.handlers: h.addFilter(rl)
+    update_module_log_levels(module_levels); root_logger.info(f"ARES logging init. Root Level: {level.upper()}. Async: {bool(async_output)}.")
 def update_module_log_levels(module_levels_dict):
     if not module_levels_dict:
         return
@@ -0,0 +1,73 @@
+import time
+import threading
+from akita_ares.core.logger import get_logger
+
+logger = get_logger("RetryBudget")
+
+
+class RetryBudget:
+    """Token bucket that caps retries to a share of recent successful traffic.
+
+    Each success deposits ``retry_ratio`` tokens and each retry withdraws one,
+    so sustained retry load can never exceed ``retry_ratio`` x successes.
+    ``min_retries_per_second`` trickles in a small floor so quiet operations can
+    still retry, and ``max_tokens`` caps banked credit so the budget reflects
+    recent traffic rather than the whole uptime. The bucket starts full.
+    """
+
+    def __init__(self, retry_ratio: float = 0.1, min_retries_per_second: float = 1.0, max_tokens: float = 10.0, name: str = "DefRB"):
+        self.name = name
+        self._lock = threading.Lock()
+        self.retry_ratio = float(retry_ratio)
+        self.min_retries_per_second = float(min_retries_per_second)
+        self.max_tokens = float(max_tokens)
+        self._tokens = self.max_tokens
+        self._last_refill = time.monotonic()
+        logger.debug(f"RB '{self.name}' init: ratio={self.retry_ratio}, floor={self.min_retries_per_second}/s, max={self.max_tokens}")
+
+    def update(self, retry_ratio: float, min_retries_per_second: float, max_tokens: float):
+        """Apply new limits without discarding the current balance (clamped to the new cap)."""
+        with self._lock:
+            self._refill()
+            self.retry_ratio = float(retry_ratio)
+            self.min_retries_per_second = float(min_retries_per_second)
+            self.max_tokens = float(max_tokens)
+            self._tokens = min(self._tokens, self.max_tokens)
+
+    @property
+    def last_activity(self) -> float:
+        """Monotonic time of the last deposit, withdrawal or balance read."""
+        return self._last_refill
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def deposit(self):
+        """Credit the bucket for one successful execution."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.retry_ratio)
+
+    def try_withdraw(self) -> bool:
+        """Take one token for a retry. Returns False if the budget is spent."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def refund(self):
+        """Return a token taken by `try_withdraw` for a retry that did not happen."""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + 1.0)
+
+    # --- internal helpers -------------------------------------------------
+    def _refill(self):
+        now = time.monotonic()
+        if self.min_retries_per_second > 0:
+            self._tokens = min(self.max_tokens, self._tokens + (now - self._last_refill) * self.min_retries_per_second)
+        self._last_refill = now
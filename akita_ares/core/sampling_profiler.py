@@ -0,0 +1,103 @@
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _thread_names():
+    return {t.ident: t.name for t in threading.enumerate()}
+
+
+def sample_stacks(seconds: float, interval_s: float = 0.005, max_stacks: int = 5000) -> Counter:
+    """Statistical profile of every thread except the caller's.
+
+    Every `interval_s` the stacks from `sys._current_frames()` are folded into
+    `thread;outer;...;inner` keys and counted. At most `max_stacks` distinct
+    stacks are kept; samples of further new stacks are counted under
+    `[truncated]` so memory stays bounded for long captures.
+    """
+    me = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = _thread_names()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            parts = []
+            while frame is not None:
+                parts.append(_frame_label(frame))
+                frame = frame.f_back
+            parts.append(names.get(ident, f"thread-{ident}"))
+            key = ";".join(reversed(parts))
+            if key in stacks or len(stacks) < max_stacks:
+                stacks[key] += 1
+            else:
+                stacks["[truncated]"] += 1
+        time.sleep(interval_s)
+    return stacks
+
+
+def format_collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed-stack format, ready for flamegraph.pl / speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def format_top(stacks: Counter, limit: int = 40) -> str:
+    """pstats-like flat profile from samples: self and cumulative sample counts per function."""
+    own, cum = Counter(), Counter()
+    total = sum(stacks.values()) or 1
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]  # first element is the thread name
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for fn in set(frames):
+            cum[fn] += count
+    lines = [f"{total} samples", f"{'self%':>7} {'cum%':>7}  function"]
+    for fn, _ in cum.most_common(limit):
+        lines.append(f"{100.0 * own[fn] / total:7.2f} {100.0 * cum[fn] / total:7.2f}  {fn}")
+    return "\n".join(lines) + "\n"
+
+
+def thread_dump() -> str:
+    """Current stack of every live thread (including RNS callback threads), like faulthandler but with names."""
+    names = _thread_names()
+    daemon = {t.ident: t.daemon for t in threading.enumerate()}
+    out = []
+    for ident, frame in sorted(sys._current_frames().items()):
+        out.append(f'Thread "{names.get(ident, "?")}" ident={ident} daemon={daemon.get(ident, "?")}\n')
+        out.extend(traceback.format_stack(frame))
+        out.append("\n")
+    return "".join(out)
+
+
+def allocation_top(seconds: float, limit: int = 25, frames: int = 1) -> str:
+    """Top allocation sites by growth over a `seconds` window.
+
+    tracemalloc is only running for the duration of the window (unless it was
+    already tracing, in which case it is left running).
+    """
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+    key = "traceback" if frames > 1 else "lineno"
+    stats = after.compare_to(before, key)[:limit]
+    lines = [f"Top {len(stats)} allocation sites by growth over {seconds:g}s"]
+    lines.extend(str(s) for s in stats)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,190 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from akita_ares.core.logger import get_logger
+
+logger = get_logger("Scheduler")
+
+OVERLAP_SKIP = "skip"          # a run that comes due while the previous one is still going is dropped
+OVERLAP_COALESCE = "coalesce"  # ...is folded into a single extra run right after the current one finishes
+OVERLAP_ALLOW = "allow"        # ...runs concurrently on another worker
+OVERLAP_POLICIES = (OVERLAP_SKIP, OVERLAP_COALESCE, OVERLAP_ALLOW)
+
+
+class _Task:
+    __slots__ = ("name", "fn", "interval_s", "jitter_s", "overlap", "running", "pending", "removed",
+                 "runs", "errors", "skipped", "last_duration", "max_lateness")
+
+    def __init__(self, name, fn, interval_s, jitter_s, overlap):
+        self.name = name
+        self.fn = fn
+        self.interval_s = float(interval_s)
+        self.jitter_s = float(jitter_s)
+        self.overlap = overlap
+        self.running = 0
+        self.pending = False
+        self.removed = False
+        self.runs = self.errors = self.skipped = 0
+        self.last_duration = None
+        self.max_lateness = 0.0
+
+
+class Scheduler:
+    """Heap-based timer scheduler for periodic feature tasks.
+
+    One timer thread sleeps until the earliest due task and hands it to a
+    small worker pool, so a slow task never delays the others. Tasks run at
+    a fixed rate (`interval_s`) plus a random `jitter_s`; when the scheduler
+    falls behind it does not burst to catch up. `stop` wakes the timer thread
+    at once and cancels queued runs. If `metrics_monitor` is set, every run
+    reports its duration, lateness and outcome.
+    """
+
+    def __init__(self, max_workers: int = 4, metrics_monitor=None, name: str = "ARES-Sched"):
+        self.metrics_monitor = metrics_monitor
+        self.name = name
+        self._max_workers = max(1, int(max_workers))
+        self._tasks = {}
+        self._heap = []  # (due, seq, task, base): `due` is `base` plus this run's jitter
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._pool = None
+        self._thread = None
+
+    def add_task(self, name, fn, interval_s, jitter_s=0.0, initial_delay_s=None, overlap=OVERLAP_SKIP):
+        """Register (or replace) task `name`. The first run is after `initial_delay_s`, default one interval."""
+        if interval_s <= 0:
+            raise ValueError(f"Task '{name}' interval must be > 0")
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Task '{name}' overlap must be one of {OVERLAP_POLICIES}")
+        task = _Task(name, fn, interval_s, jitter_s, overlap)
+        delay = task.interval_s if initial_delay_s is None else float(initial_delay_s)
+        with self._cond:
+            old = self._tasks.get(name)
+            if old is not None:
+                old.removed = True
+            self._tasks[name] = task
+            self._push(task, time.monotonic() + delay)
+        logger.debug(f"Task '{name}' every {task.interval_s}s (+{task.jitter_s}s jitter, overlap={overlap})")
+        return task
+
+    def remove_task(self, name):
+        with self._cond:
+            task = self._tasks.pop(name, None)
+            if task is not None:
+                task.removed = True
+
+    def remove_tasks(self, prefix):
+        """Remove every task whose name starts with `prefix` (e.g. when a feature is disabled)."""
+        with self._cond:
+            for name in [n for n in self._tasks if n.startswith(prefix)]:
+                self._tasks.pop(name).removed = True
+
+    def task_names(self):
+        return sorted(self._tasks)
+
+    def stats(self):
+        return {t.name: {'interval_s': t.interval_s, 'runs': t.runs, 'errors': t.errors, 'skipped': t.skipped,
+                         'running': t.running, 'last_duration': t.last_duration, 'max_lateness': t.max_lateness}
+                for t in list(self._tasks.values())}
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=f"{self.name}-worker")
+            self._thread = threading.Thread(target=self._loop, daemon=True, name=self.name)
+            self._thread.start()
+        logger.info(f"Scheduler started with {self._max_workers} workers and {len(self._tasks)} tasks.")
+
+    def stop(self, wait: bool = False):
+        """Stop at once: the timer thread wakes immediately and queued runs are cancelled.
+
+        With `wait`, block until runs already executing have returned.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            thread, pool = self._thread, self._pool
+            self._thread = self._pool = None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+
+    # --- internal helpers -------------------------------------------------
+    def _push(self, task, base):
+        # caller holds self._cond; jitter only shifts this run, the next one is planned from `base`
+        due = base + random.uniform(0.0, task.jitter_s) if task.jitter_s else base
+        heapq.heappush(self._heap, (due, next(self._seq), task, base))
+        self._cond.notify()
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, task, base = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                if task.removed:
+                    continue
+                next_base = base + task.interval_s
+                self._push(task, next_base if next_base > now else now + task.interval_s)
+                self._dispatch(task, now - due)
+
+    def _dispatch(self, task, lateness):
+        # caller holds self._cond
+        task.max_lateness = max(task.max_lateness, lateness)
+        if task.running and task.overlap != OVERLAP_ALLOW:
+            if task.overlap == OVERLAP_COALESCE:
+                task.pending = True
+            else:
+                task.skipped += 1
+                self._report(task, None, lateness, 'skipped')
+            return
+        self._submit(task, lateness)
+
+    def _submit(self, task, lateness):
+        # caller holds self._cond
+        task.running += 1
+        try:
+            self._pool.submit(self._run, task, lateness)
+        except RuntimeError:  # pool shut down under us
+            task.running -= 1
+
+    def _run(self, task, lateness):
+        t0 = time.monotonic()
+        outcome = 'ok'
+        try:
+            task.fn()
+        except Exception as e:
+            outcome = 'error'
+            logger.error(f"Scheduled task '{task.name}' failed: {e}", exc_info=True)
+        duration = time.monotonic() - t0
+        with self._cond:
+            task.running -= 1
+            task.runs += 1
+            task.errors += outcome == 'error'
+            task.last_duration = duration
+            if task.pending and not task.removed and not self._stopped:
+                task.pending = False
+                self._submit(task, 0.0)
+        self._report(task, duration, lateness, outcome)
+
+    def _report(self, task, duration, lateness, outcome):
+        mm = self.metrics_monitor
+        if mm is not None:
+            try:
+                mm.record_scheduled_run(task.name, duration, lateness, outcome)
+            except Exception as e:
+                logger.debug(f"Scheduler metrics report failed: {e}")
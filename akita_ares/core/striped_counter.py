@@ -0,0 +1,57 @@
+import threading
+import weakref
+
+
+class StripedCounter:
+    """Keyed counter whose increments land in a per-thread cell.
+
+    `inc` touches only the calling thread's dict, so hot paths never contend
+    on a shared lock; `snapshot` sums all cells and is meant for the (rare)
+    read side such as a metrics scrape. Cells of threads that have exited are
+    folded into a base total on the next snapshot so short-lived worker
+    threads do not accumulate.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells = []  # [(weakref to owning thread, cell dict)]
+        self._base = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key=(), n=1):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell[key] = cell.get(key, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            live = []
+            for thread_ref, cell in self._cells:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    self._merge(self._base, cell.copy())
+                else:
+                    live.append((thread_ref, cell))
+            self._cells = live
+            total = dict(self._base)
+            for _, cell in live:
+                self._merge(total, cell.copy())  # dict.copy() is atomic under the GIL
+        return total
+
+    def get(self, key=(), default=0):
+        return self.snapshot().get(key, default)
+
+    # --- internal helpers -------------------------------------------------
+    def _new_cell(self):
+        cell = {}
+        self._local.cell = cell
+        with self._lock:
+            self._cells.append((weakref.ref(threading.current_thread()), cell))
+        return cell
+
+    @staticmethod
+    def _merge(into, cell):
+        for k, v in cell.items():
+            into[k] = into.get(k, 0) + v
@@ -0,0 +1,149 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from akita_ares.core.logger import get_logger
+
+logger = get_logger("Tracer")
+
+
+class Span:
+    """One timed step of a sampled request; ending it queues the record for the trace file."""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "sampled", "start", "_t0", "attrs")
+
+    def __init__(self, tracer, name, trace_id, parent_id, sampled, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = time.time()
+        self._t0 = time.monotonic()
+        self.attrs = attrs
+
+    def context(self) -> dict:
+        """Wire form carried in the proxy envelope as `"trace"` (sampled requests only); this span becomes the remote parent."""
+        return {"id": self.trace_id, "span": self.span_id, "sampled": self.sampled}
+
+    def set(self, **attrs):
+        if self.sampled:
+            self.attrs.update(attrs)
+
+    def end(self, **attrs):
+        if not self.sampled or self.tracer is None:
+            return
+        tracer, self.tracer = self.tracer, None  # ending twice records once
+        self.attrs.update(attrs)
+        tracer._emit({"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                      "start": self.start, "duration_ms": round((time.monotonic() - self._t0) * 1000.0, 3), "attrs": self.attrs})
+
+
+class _JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, separators=(",", ":"), default=str)
+
+
+class Tracer:
+    """Head-sampled request tracer writing finished spans to a rotating JSONL file.
+
+    The sampling decision is made once at the root (`sample_rate`) and travels
+    with the context, so a trace is either complete on every node or absent.
+    Finished spans are queued and written by a background QueueListener; when
+    the queue is full spans are dropped and counted rather than blocking the
+    request path.
+    """
+
+    def __init__(self, config=None):
+        self._queue = None
+        self._listener = None
+        self._handler = None
+        self.dropped = 0
+        self.emitted = 0
+        self._lock = threading.Lock()
+        self.update_config(config or {})
+
+    def update_config(self, config):
+        self.enabled = config.get('enabled', False)
+        self.sample_rate = min(1.0, max(0.0, float(config.get('sample_rate', 0.01))))
+        file_cfg = (config.get('file', 'ares_traces.jsonl'), config.get('max_bytes', 10 * 1024 * 1024),
+                    config.get('backup_count', 3), config.get('queue_size', 10000))
+        with self._lock:
+            if self._listener is not None and (not self.enabled or file_cfg != self._file_cfg):
+                self._stop_writer()
+            self._file_cfg = file_cfg
+            if self.enabled and self._listener is None:
+                self._start_writer()
+        logger.info(f"Tracer cfg: enabled={self.enabled}, sample_rate={self.sample_rate}, file={file_cfg[0]}")
+
+    def start_span(self, name, parent=None, **attrs):
+        """Start a span under the wire context `parent`, or a new root subject to `sample_rate`.
+
+        Returns None when tracing is disabled, when the request is not sampled (no Span is built and no
+        context goes on the wire), or when `parent` is malformed.
+        """
+        if not self.enabled:
+            return None
+        if parent is None:
+            if random.random() >= self.sample_rate:
+                return None
+            return Span(self, name, f"{random.getrandbits(128):032x}", None, True, attrs)
+        try:
+            if not parent.get("sampled", True):  # contexts from older clients may still say sampled=false
+                return None
+            return Span(self, name, str(parent["id"]), parent.get("span"), True, attrs)
+        except (TypeError, KeyError, AttributeError):
+            return None
+
+    def stats(self) -> dict:
+        return {'enabled': self.enabled, 'sample_rate': self.sample_rate, 'emitted': self.emitted, 'dropped': self.dropped}
+
+    def shutdown(self):
+        """Flush queued spans and close the trace file."""
+        with self._lock:
+            self._stop_writer()
+
+    # --- internal helpers -------------------------------------------------
+    def _emit(self, record):
+        q = self._queue
+        if q is None:
+            return
+        try:
+            q.put_nowait(logging.makeLogRecord({"msg": record}))
+            self.emitted += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_writer(self):
+        path, max_bytes, backup_count, queue_size = self._file_cfg
+        try:
+            path = os.path.abspath(os.path.expanduser(path))
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        except Exception as e:
+            logger.error(f"Cannot open trace file {path}: {e}. Tracing disabled.")
+            self.enabled = False
+            return
+        self._handler.setFormatter(_JsonLineFormatter())
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._listener = logging.handlers.QueueListener(self._queue, self._handler)
+        self._listener.start()
+
+    def _stop_writer(self):
+        if self._listener is None:
+            return
+        self._queue = None  # new spans are discarded; the listener drains what is already queued
+        while True:
+            try:
+                self._listener.stop()
+                break
+            except queue.Full:  # no room for the stop sentinel yet
+                time.sleep(0.01)
+        self._handler.close()
+        self._listener = self._handler = None
@@ -1,17 +1,162 @@
-from prometheus_client import start_http_server, Gauge, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client import Gauge, Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+import gzip
+import json
 import threading
-from akita_ares.core.logger import get_logger
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from akita_ares.core.logger import get_logger, get_dropped_log_counts
+from akita_ares.core.striped_counter import StripedCounter
+from akita_ares.core.heavy_hitters import SpaceSaving
+from akita_ares.core.latency_histogram import LogLinearHistogram
+from akita_ares.core import sampling_profiler
+OTHER_DESTINATIONS_LABEL = "other"; SKETCH_CAPACITY_FACTOR = 4; GZIP_LEVEL = 6; VARY_ENCODING = {'Vary': 'Accept-Encoding'}
+class _StripedChild:
+    __slots__ = ('_counter', '_key')
+    def __init__(self, counter, key): self._counter = counter; self._key = key
+    def inc(self, amount=1): self._counter.inc(self._key, amount)
+class StripedCounterMetric:
+    """Drop-in for a labelled prometheus Counter on hot paths.
+
+    Increments go to per-thread cells (no lock) and are summed only when the registry is scraped. `labels()`
+    returns a cached child, so steady-state cost is one dict lookup plus one per-thread dict update.
+    """
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self._name = name[:-6] if name.endswith('_total') else name; self._doc = documentation; self._labelnames = tuple(labelnames)
+        self._counts = StripedCounter(); self._children = {}
+        if registry is not None: registry.register(self)
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None: child = self._children.setdefault(values, _StripedChild(self._counts, tuple(str(v) for v in values)))
+        return child
+    def inc(self, amount=1): self._counts.inc((), amount)
+    def describe(self): return [CounterMetricFamily(self._name, self._doc, labels=self._labelnames)]
+    def collect(self):
+        fam = CounterMetricFamily(self._name, self._doc, labels=self._labelnames)
+        for key, val in self._counts.snapshot().items(): fam.add_metric(list(key), val)
+        yield fam
+class TopKDestinationMetric:
+    """Per-destination gauge with bounded series count.
+
+    Destinations are counted in a Space-Saving sketch of `top_k * SKETCH_CAPACITY_FACTOR` slots. Only the `top_k`
+    busiest get their own `destination_hash` series; the remaining tracked ones are averaged into `other`. An
+    estimated-evaluations gauge (`count_name`) is exported the same way. Memory stays constant however many
+    destinations are seen.
+    """
+    def __init__(self, name, documentation, count_name, top_k=50, registry=REGISTRY):
+        self._name = name; self._doc = documentation; self._count_name = count_name; self._lock = threading.Lock()
+        self.top_k = max(1, int(top_k)); self._sketch = SpaceSaving(self.top_k * SKETCH_CAPACITY_FACTOR); self._values = {}
+        if registry is not None: registry.register(self)
+    def set(self, destination_hash, metric_type, value):
+        with self._lock:
+            evicted = self._sketch.offer(destination_hash)
+            if evicted is not None: self._values.pop(evicted, None)
+            self._values.setdefault(destination_hash, {})[metric_type] = value
+    def resize(self, top_k):
+        with self._lock:
+            self.top_k = max(1, int(top_k))
+            for key in self._sketch.resize(self.top_k * SKETCH_CAPACITY_FACTOR): self._values.pop(key, None)
+    def _families(self):
+        return (GaugeMetricFamily(self._name, self._doc, labels=['destination_hash', 'metric_type']),
+                GaugeMetricFamily(self._count_name, 'Estimated path selections per destination (top-K, rest as other)', labels=['destination_hash']))
+    def describe(self): return list(self._families())
+    def collect(self):
+        values_fam, count_fam = self._families()
+        with self._lock:
+            top = self._sketch.top(self.top_k); total = self._sketch.total; top_keys = {k for k, _, _ in top}
+            rest = [v for k, v in self._values.items() if k not in top_keys]; top_vals = [(k, dict(self._values.get(k, {}))) for k, _, _ in top]
+        for key, per_type in top_vals:
+            for metric_type, val in per_type.items(): values_fam.add_metric([key, metric_type], val)
+        sums = {}
+        for per_type in rest:
+            for metric_type, val in per_type.items(): acc = sums.setdefault(metric_type, [0.0, 0]); acc[0] += val; acc[1] += 1
+        for metric_type, (tot, n) in sums.items(): values_fam.add_metric([OTHER_DESTINATIONS_LABEL, metric_type], tot / n)
+        top_total = 0
+        for key, cnt, _ in top: count_fam.add_metric([key], cnt); top_total += cnt
+        if total > top_total: count_fam.add_metric([OTHER_DESTINATIONS_LABEL], total - top_total)
+        yield values_fam; yield count_fam
+def _make_handler(monitor):
+    """Request handler class bound to `monitor`'s route table (one handler thread per connection)."""
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        def do_GET(self):
+            url = urlsplit(self.path); route = monitor._routes.get(url.path)
+            if route is None: self._reply(404, 'text/plain; charset=utf-8', b'Not Found', {}); return
+            accept_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+            try: status, ctype, body, headers = route(parse_qs(url.query), accept_gzip)
+            except Exception as e:
+                monitor.logger.error(f"Handler for {url.path} failed: {e}"); self._reply(500, 'text/plain; charset=utf-8', b'Internal Server Error', {}); return
+            self._reply(status, ctype, body, headers)
+        def _reply(self, status, ctype, body, headers):
+            self.send_response(status); self.send_header('Content-Type', ctype); self.send_header('Content-Length', str(len(body)))
+            for k, v in headers.items(): self.send_header(k, v)
+            self.end_headers(); self.wfile.write(body)
+        def log_message(self, fmt, *args): monitor.logger.debug("HTTP %s - " + fmt, self.address_string(), *args)
+    return MetricsRequestHandler
+# identity_resolution / link_establishment: client, until the proxy identity is known / the link is up
+# client_proxy_network_rtt: client round trip minus the node's reported residence, i.e. both network directions
+# node_dispatch: node, request decode + packet build before sending to the target
+# proxy_to_target_rtt: node, packet sent to target until its response arrives
+# response_send_call: node, time inside link.send() for the response (enqueue only, not delivery to the client)
+PROXY_STAGES = ('identity_resolution', 'link_establishment', 'node_dispatch', 'client_proxy_network_rtt', 'proxy_to_target_rtt', 'response_send_call')
+STAGE_EXPORT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SCHEDULER_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, float("inf"))
+class CallbackCounterMetric:
+    """Counter family read at scrape time from `fn() -> {label_value: count}` (for counts kept outside prometheus)."""
+    def __init__(self, name, documentation, label, fn, registry=REGISTRY):
+        self._name = name[:-6] if name.endswith('_total') else name; self._doc = documentation; self._label = label; self._fn = fn
+        if registry is not None: registry.register(self)
+    def describe(self): return [CounterMetricFamily(self._name, self._doc, labels=[self._label])]
+    def collect(self):
+        fam = CounterMetricFamily(self._name, self._doc, labels=[self._label])
+        for value, count in self._fn().items(): fam.add_metric([value], count)
+        yield fam
+class StageLatencyMetric:
+    """Per-(route, stage) latency histograms.
+
+    Each series is a LogLinearHistogram, so `/stats` can report accurate p50/p90/p99. Prometheus gets the same data
+    folded into `STAGE_EXPORT_BUCKETS`, keeping the exported series count small.
+    """
+    def __init__(self, name, documentation, registry=REGISTRY):
+        self._name = name; self._doc = documentation; self._hists = {}; self._lock = threading.Lock()
+        if registry is not None: registry.register(self)
+    def observe(self, route, stage, seconds):
+        hist = self._hists.get((route, stage))
+        if hist is None:
+            with self._lock: hist = self._hists.setdefault((route, stage), LogLinearHistogram())
+        hist.record(seconds)
+    def summaries(self, percentiles=(50, 90, 99)):
+        out = {}
+        for (route, stage), hist in sorted(self._hists.items()): out.setdefault(route, {})[stage] = hist.summary(percentiles)
+        return out
+    def describe(self): return [HistogramMetricFamily(self._name, self._doc, labels=['route', 'stage'])]
+    def collect(self):
+        fam = HistogramMetricFamily(self._name, self._doc, labels=['route', 'stage'])
+        for (route, stage), hist in sorted(self._hists.items()):
+            cum = hist.cumulative_counts(STAGE_EXPORT_BUCKETS); count = hist.count
+            fam.add_metric([route, stage], [(repr(b), c) for b, c in cum] + [('+Inf', count)], hist.sum)
+        yield fam
 class MetricsMonitor:
-    def __init__(self, config):
+    def __init__(self, config, registry=None):
         self.logger = get_logger("Feature.MetricsMonitor"); self._http_server_thread = None; self.running = False; self.metrics_initialized = False
-        self.custom_registry = REGISTRY 
+        self.custom_registry = registry if registry is not None else REGISTRY; self._bound = {}; self._http_server = None
+        self._scrape_cache = None; self._scrape_lock = threading.Lock(); self._debug_lock = threading.Lock(); self._routes = {'/metrics': self._serve_metrics, '/stats': self._serve_stats}
         self.update_config(config)
     def update_config(self, config):
         self.config = config; new_port = config.get('prometheus_port',9876); new_prefix = config.get('metrics_prefix','ares')
-        self.enable_health_endpoint = config.get('enable_health_endpoint', True) 
+        self.enable_health_endpoint = config.get('enable_health_endpoint', True)
+        if self.enable_health_endpoint: self._routes['/health'] = self._serve_health
+        else: self._routes.pop('/health', None)
+        self.metrics_cache_ttl_seconds = config.get('metrics_cache_ttl_seconds', 1.0); self.metrics_gzip = config.get('metrics_gzip', True)
+        self.enable_debug_endpoints = config.get('enable_debug_endpoints', False); self.debug_max_seconds = config.get('debug_max_seconds', 30)
+        for path, handler in (('/debug/profile', self._serve_profile), ('/debug/threads', self._serve_threads), ('/debug/alloc', self._serve_alloc)):
+            if self.enable_debug_endpoints: self._routes[path] = handler
+            else: self._routes.pop(path, None)
         if hasattr(self,'port') and (self.port!=new_port or self.prefix!=new_prefix) and self.running: self.logger.warning(f"Prometheus port/prefix changed. Restart ARES for full effect.")
-        self.port = new_port; self.prefix = new_prefix
+        self.port = new_port; self.prefix = new_prefix; self.per_destination_top_k = config.get('per_destination_top_k', 50)
         if not self.metrics_initialized: self._initialize_metrics(); self.metrics_initialized = True
+        elif self.path_selection_chosen_metric_value and self.path_selection_chosen_metric_value.top_k != self.per_destination_top_k: self.path_selection_chosen_metric_value.resize(self.per_destination_top_k)
         self.logger.info(f"MetricsMonitor cfg: Port {self.port}, Prefix '{self.prefix}', HealthEP: {self.enable_health_endpoint}")
     def _initialize_metrics(self):
         self.logger.debug(f"Init Prometheus metrics with prefix: {self.prefix}"); registry = self.custom_registry
@@ -25,52 +170,106 @@ class MetricsMonitor:
         from akita_ares import VERSION
         self.ares_info = _reg(Gauge,'info','Info about ARES instance',['version']); self.ares_info.labels(version=VERSION).set(1) if self.ares_info else None
         self.active_features = _reg(Gauge,'active_features_count','Num active ARES features')
-        self.retry_executions_total = _reg(Counter,'retry_executions_total','Total ops executed via RetryManager',['operation_name'])
-        self.retry_successes_total = _reg(Counter,'retry_successes_total','Total successes via RetryManager',['operation_name'])
-        self.retry_successes_on_retry_total = _reg(Counter,'retry_successes_on_retry_total','Total successes that required retries',['operation_name'])
-        self.retry_failures_total = _reg(Counter,'retry_failures_total','Total failures after all retries',['operation_name'])
+        self.retry_executions_total = _reg(StripedCounterMetric,'retry_executions_total','Total ops executed via RetryManager',['operation_name'])
+        self.retry_successes_total = _reg(StripedCounterMetric,'retry_successes_total','Total successes via RetryManager',['operation_name'])
+        self.retry_successes_on_retry_total = _reg(StripedCounterMetric,'retry_successes_on_retry_total','Total successes that required retries',['operation_name'])
+        self.retry_failures_total = _reg(StripedCounterMetric,'retry_failures_total','Total failures after all retries',['operation_name'])
+        self.retry_budget_tokens = _reg(Gauge,'retry_budget_tokens','Retry tokens left in budget',['operation_name'])
+        self.retry_budget_exhausted_total = _reg(Counter,'retry_budget_exhausted_total','Total retries refused by an exhausted retry budget',['operation_name'])
         self.retry_operation_duration_seconds = _reg(Histogram,'retry_operation_duration_seconds','Op duration hist with retries',['operation_name'])
-        self.proxied_packets_total = _reg(Counter,'proxied_packets_total','Total proxied packets',['proxy_alias','direction'])
+        self.retry_hedges_total = _reg(Counter,'retry_hedges_total','Hedged attempts by outcome (issued/won/budget_denied)',['operation_name','outcome'])
+        self.retry_hedge_latency_seconds = _reg(Histogram,'retry_hedge_latency_seconds','Latency of hedged ops: primary attempt alone vs effective (first success)',['operation_name','kind'])
+        self.retry_batches_total = _reg(Counter,'retry_batches_total','Batches run via RetryManager.exec_many',['operation_name'])
+        self.retry_batch_items_total = _reg(Counter,'retry_batch_items_total','Batch items by outcome',['operation_name','outcome'])
+        self.retry_batch_retries_total = _reg(Counter,'retry_batch_retries_total','Retries spent on batch items',['operation_name'])
+        self.retry_batch_duration_seconds = _reg(Histogram,'retry_batch_duration_seconds','Wall time per batch',['operation_name'])
+        self.proxy_stage_latency_seconds = _reg(StageLatencyMetric,'proxy_stage_latency_seconds','Latency of each proxied request stage per route')
+        self.scheduler_task_runs_total = _reg(Counter,'scheduler_task_runs_total','Scheduled task runs by outcome (ok/error/skipped)',['task','outcome'])
+        self.scheduler_task_duration_seconds = _reg(Histogram,'scheduler_task_duration_seconds','Run time of scheduled tasks',['task'],buckets=SCHEDULER_BUCKETS)
+        self.scheduler_task_lateness_seconds = _reg(Histogram,'scheduler_task_lateness_seconds','Delay between a scheduled task coming due and being dispatched',['task'],buckets=SCHEDULER_BUCKETS)
+        self.circuit_breaker_rejections_total = _reg(Counter,'circuit_breaker_rejections_total','Calls failed fast by an open circuit breaker',['component'])
+        self.log_records_dropped_total = _reg(CallbackCounterMetric,'log_records_dropped_total','Log records dropped by a full async log queue or per-site rate limiting','reason',get_dropped_log_counts)
+        self.proxied_packets_total = _reg(StripedCounterMetric,'proxied_packets_total','Total proxied packets',['proxy_alias','direction'])
         self.active_proxy_routes = _reg(Gauge,'active_proxy_routes_count','Num active client proxy routes')
         self.active_proxy_clients = _reg(Gauge,'active_proxy_clients_count','Num active clients on this proxy node')
         self.path_selection_evaluations_total = _reg(Counter,'path_selection_evaluations_total','Total path selection evals')
-        self.path_selection_chosen_metric_value = _reg(Gauge,'path_selection_chosen_metric_value','Metric value for chosen path',['destination_hash','metric_type'])
+        self.path_selection_chosen_metric_value = _reg(TopKDestinationMetric,'path_selection_chosen_metric_value','Metric value for chosen path (top-K destinations, rest averaged as other)',f'{self.prefix}_path_selection_destination_evaluations',top_k=self.per_destination_top_k)
+        self._bound = {}
         self.logger.info("Prometheus metrics (re)checked/defined.")
+    def _child(self, metric, *label_values):
+        """Cached `metric.labels(*label_values)`; skips prometheus_client's per-call validation and lock."""
+        key = (id(metric), label_values); child = self._bound.get(key)
+        if child is None: child = self._bound[key] = metric.labels(*label_values)
+        return child
     def start(self):
         if self.running: self.logger.warning("Prometheus HTTP server already running."); return
         try:
             if not self.metrics_initialized: self._initialize_metrics(); self.metrics_initialized=True
-            from http.server import HTTPServer, BaseHTTPRequestHandler
-            class HealthHandler(BaseHTTPRequestHandler):
-                def do_GET(self):
-                    if self.path == '/health':
-                        self.send_response(200)
-                        self.send_header('Content-type', 'text/plain')
-                        self.end_headers()
-                        self.wfile.write(b'OK')
-                    elif self.path == '/metrics':
-                        self.send_response(200)
-                        self.send_header('Content-type', 'text/plain; charset=utf-8')
-                        self.end_headers()
-                        self.wfile.write(generate_latest(self.custom_registry))
-                    else:
-                        self.send_response(404)
-                        self.end_headers()
-            self._http_server = HTTPServer(('', self.port), HealthHandler)
+            from http.server import ThreadingHTTPServer
+            self._http_server = ThreadingHTTPServer(('', self.port), _make_handler(self)); self._http_server.daemon_threads = True
             self._http_server_thread = threading.Thread(target=self._http_server.serve_forever, daemon=True, name="PrometheusHealthServerThread")
             self._http_server_thread.start(); self.running=True
-            self.logger.info(f"Prometheus/health server started on port {self.port}. Health endpoint at /health, metrics at /metrics.")
+            self.logger.info(f"Prometheus/health server started on port {self.port}. Routes: {', '.join(sorted(self._routes))}.")
         except Exception as e: self.logger.error(f"Failed to start server on port {self.port}: {e}"); self.running=False
     def stop(self):
         if self.running:
             self.logger.info("Prometheus/health server stopping...")
-            if hasattr(self, '_http_server'):
-                self._http_server.shutdown()
+            if getattr(self, '_http_server', None) is not None:
+                self._http_server.shutdown(); self._http_server.server_close(); self._http_server = None
             self.running = False
         else:
             self.logger.debug("Server not running or already stopped.")
+    def add_route(self, path, handler):
+        """Serve `path` with `handler(query, accept_gzip) -> (status, content_type, body, headers)`; `query` is a parse_qs dict."""
+        self._routes[path] = handler
+    def _serve_health(self, query, accept_gzip):
+        # Deliberately touches nothing shared with /metrics so it answers while a scrape is being generated
+        return 200, 'text/plain; charset=utf-8', b'OK', {}
+    def _serve_metrics(self, query, accept_gzip):
+        entry = self._scrape_output()
+        if not self.metrics_gzip: return 200, CONTENT_TYPE_LATEST, entry[1], {}
+        if accept_gzip:
+            if entry[2] is None: entry[2] = gzip.compress(entry[1], compresslevel=GZIP_LEVEL)
+            return 200, CONTENT_TYPE_LATEST, entry[2], dict(VARY_ENCODING, **{'Content-Encoding': 'gzip'})
+        return 200, CONTENT_TYPE_LATEST, entry[1], VARY_ENCODING
+    def _serve_stats(self, query, accept_gzip):
+        body = json.dumps({'proxy_stage_latency_seconds': self.get_proxy_stage_stats()}, sort_keys=True).encode('utf-8')
+        if accept_gzip and len(body) > 1024: return 200, 'application/json', gzip.compress(body, compresslevel=GZIP_LEVEL), dict(VARY_ENCODING, **{'Content-Encoding': 'gzip'})
+        return 200, 'application/json', body, VARY_ENCODING
+    def _debug_capture(self, query, default_seconds, capture):
+        """Run one bounded capture at a time: 400 on bad `seconds`, 409 while another capture is running."""
+        try: seconds = float(query.get('seconds', [default_seconds])[0])
+        except ValueError: return 400, 'text/plain; charset=utf-8', b'seconds must be a number', {}
+        if not 0 < seconds <= self.debug_max_seconds: return 400, 'text/plain; charset=utf-8', f'seconds must be in (0, {self.debug_max_seconds}]'.encode(), {}
+        if not self._debug_lock.acquire(blocking=False): return 409, 'text/plain; charset=utf-8', b'another profile/alloc capture is running', {}
+        try: return 200, 'text/plain; charset=utf-8', capture(seconds, query).encode('utf-8'), {}
+        finally: self._debug_lock.release()
+    def _serve_profile(self, query, accept_gzip):
+        def capture(seconds, q):
+            stacks = sampling_profiler.sample_stacks(seconds)
+            return sampling_profiler.format_top(stacks) if q.get('format', ['collapsed'])[0] == 'top' else sampling_profiler.format_collapsed(stacks)
+        return self._debug_capture(query, 10, capture)
+    def _serve_threads(self, query, accept_gzip): return 200, 'text/plain; charset=utf-8', sampling_profiler.thread_dump().encode('utf-8'), {}
+    def _serve_alloc(self, query, accept_gzip):
+        """Top allocation sites over `seconds`: 400 on a non-integer `limit`, which is clamped to 1..500."""
+        try: limit = min(max(int(query.get('limit', ['25'])[0]), 1), 500)
+        except ValueError: return 400, 'text/plain; charset=utf-8', b'limit must be an integer', {}
+        return self._debug_capture(query, 10, lambda seconds, q: sampling_profiler.allocation_top(seconds, limit=limit))
+    def _scrape_output(self):
+        """[generated_at, body, gzipped body or None], regenerated at most once per `metrics_cache_ttl_seconds`.
+
+        Concurrent scrapers arriving while the cache is stale wait on one generator instead of each running
+        `generate_latest` themselves.
+        """
+        entry = self._scrape_cache
+        if entry is not None and time.monotonic() - entry[0] < self.metrics_cache_ttl_seconds: return entry
+        with self._scrape_lock:
+            entry = self._scrape_cache
+            if entry is None or time.monotonic() - entry[0] >= self.metrics_cache_ttl_seconds:
+                body = generate_latest(self.custom_registry); entry = self._scrape_cache = [time.monotonic(), body, None]
+        return entry
     def increment_retry_attempt(self, op_name, success=False): pass # Deprecated
-    def record_operation_duration(self, op_name, dur_s): self.retry_operation_duration_seconds.labels(op_name).observe(dur_s) if self.retry_operation_duration_seconds else None
+    def record_operation_duration(self, op_name, dur_s): self._child(self.retry_operation_duration_seconds,op_name).observe(dur_s) if self.retry_operation_duration_seconds else None
     def update_retry_stats(self, op_name, success, required_retries):
         if self.retry_executions_total: self.retry_executions_total.labels(op_name).inc()
         if success:
@@ -78,7 +277,31 @@ class MetricsMonitor:
             if required_retries > 0 and self.retry_successes_on_retry_total: self.retry_successes_on_retry_total.labels(op_name).inc()
         else:
             if self.retry_failures_total: self.retry_failures_total.labels(op_name).inc()
+    def set_retry_budget_tokens(self, op_name, tokens): self._child(self.retry_budget_tokens,op_name).set(tokens) if self.retry_budget_tokens else None
+    def remove_retry_budget_tokens(self, op_name):
+        if not self.retry_budget_tokens: return
+        self._bound.pop((id(self.retry_budget_tokens), (op_name,)), None)
+        try: self.retry_budget_tokens.remove(op_name)
+        except KeyError: pass
+    def increment_retry_budget_exhausted(self, op_name): self._child(self.retry_budget_exhausted_total,op_name).inc() if self.retry_budget_exhausted_total else None
+    def increment_hedge(self, op_name, outcome): self._child(self.retry_hedges_total,op_name,outcome).inc() if self.retry_hedges_total else None
+    def record_hedge_latency(self, op_name, kind, dur_s): self._child(self.retry_hedge_latency_seconds,op_name,kind).observe(dur_s) if self.retry_hedge_latency_seconds else None
+    def record_batch(self, op_name, successes, failures, retries, dur_s):
+        if self.retry_batches_total: self.retry_batches_total.labels(op_name).inc()
+        if self.retry_batch_items_total: self.retry_batch_items_total.labels(op_name,'success').inc(successes); self.retry_batch_items_total.labels(op_name,'failure').inc(failures)
+        if self.retry_batch_retries_total: self.retry_batch_retries_total.labels(op_name).inc(retries)
+        if self.retry_batch_duration_seconds: self.retry_batch_duration_seconds.labels(op_name).observe(dur_s)
+    def increment_breaker_rejection(self, component): self._child(self.circuit_breaker_rejections_total,component).inc() if self.circuit_breaker_rejections_total else None
     def increment_proxied_packets(self, proxy_alias, direction='sent_to_proxy'): self.proxied_packets_total.labels(proxy_alias,direction).inc() if self.proxied_packets_total else None
+    def record_proxy_stage(self, route, stage, seconds): self.proxy_stage_latency_seconds.observe(route, stage, seconds) if self.proxy_stage_latency_seconds else None
+    def get_proxy_stage_stats(self, percentiles=(50, 90, 99)): return self.proxy_stage_latency_seconds.summaries(percentiles) if self.proxy_stage_latency_seconds else {}
+    def record_scheduled_run(self, task, dur_s, lateness_s, outcome):
+        self._child(self.scheduler_task_runs_total,task,outcome).inc() if self.scheduler_task_runs_total else None
+        self._child(self.scheduler_task_lateness_seconds,task).observe(max(0.0, lateness_s)) if self.scheduler_task_lateness_seconds else None
+        if dur_s is not None and self.scheduler_task_duration_seconds: self._child(self.scheduler_task_duration_seconds,task).observe(dur_s)
+    def record_path_choice(self, dest_hash, metric_type, value):
+        if self.path_selection_evaluations_total: self.path_selection_evaluations_total.inc()
+        if self.path_selection_chosen_metric_value: self.path_selection_chosen_metric_value.set(dest_hash, metric_type, value)
     def set_active_features_count(self, count): self.active_features.set(count) if self.active_features else None
     def set_active_proxy_routes_count(self, count): self.active_proxy_routes.set(count) if self.active_proxy_routes else None
     def set_active_proxy_clients_count(self, count): self.active_proxy_clients.set(count) if self.active_proxy_clients else None
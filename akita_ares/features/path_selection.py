@@ -5,12 +5,13 @@ try:
     RNS_AVAILABLE = True
 except ImportError:
     RNS_AVAILABLE = False
+TASK_REFRESH = "path_selection.refresh"
 class PathSelector:
     def __init__(self, config, rns_instance=None, metrics_monitor=None):
         self.rns_instance, self.metrics_monitor = rns_instance, metrics_monitor
         self.logger = get_logger("Feature.PathSelector")
         self.path_metrics_cache, self.known_paths, self.custom_metric_evaluator = {}, {}, None
-        self.update_config(config); self._last_metric_update_time = 0
+        self._scheduler = None; self.update_config(config); self._last_metric_update_time = 0
     def update_config(self, new_config):
         self.config = new_config; self.default_metric_type = self.config.get('default_metric','rtt')
         self.metric_update_interval = self.config.get('metric_update_interval_seconds',60)
@@ -20,6 +21,11 @@ class PathSelector:
         self.custom_metrics_module_path = custom_module_path
         if custom_module_path != old_path or (custom_module_path and not self.custom_metric_evaluator): self._load_custom_metrics_module()
         self.logger.info(f"PathSel cfg: Metric={self.default_metric_type}, UpdateInt={self.metric_update_interval}s")
+        if self._scheduler is not None and self.metric_update_interval != self._task_interval: self.register_tasks(self._scheduler)
+    def register_tasks(self, scheduler):
+        """Refresh path metrics every `metric_update_interval_seconds` (+10% jitter so nodes don't probe in lockstep)."""
+        self._scheduler = scheduler; self._task_interval = self.metric_update_interval
+        scheduler.add_task(TASK_REFRESH, self.refresh_metrics, self.metric_update_interval, jitter_s=self.metric_update_interval * 0.1)
     def _load_custom_metrics_module(self):
         if not self.custom_metrics_module_path: self.custom_metric_evaluator = None; self.logger.info("No custom metrics module."); return
         try:
@@ -50,8 +56,9 @@ class PathSelector:
         try:
             # Conceptual: probe RTT via RNS
             # Assuming path_info has a probe method or use RNS.Transport.probe
-            # For now, simulate
             self.logger.debug(f"Probing RTT for path {path_info_or_id}")
+            probe = getattr(path_info_or_id, 'probe', None)
+            if callable(probe): return probe(timeout=self.rtt_probe_timeout)
             # Placeholder for actual probe
             return random.uniform(0.05, 0.5)
         except Exception as e:
@@ -78,15 +85,16 @@ class PathSelector:
         if not evaluated: self.logger.warning(f"No paths evaluated for {dest_hash_hex[:8]}."); return None
         evaluated.sort(key=lambda x:x['metric_value']); best=evaluated[0]
         self.logger.info(f"Best path for {dest_hash_hex[:8]} via {getattr(best['path_info'],'path_id','N/A')} with {self.default_metric_type}={best['metric_value']:.4f}")
-        if self.metrics_monitor: self.metrics_monitor.path_selection_evaluations_total.inc(); self.metrics_monitor.path_selection_chosen_metric_value.labels(dest_hash=dest_hash_hex,metric_type=self.default_metric_type).set(best['metric_value'] if best['metric_value']!=float('inf') else -1)
+        if self.metrics_monitor: self.metrics_monitor.record_path_choice(dest_hash_hex, self.default_metric_type, best['metric_value'] if best['metric_value']!=float('inf') else -1)
         return best['path_info']
     def periodic_update(self):
         now = time.time()
         interval = self.metric_update_interval
         if (now - self._last_metric_update_time) < interval:
             return
+        self._last_metric_update_time = now; self.refresh_metrics()
+    def refresh_metrics(self):
         self.logger.info("PathSel periodic update...")
-        self._last_metric_update_time = now
         # Refresh metrics for known paths
         for dest_hex, paths in list(self.known_paths.items()):
             for path_info in paths[:self.max_paths_to_consider]:
@@ -102,4 +110,6 @@ class PathSelector:
                 pass
             except Exception as e:
                 self.logger.error(f"Error influencing routing: {e}")
-    def stop(self): self.logger.info("PathSelector stopping.")
+    def stop(self):
+        self.logger.info("PathSelector stopping.")
+        if self._scheduler is not None: self._scheduler.remove_task(TASK_REFRESH); self._scheduler = None
@@ -1,32 +1,40 @@
-import json, os, base64, re, threading
+import json, os, base64, re, threading, time
 from akita_ares.core.logger import get_logger
+from akita_ares.core.deadline import Deadline, effective_deadline
+from akita_ares.core.config_diff import diff_keyed_list
 try:
-    import RNS; from RNS import Identity, Destination, Packet, Link; RNS_AVAILABLE = True
+    import RNS; from RNS import Identity, Destination, Packet, Link, Transport; RNS_AVAILABLE = True
 except ImportError:
     RNS_AVAILABLE = False
     class Identity:
-        pass
+        @staticmethod
+        def recall(target_hash, from_identity_hash=False):
+            return None
     class Destination:
         IN, OUT, SINGLE, GROUP, PLAIN = 0, 1, 2, 3, 4
         @staticmethod
-        def ummutable(h, type=None, direction=None):
-            return None
+        def hash_from_name_and_identity(full_name, identity):
+            return b''
+    class Transport:
+        @staticmethod
+        def request_path(destination_hash):
+            pass
     class Packet:
-        def __init__(self, dest, data, id=None):
+        def __init__(self, destination, data, packet_type=None):
             pass
         def send(self):
             pass
         def set_response_callback(self, cb):
             pass
     class Link:
-        def __init__(self, dest, id=None):
+        def __init__(self, destination, established_callback=None, closed_callback=None):
             self.link_id = os.urandom(16)
-            self.destination = dest
+            self.destination = destination
         def set_resource_callback(self, cb):
             pass
         def set_link_closed_callback(self, cb):
             pass
-        def set_established_callback(self, cb):
+        def set_link_established_callback(self, cb):
             pass
         def send(self, d):
             pass
@@ -34,12 +42,12 @@ except ImportError:
             pass
         def is_active(self):
             return False
-PROXY_PROTOCOL_VERSION_1_0 = "1.0"; RNS_HASH_REGEX = re.compile(r'^[a-f0-9]{32}$')
+PROXY_PROTOCOL_VERSION_1_0 = "1.0"; RNS_HASH_REGEX = re.compile(r'^[a-f0-9]{32}$'); PROXY_NODE_ROUTE = "proxy_node_service"; DEFAULT_LISTEN_ASPECT = "default_proxy_service"; TASK_CHECK = "destination_proxying.check"; IDENTITY_POLL_INTERVAL_S = 0.25
 class ProxyManager:
-    def __init__(self, config, rns_instance=None, metrics_monitor=None):
-        self.logger = get_logger("Feature.ProxyManager"); self.rns_instance = rns_instance; self.metrics_monitor = metrics_monitor
+    def __init__(self, config, rns_instance=None, metrics_monitor=None, breaker_registry=None, tracer=None):
+        self.logger = get_logger("Feature.ProxyManager"); self.rns_instance = rns_instance; self.metrics_monitor = metrics_monitor; self.breaker_registry = breaker_registry; self.tracer = tracer
         self.is_proxy_node = False; self.proxy_routes_config = []; self.proxy_routes = [] 
-        self.service_destination = None; self.active_client_links = {}; self.pending_client_requests = {}
+        self.service_destination = None; self.current_listen_aspect = None; self._draining_destinations = []; self._scheduler = None; self.active_client_links = {}; self.pending_client_requests = {}; self.pending_request_meta = {}
         self.proxy_protocol_version = PROXY_PROTOCOL_VERSION_1_0; self.lock = threading.Lock() 
         if not RNS_AVAILABLE: self.logger.error("RNS library not found. ProxyManager cannot function.")
         elif not self.rns_instance: self.logger.error("RNS instance not provided. ProxyManager cannot function.")
@@ -53,13 +61,18 @@ class ProxyManager:
             role_changed = (new_is_proxy_node != self.is_proxy_node); self.is_proxy_node = new_is_proxy_node 
             if role_changed:
                 if self.is_proxy_node: self._shutdown_client_proxy_resources(); self._setup_proxy_service_destination()
-                else: self._shutdown_proxy_service_destination()
+                else: self._shutdown_proxy_service_destination_locked(); self._configure_routes()
             else: 
                 if self.is_proxy_node:
-                    listen_aspect = self.config.get('listen_on_aspect','def_proxy_svc'); cur_aspect = getattr(self,"cur_listen_aspect",None)
-                    if self.service_destination and listen_aspect != cur_aspect: self.logger.info("Proxy listen aspect changed. Re-init service dest."); self._shutdown_proxy_service_destination(); self._setup_proxy_service_destination()
+                    listen_aspect = self.config.get('listen_on_aspect', DEFAULT_LISTEN_ASPECT)
+                    if self.service_destination and listen_aspect != self.current_listen_aspect: self._swap_service_destination()
                 else: self._configure_routes() 
             if self.metrics_monitor: self.metrics_monitor.set_active_proxy_routes_count(len(self.proxy_routes))
+        if self._scheduler is not None and self.config.get('periodic_check_interval_seconds', 30) != self._check_interval: self.register_tasks(self._scheduler)
+    def register_tasks(self, scheduler):
+        """Run `periodic_check` every `periodic_check_interval_seconds`; a slow check is skipped, never stacked."""
+        self._scheduler = scheduler; interval = self._check_interval = self.config.get('periodic_check_interval_seconds', 30)
+        scheduler.add_task(TASK_CHECK, self.periodic_check, interval, jitter_s=min(1.0, interval * 0.1))
     def _configure_routes(self): # Client-side
         new_routes = []
         for route_cfg in self.proxy_routes_config:
@@ -68,149 +81,266 @@ class ProxyManager:
                 if RNS_HASH_REGEX.match(exit_hash): new_routes.append({"alias": alias, "entry_destination_name_str": entry_name, "exit_node_identity_hash_hex": exit_hash})
                 else: self.logger.warning(f"Skipping invalid proxy route '{alias}': exit_node_identity_hash '{exit_hash}' invalid format.")
             else: self.logger.warning(f"Skipping invalid proxy route config: {route_cfg}")
-        self.proxy_routes = new_routes; self.logger.info(f"Client proxy routes configured: {len(self.proxy_routes)} valid routes.")
+        diff = diff_keyed_list(self.proxy_routes, new_routes, 'alias')
+        if self.breaker_registry is not None:  # a re-pointed or removed route must not inherit the old exit's breaker state
+            for alias in list(diff.removed) + list(diff.changed): self.breaker_registry.discard(f"proxy:{alias}")
+        self.proxy_routes = new_routes
+        self.logger.info(f"Client proxy routes configured: {len(self.proxy_routes)} valid routes (+{len(diff.added)} -{len(diff.removed)} ~{len(diff.changed)}).")
+    def _swap_service_destination(self): # Server-side, caller holds self.lock
+        """Listen on the new aspect without closing anything: links already made to the old destination keep
+        serving and the old destination is closed by `periodic_check` once its last link is gone."""
+        old_dest, old_aspect = self.service_destination, self.current_listen_aspect; self.service_destination = None
+        self._setup_proxy_service_destination()
+        if self.service_destination is None: self.service_destination, self.current_listen_aspect = old_dest, old_aspect; self.logger.error("Keeping old proxy service destination; new one could not be created."); return
+        self._draining_destinations.append(old_dest); self.logger.info(f"Proxy listen aspect changed {old_aspect} -> {self.current_listen_aspect}; old destination drains {len(self.active_client_links)} links.")
+    def _close_drained_destinations(self): # caller holds self.lock
+        in_use = {id(getattr(l, 'destination', None)) for l in self.active_client_links.values()}; still = []
+        for dest in self._draining_destinations:
+            if id(dest) in in_use: still.append(dest); continue
+            try: dest.close() if hasattr(dest, 'close') else None
+            except Exception as e: self.logger.error(f"Error closing drained proxy destination: {e}")
+        self._draining_destinations = still
     def _setup_proxy_service_destination(self): # Server-side
         if not RNS_AVAILABLE or not self.rns_instance: self.logger.error("RNS NA for proxy service."); return
         if self.service_destination: self.logger.info("Proxy service dest already exists."); return
-        self.current_listen_aspect = self.config.get('listen_on_aspect', 'default_proxy_service'); dest_name_parts = ["ares", "proxy", self.current_listen_aspect]
+        self.current_listen_aspect = self.config.get('listen_on_aspect', DEFAULT_LISTEN_ASPECT); dest_name_parts = ["ares", "proxy", self.current_listen_aspect]
         try:
             self.service_destination = Destination(self.rns_instance.identity, Destination.IN, Destination.SINGLE, *dest_name_parts)
             self.service_destination.set_link_established_callback(self._handle_client_link_established)
-            self.logger.info(f"Proxy node listening on RNS Dest: {'.'.join(dest_name_parts)} ({self.service_destination.hash_hex()})")
+            self.logger.info(f"Proxy node listening on RNS Dest: {'.'.join(dest_name_parts)} ({self.service_destination.hexhash})")
         except Exception as e: self.logger.error(f"Failed to create proxy service destination: {e}", exc_info=True); self.service_destination = None
     def _handle_client_link_established(self, link: Link): # Server-side
-        if not RNS_AVAILABLE: return; link_id = link.link_id.hex() 
+        if not RNS_AVAILABLE: return
+        link_id = link.link_id.hex()
         with self.lock: self.active_client_links[link_id] = link
         self.logger.info(f"New client link established to proxy service: {link_id}")
         link.set_resource_callback(lambda resource: self._handle_proxied_request_on_link(resource, link)); link.set_link_closed_callback(lambda closed_link: self._handle_client_link_closed(closed_link))
         if self.metrics_monitor: self.metrics_monitor.set_active_proxy_clients_count(len(self.active_client_links))
     def _handle_client_link_closed(self, link: Link): # Server-side
-        if not RNS_AVAILABLE: return; link_id = link.link_id.hex(); closed_reqs = 0
+        if not RNS_AVAILABLE: return
+        link_id = link.link_id.hex(); closed_reqs = 0
         with self.lock:
             if link_id in self.active_client_links: del self.active_client_links[link_id]; self.logger.info(f"Client link closed: {link_id}")
             for req_id, req_info_link in list(self.pending_client_requests.items()):
-                if req_info_link.link_id == link.link_id: del self.pending_client_requests[req_id]; closed_reqs += 1
+                if req_info_link.link_id == link.link_id: del self.pending_client_requests[req_id]; self._end_span(self.pending_request_meta.pop(req_id, None), 'client_link_closed'); closed_reqs += 1
         if closed_reqs > 0: self.logger.debug(f"Removed {closed_reqs} pending requests for closed link {link_id}.")
         if self.metrics_monitor: self.metrics_monitor.set_active_proxy_clients_count(len(self.active_client_links))
     def _handle_proxied_request_on_link(self, resource, client_link: Link): # Server-side
-        if not RNS_AVAILABLE: return; client_link_id_hex = client_link.link_id.hex(); self.logger.debug(f"Proxy node received data from client link {client_link_id_hex} (size {len(resource.data)} bytes).")
+        if not RNS_AVAILABLE: return
+        received_at = time.monotonic(); client_link_id_hex = client_link.link_id.hex(); client_request_id = None; self.logger.debug("Proxy node received data from client link %s (size %d bytes).", client_link_id_hex, len(resource.data))
         try:
             message = json.loads(resource.data.decode('utf-8'))
             if message.get("version") != self.proxy_protocol_version: self.logger.warning(f"Incompatible proto ver from {client_link_id_hex}. Got {message.get('version')}"); client_link.send(json.dumps({"error": "incompatible_protocol_version"}).encode('utf-8')) if client_link.is_active() else None; return
-            target_hash_hex = message.get("target_destination_hash"); payload_b64 = message.get("payload"); client_request_id = message.get("request_id")
+            target_hash_hex = message.get("target_destination_hash"); target_name = message.get("target_destination_name"); payload_b64 = message.get("payload"); client_request_id = message.get("request_id")
             if not target_hash_hex or not payload_b64 or not client_request_id: self.logger.error(f"Invalid proxy msg from {client_link_id_hex}: missing fields."); client_link.send(json.dumps({"request_id": client_request_id, "error": "invalid_request_format"}).encode('utf-8')) if client_link.is_active() else None; return
             if not RNS_HASH_REGEX.match(target_hash_hex): self.logger.error(f"Invalid target_hash format from {client_link_id_hex}: {target_hash_hex}"); client_link.send(json.dumps({"request_id": client_request_id, "error": "invalid_target_hash_format"}).encode('utf-8')) if client_link.is_active() else None; return
+            if not isinstance(target_name, str) or not target_name: self.logger.error(f"Proxy msg from {client_link_id_hex} lacks target_destination_name."); client_link.send(json.dumps({"request_id": client_request_id, "error": "missing_target_destination_name"}).encode('utf-8')) if client_link.is_active() else None; return
             actual_payload_bytes = base64.b64decode(payload_b64); target_destination_hash_bytes = bytes.fromhex(target_hash_hex)
+            deadline_ms = message.get("deadline_ms"); req_deadline = Deadline.from_wire_ms(deadline_ms) if deadline_ms is not None else None
+            trace_ctx = message.get("trace")
         except Exception as e: self.logger.error(f"Error decoding/parsing proxy request from {client_link_id_hex}: {e}"); error_msg = {"request_id": client_request_id or "unknown", "error": f"request_decode_error: {e}"}; client_link.send(json.dumps(error_msg).encode('utf-8')) if client_link.is_active() else None; return
-        self.logger.info(f"Proxying request (ID: {client_request_id}) from client link {client_link_id_hex} to target {target_hash_hex[:8]}...")
-        with self.lock: self.pending_client_requests[client_request_id] = client_link 
+        span = self.tracer.start_span('proxy.node.forward', parent=trace_ctx, request_id=client_request_id, target=target_hash_hex, client_link=client_link_id_hex) if self.tracer and trace_ctx else None
+        if req_deadline and req_deadline.expired():
+            if span: span.end(outcome='dropped_expired')
+            self.logger.debug("Dropping expired request (ID: %s) from client link %s: deadline passed before dispatch.", client_request_id, client_link_id_hex)
+            if self.metrics_monitor: self.metrics_monitor.increment_proxied_packets(PROXY_NODE_ROUTE, direction='dropped_expired')
+            return
+        self.logger.debug("Proxying request (ID: %s) from client link %s to target %.8s...", client_request_id, client_link_id_hex, target_hash_hex)
+        meta = {'deadline': req_deadline, 'received_at': received_at, 'sent_at': None, 'span': span}
+        with self.lock: self.pending_client_requests[client_request_id] = client_link; self.pending_request_meta[client_request_id] = meta
         try:
-            target_destination = Destination.ummutable(target_destination_hash_bytes, type=Destination.SINGLE, direction=Destination.OUT)
-            packet_to_target = Packet(target_destination, actual_payload_bytes, self.rns_instance.identity) 
+            target_identity = Identity.recall(target_destination_hash_bytes)
+            if not target_identity: Transport.request_path(target_destination_hash_bytes); raise ValueError("target identity not known yet; path requested")
+            target_destination = Destination(target_identity, Destination.OUT, Destination.SINGLE, *target_name.split('.'))
+            if target_destination.hash != target_destination_hash_bytes: raise ValueError(f"name '{target_name}' does not match target hash")
+            packet_to_target = Packet(target_destination, actual_payload_bytes)
             packet_to_target.set_response_callback(lambda resp_pkt: self._handle_response_from_target(resp_pkt, client_request_id))
+            meta['sent_at'] = sent_at = time.monotonic(); self._record_stage(PROXY_NODE_ROUTE, 'node_dispatch', sent_at - received_at)
             packet_to_target.send()
-            self.logger.debug(f"Packet sent from proxy to target {target_hash_hex[:8]} for request {client_request_id}")
-            if self.metrics_monitor: self.metrics_monitor.increment_proxied_packets("proxy_node_service", direction='sent_to_target')
+            self.logger.debug("Packet sent from proxy to target %.8s for request %s", target_hash_hex, client_request_id)
+            if self.metrics_monitor: self.metrics_monitor.increment_proxied_packets(PROXY_NODE_ROUTE, direction='sent_to_target')
         except Exception as e:
             self.logger.error(f"Error sending proxied packet to target {target_hash_hex[:8]}: {e}", exc_info=True)
-            with self.lock: original_client_link = self.pending_client_requests.pop(client_request_id, None)
+            with self.lock: original_client_link = self.pending_client_requests.pop(client_request_id, None); self.pending_request_meta.pop(client_request_id, None)
+            if span: span.end(outcome='send_to_target_failed', error=str(e))
             if original_client_link and original_client_link.is_active():
                 error_response = {"version": self.proxy_protocol_version, "type": "response", "request_id": client_request_id, "error": f"Proxy failed to send to target: {e}"}
                 try: original_client_link.send(json.dumps(error_response).encode('utf-8'))
                 except Exception as send_e: self.logger.error(f"Failed to send error back to client {client_link_id_hex}: {send_e}")
     def _handle_response_from_target(self, response_packet: Packet, client_request_id: str): # Server-side
-        if not RNS_AVAILABLE: return; self.logger.debug(f"Proxy node received response from target for client_request_id {client_request_id}")
-        with self.lock: original_client_link = self.pending_client_requests.pop(client_request_id, None)
+        if not RNS_AVAILABLE: return
+        resp_at = time.monotonic(); self.logger.debug("Proxy node received response from target for client_request_id %s", client_request_id)
+        with self.lock: original_client_link = self.pending_client_requests.pop(client_request_id, None); meta = self.pending_request_meta.pop(client_request_id, None) or {}
         if not original_client_link: self.logger.warning(f"Original client link for request_id {client_request_id} not found. Cannot forward response."); return
-        if not original_client_link.is_active(): self.logger.warning(f"Original client link {original_client_link.link_id.hex()} for request_id {client_request_id} inactive. Cannot forward."); return
+        if meta.get('sent_at') is not None: self._record_stage(PROXY_NODE_ROUTE, 'proxy_to_target_rtt', resp_at - meta['sent_at'])
+        span = meta.get('span')
+        if span and meta.get('sent_at') is not None: span.set(target_rtt_ms=round((resp_at - meta['sent_at']) * 1000.0, 3))
+        if meta.get('deadline') and meta['deadline'].expired():
+            if span: span.end(outcome='dropped_expired')
+            self.logger.debug("Dropping response for expired request %s; client deadline passed.", client_request_id)
+            if self.metrics_monitor: self.metrics_monitor.increment_proxied_packets(PROXY_NODE_ROUTE, direction='dropped_expired')
+            return
+        if not original_client_link.is_active():
+            if span: span.end(outcome='client_link_inactive')
+            self.logger.warning(f"Original client link {original_client_link.link_id.hex()} for request_id {client_request_id} inactive. Cannot forward."); return
         try:
             payload_b64 = base64.b64encode(response_packet.data).decode('utf-8')
             proxy_response_msg = {"version": self.proxy_protocol_version, "type": "response", "request_id": client_request_id, "source_destination_hash": response_packet.source_hash.hex() if response_packet.source_hash else None, "payload": payload_b64}
+            if meta.get('received_at') is not None: proxy_response_msg["timings_ms"] = {"proxy_residence": round((time.monotonic() - meta['received_at']) * 1000.0, 3)}
             response_bytes = json.dumps(proxy_response_msg).encode('utf-8')
-            original_client_link.send(response_bytes)
-            self.logger.info(f"Forwarded response for request {client_request_id} to client link {original_client_link.link_id.hex()}")
-            if self.metrics_monitor: self.metrics_monitor.increment_proxied_packets("proxy_node_service", direction='response_to_client')
+            original_client_link.send(response_bytes); self._record_stage(PROXY_NODE_ROUTE, 'response_send_call', time.monotonic() - resp_at)
+            if span: span.end(outcome='forwarded')
+            self.logger.debug("Forwarded response for request %s to client link %s", client_request_id, original_client_link.link_id.hex())
+            if self.metrics_monitor: self.metrics_monitor.increment_proxied_packets(PROXY_NODE_ROUTE, direction='response_to_client')
         except Exception as e:
+            if span: span.end(outcome='forward_failed', error=str(e))
             self.logger.error(f"Error encoding/forwarding response to client for request_id {client_request_id}: {e}", exc_info=True)
             if original_client_link.is_active():
                  try: error_resp = {"version": self.proxy_protocol_version, "type":"response", "request_id": client_request_id, "error": f"Proxy failed to process target response: {e}"}; original_client_link.send(json.dumps(error_resp).encode('utf-8'))
                  except Exception as send_e: self.logger.error(f"Failed to send error back to client {original_client_link.link_id.hex()} after response processing error: {send_e}")
-    def send_via_proxy(self, target_dest_hash, data_to_send, proxy_alias=None, response_callback=None, timeout_s=30): # Client-side
+    def send_via_proxy(self, target_dest_hash, data_to_send, proxy_alias=None, response_callback=None, timeout_s=30, deadline=None, target_name=None): # Client-side
+        """Send `data_to_send` to `target_dest_hash` through a proxy route. Returns the request id, or None on failure.
+
+        `target_name` is the target's full destination name (`app_name.aspect...`). It is required: the proxy node
+        rebuilds the outbound Destination from the recalled identity and this name, and checks it against the hash.
+
+        The end-to-end budget is the earliest of `timeout_s`, `deadline` and any enclosing `deadline_scope`; each step
+        waits only for the remaining time and the remainder travels in the envelope as `deadline_ms`. With none of
+        them set (`timeout_s=None`) the steps wait without a limit and no `deadline_ms` is sent. With a tracer
+        configured and the request sampled, a `proxy.client.request` span is started here and its context travels as
+        `trace`; unsampled requests carry no trace field at all. For requests with a `response_callback` the span ends
+        when the response (or error) arrives.
+        """
+        span = self.tracer.start_span('proxy.client.request', target=target_dest_hash, route=proxy_alias) if self.tracer else None
+        request_id = self._send_via_proxy(target_dest_hash, data_to_send, proxy_alias, response_callback, timeout_s, deadline, span, target_name)
+        if span and (request_id is None or not response_callback): span.end(outcome='sent' if request_id else 'send_failed', request_id=request_id)
+        return request_id
+    def _send_via_proxy(self, target_dest_hash, data_to_send, proxy_alias, response_callback, timeout_s, deadline, span, target_name):
         if not RNS_AVAILABLE or not self.rns_instance: self.logger.error("RNS NA for proxy send."); return None
+        dl = effective_deadline(deadline, timeout_s)
+        if dl is not None and dl.expired(): self.logger.error(f"Deadline already expired; not sending to {target_dest_hash[:8]} via proxy."); return None
         route=next((r for r in self.proxy_routes if r['alias']==proxy_alias),self.proxy_routes[0] if self.proxy_routes else None)
         if not route: self.logger.error(f"Proxy route '{proxy_alias or 'default'}' not found."); return None
         if not RNS_HASH_REGEX.match(target_dest_hash): self.logger.error(f"Invalid target_destination_hash format: {target_dest_hash}"); return None
-        self.logger.info(f"Client sending to {target_dest_hash[:8]} via proxy '{route['alias']}' (entry: {route['entry_destination_name_str']})")
+        if not target_name: self.logger.error(f"No target_name for {target_dest_hash[:8]}; the proxy node needs it to address the target."); return None
+        cb_key = f"proxy:{route['alias']}"; reg = self.breaker_registry
+        if reg is not None and not reg.allow_request(cb_key):
+            self.logger.warning(f"Proxy route '{route['alias']}' breaker open; failing fast for {target_dest_hash[:8]}.")
+            if self.metrics_monitor: self.metrics_monitor.increment_breaker_rejection('proxy')
+            return None
+        self.logger.debug("Client sending to %.8s via proxy '%s' (entry: %s)", target_dest_hash, route['alias'], route['entry_destination_name_str'])
+        t_stage = time.monotonic()
         try:
-            proxy_server_identity = Identity.recall(bytes.fromhex(route['exit_node_identity_hash_hex']))
-            if not proxy_server_identity: self.logger.warning(f"Proxy server identity {route['exit_node_identity_hash_hex'][:8]}... not cached. Requesting..."); proxy_server_identity = Identity.request(bytes.fromhex(route['exit_node_identity_hash_hex']), timeout=timeout_s/2);
+            entry_hash = Destination.hash_from_name_and_identity(route['entry_destination_name_str'], bytes.fromhex(route['exit_node_identity_hash_hex']))
+            proxy_server_identity = Identity.recall(entry_hash)
+            if not proxy_server_identity: self.logger.warning(f"Proxy server identity {route['exit_node_identity_hash_hex'][:8]}... not cached. Requesting path..."); Transport.request_path(entry_hash); proxy_server_identity = self._await_identity(entry_hash, dl.remaining()/2 if dl is not None else None)
             if not proxy_server_identity: raise ValueError(f"Proxy server identity {route['exit_node_identity_hash_hex'][:8]}... unavailable.")
             proxy_entry_dest = Destination(proxy_server_identity, Destination.OUT, Destination.SINGLE, *route['entry_destination_name_str'].split('.'))
-        except ValueError as e: self.logger.error(f"Invalid Identity hash for proxy '{route['alias']}': {route['exit_node_identity_hash_hex']}. Error: {e}"); return None
-        except Exception as e: self.logger.error(f"Failed to create RNS Dest for proxy entry '{route['entry_destination_name_str']}': {e}", exc_info=True); return None
+        except ValueError as e: self.logger.error(f"Invalid Identity hash for proxy '{route['alias']}': {route['exit_node_identity_hash_hex']}. Error: {e}"); reg.record_failure(cb_key) if reg is not None else None; return None
+        except Exception as e: self.logger.error(f"Failed to create RNS Dest for proxy entry '{route['entry_destination_name_str']}': {e}", exc_info=True); reg.record_failure(cb_key) if reg is not None else None; return None
+        t_stage = self._record_stage(route['alias'], 'identity_resolution', since=t_stage)
         request_id = os.urandom(8).hex()
         try: payload_b64 = base64.b64encode(data_to_send).decode('utf-8') 
-        except Exception as e: self.logger.error(f"Failed to base64 encode data for proxy request {request_id}: {e}"); return None
-        proxy_req_data = {"version": self.proxy_protocol_version, "type": "request" if response_callback else "data_oneway", "request_id": request_id, "target_destination_hash": target_dest_hash, "payload": payload_b64}
-        try: proxy_req_bytes = json.dumps(proxy_req_data).encode('utf-8')
-        except Exception as e: self.logger.error(f"Failed to JSON encode proxy request {request_id}: {e}"); return None
+        except Exception as e: self.logger.error(f"Failed to base64 encode data for proxy request {request_id}: {e}"); reg.release_trial(cb_key) if reg is not None else None; return None
+        proxy_req_data = {"version": self.proxy_protocol_version, "type": "request" if response_callback else "data_oneway", "request_id": request_id, "target_destination_hash": target_dest_hash, "target_destination_name": target_name, "payload": payload_b64}
+        if span and span.sampled: proxy_req_data["trace"] = span.context(); span.set(route=route['alias'], request_id=request_id)
         try:
-            link_to_proxy = Link(proxy_entry_dest, self.rns_instance.identity) 
             established_event = threading.Event()
-            link_to_proxy.set_established_callback(lambda l: established_event.set())
-            link_to_proxy.set_link_closed_callback(lambda l: self.logger.info(f"Link to proxy server {l.destination.hash_hex()[:8]} closed."))
+            link_to_proxy = Link(proxy_entry_dest, established_callback=lambda l: established_event.set())
+            link_to_proxy.set_link_closed_callback(lambda l: self.logger.debug("Link to proxy server %.8s closed.", l.destination.hexhash))
             if response_callback: link_to_proxy.set_resource_callback(lambda res: self._handle_proxy_response_on_client(res, response_callback, request_id))
-            self.logger.debug(f"Attempting to establish link to proxy {proxy_entry_dest.hash_hex()[:8]}...")
-            if not established_event.wait(timeout=timeout_s): self.logger.error(f"Timeout establishing link to proxy server {proxy_entry_dest.hash_hex()[:8]}."); link_to_proxy.close(); return None
-            self.logger.debug(f"Link to proxy {proxy_entry_dest.hash_hex()[:8]} established. Sending request {request_id}...")
+            self.logger.debug("Attempting to establish link to proxy %.8s...", proxy_entry_dest.hexhash)
+            if not established_event.wait(timeout=dl.remaining() if dl is not None else None) or (dl is not None and dl.expired()): self.logger.error(f"Timeout establishing link to proxy server {proxy_entry_dest.hexhash[:8]}."); link_to_proxy.close(); reg.record_failure(cb_key) if reg is not None else None; return None
+            self._record_stage(route['alias'], 'link_establishment', since=t_stage)
+            self.logger.debug("Link to proxy %.8s established. Sending request %s...", proxy_entry_dest.hexhash, request_id)
+            if dl is not None: proxy_req_data["deadline_ms"] = dl.to_wire_ms() # remaining budget, stamped as late as possible
+            try: proxy_req_bytes = json.dumps(proxy_req_data).encode('utf-8')
+            except Exception as e: self.logger.error(f"Failed to JSON encode proxy request {request_id}: {e}"); link_to_proxy.close(); reg.release_trial(cb_key) if reg is not None else None; return None
+            if response_callback:
+                with self.lock: self.pending_request_meta[request_id] = {'deadline': dl, 'route': route['alias'], 'sent_at': time.monotonic(), 'span': span}
             link_to_proxy.send(proxy_req_bytes)
+            if reg is not None: reg.record_success(cb_key)
             if self.metrics_monitor: self.metrics_monitor.increment_proxied_packets(route['alias'], direction='sent_to_proxy')
-            if not response_callback: link_to_proxy.close(); self.logger.debug(f"One-way data sent to proxy {proxy_entry_dest.hash_hex()[:8]} for request {request_id}. Link closed.")
+            if not response_callback: link_to_proxy.close(); self.logger.debug("One-way data sent to proxy %.8s for request %s. Link closed.", proxy_entry_dest.hexhash, request_id)
             return request_id # Success
-        except Exception as e: self.logger.error(f"Error in send_via_proxy for '{route['alias']}': {e}", exc_info=True); return None
+        except Exception as e: self.logger.error(f"Error in send_via_proxy for '{route['alias']}': {e}", exc_info=True); reg.record_failure(cb_key) if reg is not None else None; return None
+    def _await_identity(self, destination_hash, timeout):
+        """Poll Identity.recall until the path request's answer brings the identity in, or `timeout` (None = no limit) passes."""
+        end = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            identity = Identity.recall(destination_hash)
+            if identity or (end is not None and time.monotonic() >= end): return identity
+            time.sleep(IDENTITY_POLL_INTERVAL_S if end is None else min(IDENTITY_POLL_INTERVAL_S, max(0.0, end - time.monotonic())))
     def _handle_proxy_response_on_client(self, resource, original_response_callback, original_request_id): # Client-side
-        if not RNS_AVAILABLE: return; link_id_hex = resource.link.link_id.hex(); self.logger.debug(f"Client received resource from proxy link {link_id_hex}. Size: {len(resource.data)}")
+        if not RNS_AVAILABLE: return
+        resp_at = time.monotonic(); link_id_hex = resource.link.link_id.hex(); self.logger.debug("Client received resource from proxy link %s. Size: %d", link_id_hex, len(resource.data))
         try:
             proxy_response = json.loads(resource.data.decode('utf-8')); received_request_id = proxy_response.get("request_id")
             if received_request_id != original_request_id: self.logger.warning(f"Received proxy response with mismatched request_id ({received_request_id} != {original_request_id}). Ignoring."); return
+            with self.lock: meta = self.pending_request_meta.pop(original_request_id, None)
+            if meta and meta.get('sent_at') is not None:
+                # No shared clock with the proxy: network RTT (both directions) = our round trip minus the proxy's reported residence
+                residence_s = ((proxy_response.get("timings_ms") or {}).get("proxy_residence") or 0.0) / 1000.0
+                self._record_stage(meta['route'], 'client_proxy_network_rtt', max(0.0, resp_at - meta['sent_at'] - residence_s))
+            if meta and meta.get('span'): meta['span'].end(outcome='error' if "error" in proxy_response else 'response', error=proxy_response.get("error"))
             if "error" in proxy_response: error_msg = proxy_response['error']; self.logger.error(f"Proxy returned error for request_id {original_request_id}: {error_msg}"); original_response_callback(None, error_msg) if original_response_callback else None
             elif "payload" in proxy_response:
-                try: actual_response_data = base64.b64decode(proxy_response["payload"]); self.logger.debug(f"Received response payload for request {original_request_id} (size: {len(actual_response_data)} bytes)."); original_response_callback(actual_response_data, None) if original_response_callback else None
+                try: actual_response_data = base64.b64decode(proxy_response["payload"]); self.logger.debug("Received response payload for request %s (size: %d bytes).", original_request_id, len(actual_response_data)); original_response_callback(actual_response_data, None) if original_response_callback else None
                 except Exception as decode_err: self.logger.error(f"Error decoding payload from proxy response for {original_request_id}: {decode_err}"); original_response_callback(None, f"Proxy response payload decode error: {decode_err}") if original_response_callback else None
             else: self.logger.warning(f"Received proxy response for {original_request_id} with no payload or error."); original_response_callback(None, "Empty proxy response") if original_response_callback else None
         except (json.JSONDecodeError, UnicodeDecodeError) as e: self.logger.error(f"Error decoding/parsing proxy response JSON: {e}"); original_response_callback(None, f"Proxy response JSON decode error: {e}") if original_response_callback else None
         except Exception as e: self.logger.error(f"Unexpected error processing proxy response: {e}", exc_info=True); original_response_callback(None, f"Unexpected error: {e}") if original_response_callback else None
         finally:
-            if resource.link and resource.link.is_active(): self.logger.debug(f"Closing link to proxy {link_id_hex} after receiving response for {original_request_id}."); resource.link.close()
+            if resource.link and resource.link.is_active(): self.logger.debug("Closing link to proxy %s after receiving response for %s.", link_id_hex, original_request_id); resource.link.close()
     def periodic_check(self):
         with self.lock: 
-            if self.is_proxy_node: count=len(self.active_client_links); self.logger.debug(f"ProxyMan (node) check. Active links:{count}"); self.metrics_monitor.set_active_proxy_clients_count(count) if self.metrics_monitor else None
-            else: self.logger.debug(f"ProxyMan (client) check. Config routes:{len(self.proxy_routes)}")
-    def _shutdown_client_proxy_resources(self): self.logger.info("Shutting down client proxy resources."); self.proxy_routes=[]
+            if self.is_proxy_node:
+                count=len(self.active_client_links); self.logger.debug(f"ProxyMan (node) check. Active links:{count}"); self._close_drained_destinations() if self._draining_destinations else None; self.metrics_monitor.set_active_proxy_clients_count(count) if self.metrics_monitor else None
+                expired = [rid for rid, meta in self.pending_request_meta.items() if meta.get('deadline') and meta['deadline'].expired()]
+                for rid in expired: self.pending_client_requests.pop(rid, None); self._end_span(self.pending_request_meta.pop(rid, None), 'expired')
+                if expired: self.logger.debug(f"Purged {len(expired)} pending requests past their deadline.")
+            else:
+                self.logger.debug(f"ProxyMan (client) check. Config routes:{len(self.proxy_routes)}")
+                for rid in [rid for rid, meta in self.pending_request_meta.items() if meta.get('deadline') and meta['deadline'].expired()]: self._end_span(self.pending_request_meta.pop(rid), 'expired')
+    def _record_stage(self, route, stage, seconds=None, since=None):
+        """Record a request-stage latency (given directly or as time elapsed `since`); returns now for chaining."""
+        now = time.monotonic()
+        if self.metrics_monitor: self.metrics_monitor.record_proxy_stage(route, stage, seconds if seconds is not None else now - since)
+        return now
+    @staticmethod
+    def _end_span(meta, outcome):
+        if meta and meta.get('span'): meta['span'].end(outcome=outcome)
+    def _shutdown_client_proxy_resources(self): self.logger.info("Shutting down client proxy resources."); self.proxy_routes=[]; self.pending_request_meta.clear()
     def _shutdown_proxy_service_destination(self):  # Server-side cleanup
         if not RNS_AVAILABLE:
             return
         with self.lock:
-            if self.service_destination:
-                self.logger.info(f"Closing proxy service destination {self.service_destination.hash_hex()}...")
-                try:
-                    self.service_destination.close()
-                except Exception as e:
-                    self.logger.error(f"Error closing proxy service destination: {e}")
-                self.service_destination = None
-            for link_id, link in list(self.active_client_links.items()):
-                self.logger.debug(f"Closing active client link {link_id} during shutdown.")
-                try:
-                    if link.is_active():
-                        link.close()
-                except Exception as e:
-                    self.logger.error(f"Error closing client link {link_id}: {e}")
-            self.active_client_links.clear()
-            self.pending_client_requests.clear()
-            if self.metrics_monitor:
-                self.metrics_monitor.set_active_proxy_clients_count(0)
+            self._shutdown_proxy_service_destination_locked()
+    def _shutdown_proxy_service_destination_locked(self):  # caller holds self.lock
+        if not RNS_AVAILABLE:
+            return
+        if self.service_destination:
+            self.logger.info(f"Closing proxy service destination {self.service_destination.hexhash}...")
+            try:
+                self.service_destination.close()
+            except Exception as e:
+                self.logger.error(f"Error closing proxy service destination: {e}")
+            self.service_destination = None
+        for link_id, link in list(self.active_client_links.items()):
+            self.logger.debug(f"Closing active client link {link_id} during shutdown.")
+            try:
+                if link.is_active():
+                    link.close()
+            except Exception as e:
+                self.logger.error(f"Error closing client link {link_id}: {e}")
+        self.active_client_links.clear(); self._close_drained_destinations()
+        self.pending_client_requests.clear()
+        self.pending_request_meta.clear()
+        if self.metrics_monitor:
+            self.metrics_monitor.set_active_proxy_clients_count(0)
     def shutdown(self):
         self.logger.info("ProxyManager shutting down...")
+        if self._scheduler is not None: self._scheduler.remove_task(TASK_CHECK); self._scheduler = None
         if self.is_proxy_node:
             self._shutdown_proxy_service_destination()
         else:
@@ -1,50 +1,271 @@
-import time, random
+import time, random, threading, contextvars, itertools
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from akita_ares.core.logger import get_logger
+from akita_ares.core.retry_budget import RetryBudget
+from akita_ares.core.latency_tracker import LatencyTracker
+from akita_ares.core.striped_counter import StripedCounter
+from akita_ares.core.deadline import DeadlineExceededException, deadline_scope, effective_deadline
+from akita_ares.core.circuit_breaker import CircuitBreakerOpenException
 RNS_RETRYABLE_EXCEPTIONS = (Exception,)
+GLOBAL_RETRY_BUDGET_NAME = "__global__"
+STATS_KEYS = dict.fromkeys(('total_executions', 'successes', 'failures_after_retries', 'successes_on_retry', 'budget_exhausted', 'hedges_issued', 'hedges_won', 'deadline_exceeded', 'breaker_rejected'), 0)
+BatchOp = namedtuple('BatchOp', ['func', 'args', 'kwargs', 'breaker_key'], defaults=((), None, None))
+BatchResult = namedtuple('BatchResult', ['index', 'result', 'error', 'attempts', 'duration'])
+def _lru_victims(store, keep, last_used):
+    """Keys of `store` to drop, oldest `last_used(value)` first, so that at most `keep` entries remain."""
+    excess = len(store) - max(0, keep)
+    if excess <= 0: return []
+    return [k for k, _ in sorted(store.items(), key=lambda kv: last_used(kv[1]))[:excess]]
 class RetryManager:
-    def __init__(self, config, metrics_monitor=None):
-        self.logger = get_logger("Feature.RetryManager"); self.metrics_monitor = metrics_monitor
-        self.stats = {'total_executions': 0, 'successes': 0, 'failures_after_retries': 0, 'successes_on_retry': 0}
+    def __init__(self, config, metrics_monitor=None, breaker_registry=None):
+        self.logger = get_logger("Feature.RetryManager"); self.metrics_monitor = metrics_monitor; self.breaker_registry = breaker_registry
+        self._stats = StripedCounter() # lock-free per-thread counts; exec_many and hedging call in from many threads
+        self.global_retry_budget = None; self.op_retry_budgets = {}; self._budget_lock = threading.Lock()
+        self.hedge_budget = None; self.latency_trackers = {}; self._hedge_pool = None; self._batch_pool = None; self._batch_pool_size = 0
         self.update_config(config)
     def update_config(self, config):
         self.config = config; self.default_max_retries=config.get('default_max_retries',3); self.default_delay_seconds=config.get('default_delay_seconds',1); self.default_backoff_factor=config.get('default_backoff_factor',2); self.default_jitter_max_seconds=config.get('default_jitter_max_seconds',0.5); self.log_retries=config.get('log_retries',True)
-        self.logger.info(f"RetryMan cfg updated: MaxR={self.default_max_retries}, Delay={self.default_delay_seconds}s...")
+        self.retry_budget_enabled=config.get('retry_budget_enabled',True); self.retry_budget_ratio=config.get('retry_budget_ratio',0.1); self.retry_budget_min_per_second=config.get('retry_budget_min_per_second',1.0); self.retry_budget_max_tokens=config.get('retry_budget_max_tokens',10)
+        self.global_retry_budget_min_per_second=config.get('global_retry_budget_min_per_second',10.0); self.global_retry_budget_max_tokens=config.get('global_retry_budget_max_tokens',100)
+        self.max_tracked_operations=max(1,int(config.get('max_tracked_operations',1024)))
+        with self._budget_lock:
+            if self.global_retry_budget: self.global_retry_budget.update(self.retry_budget_ratio,self.global_retry_budget_min_per_second,self.global_retry_budget_max_tokens)
+            else: self.global_retry_budget = RetryBudget(self.retry_budget_ratio,self.global_retry_budget_min_per_second,self.global_retry_budget_max_tokens,name=GLOBAL_RETRY_BUDGET_NAME)
+            for b in self.op_retry_budgets.values(): b.update(self.retry_budget_ratio,self.retry_budget_min_per_second,self.retry_budget_max_tokens)
+            self._evict_op_budgets(self.max_tracked_operations)
+            for name in _lru_victims(self.latency_trackers, self.max_tracked_operations, lambda t: t.last_activity): del self.latency_trackers[name]
+        self.default_attempt_timeout_seconds=config.get('default_attempt_timeout_seconds'); self.deadline_min_attempt_seconds=config.get('deadline_min_attempt_seconds',0.05)
+        self.hedging_enabled=config.get('hedging_enabled',False); self.hedge_percentile=config.get('hedge_percentile',95); self.hedge_min_samples=config.get('hedge_min_samples',20); self.hedge_initial_delay_seconds=config.get('hedge_initial_delay_seconds',1.0); self.hedge_min_delay_seconds=config.get('hedge_min_delay_seconds',0.01)
+        self.hedge_budget_ratio=config.get('hedge_budget_ratio',0.05); self.hedge_budget_max_tokens=config.get('hedge_budget_max_tokens',10); self.hedge_max_workers=config.get('hedge_max_workers',8)
+        self.batch_max_concurrency=config.get('batch_max_concurrency',8)
+        with self._budget_lock:
+            if self.hedge_budget: self.hedge_budget.update(self.hedge_budget_ratio,0,self.hedge_budget_max_tokens)
+            else: self.hedge_budget = RetryBudget(self.hedge_budget_ratio,0,self.hedge_budget_max_tokens,name="__hedge__")
+        self.logger.info(f"RetryMan cfg updated: MaxR={self.default_max_retries}, Delay={self.default_delay_seconds}s, Budget={'on' if self.retry_budget_enabled else 'off'} (ratio={self.retry_budget_ratio}), Hedging={'on' if self.hedging_enabled else 'off'}...")
+    def _get_op_budget(self, op_name):
+        budget = self.op_retry_budgets.get(op_name)
+        if budget is None:
+            with self._budget_lock:
+                budget = self.op_retry_budgets.get(op_name)
+                if budget is None:
+                    self._evict_op_budgets(self.max_tracked_operations - 1)
+                    budget = self.op_retry_budgets[op_name] = RetryBudget(self.retry_budget_ratio,self.retry_budget_min_per_second,self.retry_budget_max_tokens,name=op_name)
+        return budget
+    def _evict_op_budgets(self, keep): # caller holds self._budget_lock
+        """Drop the least recently used per-op budgets (and their gauge series) until at most `keep` remain.
+
+        Op names such as `RNSReq.<dest hash>` are unbounded; an evicted op that comes back starts with a full bucket."""
+        for name in _lru_victims(self.op_retry_budgets, keep, lambda b: b.last_activity):
+            del self.op_retry_budgets[name]
+            if self.metrics_monitor: self.metrics_monitor.remove_retry_budget_tokens(name)
+    def _acquire_retry_budget(self, op_name):
+        """Withdraw one retry token from both the per-op and the global budget, or neither."""
+        if not self.retry_budget_enabled: return True
+        op_budget = self._get_op_budget(op_name)
+        if not op_budget.try_withdraw(): return False
+        if not self.global_retry_budget.try_withdraw(): op_budget.refund(); return False
+        return True
+    def _record_budget_success(self, op_name):
+        if not self.retry_budget_enabled: return
+        op_budget = self._get_op_budget(op_name); op_budget.deposit(); self.global_retry_budget.deposit()
+        if self.metrics_monitor: self.metrics_monitor.set_retry_budget_tokens(op_name, op_budget.tokens); self.metrics_monitor.set_retry_budget_tokens(GLOBAL_RETRY_BUDGET_NAME, self.global_retry_budget.tokens)
+    def _get_latency_tracker(self, op_name):
+        """Tracker for `op_name`, created on demand; the least recently recorded ones go past `max_tracked_operations`."""
+        tracker = self.latency_trackers.get(op_name)
+        if tracker is None:
+            with self._budget_lock:
+                tracker = self.latency_trackers.get(op_name)
+                if tracker is None:
+                    for name in _lru_victims(self.latency_trackers, self.max_tracked_operations - 1, lambda t: t.last_activity): del self.latency_trackers[name]
+                    tracker = self.latency_trackers[op_name] = LatencyTracker()
+        return tracker
+    def _get_hedge_pool(self):
+        if self._hedge_pool is None:
+            with self._budget_lock:
+                if self._hedge_pool is None: self._hedge_pool = ThreadPoolExecutor(max_workers=self.hedge_max_workers, thread_name_prefix="ARESHedge")
+        return self._hedge_pool
+    def _get_batch_pool(self, size):
+        """Shared pool for exec_many, replaced by a bigger one when a batch asks for more workers than it has.
+
+        A replaced pool is never shut down: batches still running hold it and keep submitting to it, and its idle
+        workers exit once the last of them lets it go (ThreadPoolExecutor stops workers of a collected executor)."""
+        if self._batch_pool is None or self._batch_pool_size < size:
+            with self._budget_lock:
+                if self._batch_pool is None or self._batch_pool_size < size:
+                    self._batch_pool_size = max(size, self.batch_max_concurrency)
+                    self._batch_pool = ThreadPoolExecutor(max_workers=self._batch_pool_size, thread_name_prefix="ARESBatch")
+        return self._batch_pool
+    def _hedge_delay(self, op_name):
+        tracker = self._get_latency_tracker(op_name)
+        if len(tracker) < self.hedge_min_samples: return self.hedge_initial_delay_seconds
+        return max(self.hedge_min_delay_seconds, tracker.percentile(self.hedge_percentile))
+    def _submit(self, pool, fn, *args, **kwargs):
+        return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs) # carry the deadline scope into the worker
+    def _exec_hedged(self, op_func, args, kwargs, op_name, hedge_op_func=None, deadline=None):
+        """Run one attempt; if it outlives the op's latency percentile, race a second copy (budget permitting).
+
+        The first success wins. The loser is cancelled if it has not started yet; otherwise its result is discarded.
+        """
+        pool = self._get_hedge_pool(); tracker = self._get_latency_tracker(op_name); mm = self.metrics_monitor
+        self.hedge_budget.deposit(); start_t = time.monotonic()
+        def _primary_done(f):
+            dur = time.monotonic() - start_t
+            if f.cancelled(): return  # never ran: its "latency" is just how long it sat queued before losing
+            if f.exception() is None: tracker.record(dur)
+            if mm: mm.record_hedge_latency(op_name, 'primary', dur)
+        primary = self._submit(pool, op_func, *args, **kwargs); primary.add_done_callback(_primary_done)
+        done, _ = wait([primary], timeout=deadline.cap(self._hedge_delay(op_name)) if deadline else self._hedge_delay(op_name))
+        if not done:
+            if deadline and deadline.expired(): raise DeadlineExceededException(f"Op '{op_name}' deadline expired before hedge")
+            if self.hedge_budget.try_withdraw():
+                self._stats.inc('hedges_issued'); mm.increment_hedge(op_name, 'issued') if mm else None
+                if self.log_retries: self.logger.debug(f"Op '{op_name}' outstanding {time.monotonic()-start_t:.3f}s; issuing hedge.")
+                hedge = self._submit(pool, hedge_op_func or op_func, *args, **kwargs); pending = {primary, hedge}; last_ex = None
+                while pending:
+                    done, pending = wait(pending, timeout=deadline.remaining() if deadline else None, return_when=FIRST_COMPLETED)
+                    if not done: raise DeadlineExceededException(f"Op '{op_name}' deadline expired with hedged attempts outstanding")
+                    for f in done:
+                        if f.exception() is not None: last_ex = f.exception(); continue
+                        for loser in pending: loser.cancel()
+                        if f is hedge: self._stats.inc('hedges_won'); mm.increment_hedge(op_name, 'won') if mm else None
+                        if mm: mm.record_hedge_latency(op_name, 'effective', time.monotonic() - start_t)
+                        return f.result()
+                if mm: mm.record_hedge_latency(op_name, 'effective', time.monotonic() - start_t)
+                raise last_ex
+            mm.increment_hedge(op_name, 'budget_denied') if mm else None
+        try:
+            done, _ = wait([primary], timeout=deadline.remaining() if deadline else None)
+            if not done: raise DeadlineExceededException(f"Op '{op_name}' deadline expired with attempt outstanding")
+            return primary.result()
+        finally:
+            if mm: mm.record_hedge_latency(op_name, 'effective', time.monotonic() - start_t)
     def _calc_delay(self, att, base_d, back_f, jit_max): delay=base_d*(back_f**(att-1)); delay=max(0,delay+random.uniform(-jit_max,jit_max)) if jit_max>0 else delay; return delay
-    def exec_w_retry(self, op_func, *args, max_r=None,delay_s=None,back_f=None,jit_max_s=None,retry_ex=None,op_name="UnnamedOp",**kwargs):
-        self.stats['total_executions'] += 1; required_retries = 0
+    def exec_w_retry(self, op_func, *args, max_r=None,delay_s=None,back_f=None,jit_max_s=None,retry_ex=None,op_name="UnnamedOp",hedge=None,hedge_op_func=None,deadline=None,attempt_timeout_s=None,timeout_kw=None,breaker_key=None,**kwargs):
+        """Run `op_func` with retries. With `hedge` (default: config `hedging_enabled`) each attempt is hedged;
+        `hedge_op_func`, if given, is called with the same arguments for the hedge (e.g. a different proxy route).
+
+        `deadline` (or the enclosing `deadline_scope`) bounds the whole call: attempts run inside the deadline scope,
+        retries that cannot start before it are skipped, and if `timeout_kw` names a keyword of `op_func` it is set to
+        the attempt timeout shrunk to the remaining time.
+
+        With `breaker_key` (e.g. a destination hash) and a breaker registry, an OPEN breaker fails the call at once with
+        CircuitBreakerOpenException and every attempt outcome is fed back into that breaker."""
+        self._stats.inc('total_executions'); required_retries = 0
         _mr,_d,_b,_j = max_r or self.default_max_retries,delay_s or self.default_delay_seconds,back_f or self.default_backoff_factor,jit_max_s or self.default_jitter_max_seconds
         _rx = retry_ex or RNS_RETRYABLE_EXCEPTIONS
         if not isinstance(_rx,tuple): self.logger.error("retryable_exceptions must be tuple"); _rx=(Exception,)
+        _hedge = self.hedging_enabled if hedge is None else hedge
+        _dl = effective_deadline(deadline); _at = attempt_timeout_s or self.default_attempt_timeout_seconds
+        _reg = self.breaker_registry if breaker_key is not None else None
         last_ex,start_t = None,time.monotonic()
         for att in range(1,_mr+2):
             try:
                 if self.log_retries and att>1: self.logger.info(f"Att {att}/{_mr+1} for '{op_name}'.")
-                res=op_func(*args,**kwargs)
-                self.stats['successes'] += 1; success = True
-                if att>1: self.stats['successes_on_retry'] += 1; required_retries = att - 1
+                if _dl and _dl.expired(): raise DeadlineExceededException(f"Op '{op_name}' deadline expired before att {att}")
+                if _reg is not None and not _reg.allow_request(breaker_key): raise CircuitBreakerOpenException(f"Breaker for '{breaker_key}' is open")
+                if timeout_kw and (_at or _dl): kwargs[timeout_kw] = _dl.cap(_at) if _dl else _at
+                att_t = time.monotonic()
+                try:
+                    with deadline_scope(deadline=_dl):
+                        res=self._exec_hedged(op_func,args,kwargs,op_name,hedge_op_func,_dl) if _hedge else op_func(*args,**kwargs)
+                except DeadlineExceededException:
+                    if _reg is not None: _reg.release_trial(breaker_key)
+                    raise
+                except Exception:
+                    if _reg is not None: _reg.record_failure(breaker_key)
+                    raise
+                if _reg is not None: _reg.record_success(breaker_key)
+                if not _hedge and _dl: self._get_latency_tracker(op_name).record(time.monotonic()-att_t) # only deadline-bound retries read it
+                self._stats.inc('successes'); success = True; self._record_budget_success(op_name)
+                if att>1: self._stats.inc('successes_on_retry'); required_retries = att - 1
                 if self.metrics_monitor: dur=time.monotonic()-start_t; self.metrics_monitor.record_operation_duration(op_name,dur); self.metrics_monitor.update_retry_stats(op_name, success=True, required_retries=required_retries)
                 return res
+            except CircuitBreakerOpenException as e:
+                self._stats.inc('failures_after_retries'); self._stats.inc('breaker_rejected')
+                if self.log_retries: self.logger.warning(f"Op '{op_name}' rejected on att {att}: {e}")
+                if self.metrics_monitor: self.metrics_monitor.increment_breaker_rejection('retry'); self.metrics_monitor.update_retry_stats(op_name, success=False, required_retries=att-1)
+                raise
+            except DeadlineExceededException as e:
+                self._stats.inc('failures_after_retries'); self._stats.inc('deadline_exceeded')
+                self.logger.error(f"Op '{op_name}' deadline exceeded on att {att}: {e}")
+                if self.metrics_monitor: dur=time.monotonic()-start_t; self.metrics_monitor.record_operation_duration(op_name,dur); self.metrics_monitor.update_retry_stats(op_name, success=False, required_retries=att-1)
+                raise
             except _rx as e:
                 last_ex=e
                 if self.log_retries: self.logger.warning(f"Op '{op_name}' att {att} fail: {e.__class__.__name__}: {e}")
                 if att>_mr:
-                    self.stats['failures_after_retries'] += 1; success = False
+                    self._stats.inc('failures_after_retries'); success = False
                     self.logger.error(f"Op '{op_name}' failed after {att-1} retries. Err: {e}")
                     if self.metrics_monitor: dur=time.monotonic()-start_t; self.metrics_monitor.record_operation_duration(op_name,dur); self.metrics_monitor.update_retry_stats(op_name, success=False, required_retries=att-1)
                     raise last_ex
                 cur_d=self._calc_delay(att,_d,_b,_j)
+                tracker = self.latency_trackers.get(op_name) if _dl else None
+                if _dl and _dl.remaining() < cur_d + (tracker.percentile(50, default=self.deadline_min_attempt_seconds) if tracker else self.deadline_min_attempt_seconds):
+                    self._stats.inc('failures_after_retries'); self._stats.inc('deadline_exceeded')
+                    self.logger.error(f"Op '{op_name}' skipping retry: {_dl.remaining():.3f}s left before deadline. Err: {e}")
+                    if self.metrics_monitor: dur=time.monotonic()-start_t; self.metrics_monitor.record_operation_duration(op_name,dur); self.metrics_monitor.update_retry_stats(op_name, success=False, required_retries=att-1)
+                    raise last_ex
+                if not self._acquire_retry_budget(op_name):
+                    self._stats.inc('failures_after_retries'); self._stats.inc('budget_exhausted')
+                    self.logger.error(f"Op '{op_name}' retry budget exhausted after att {att}; failing fast. Err: {e}")
+                    if self.metrics_monitor: dur=time.monotonic()-start_t; self.metrics_monitor.record_operation_duration(op_name,dur); self.metrics_monitor.update_retry_stats(op_name, success=False, required_retries=att-1); self.metrics_monitor.increment_retry_budget_exhausted(op_name)
+                    raise last_ex
+                if self.metrics_monitor and self.retry_budget_enabled: self.metrics_monitor.set_retry_budget_tokens(op_name, self._get_op_budget(op_name).tokens); self.metrics_monitor.set_retry_budget_tokens(GLOBAL_RETRY_BUDGET_NAME, self.global_retry_budget.tokens)
                 if self.log_retries: self.logger.info(f"Retry Op '{op_name}' in {cur_d:.2f}s...")
                 time.sleep(cur_d)
             except Exception as e:
-                self.stats['failures_after_retries'] += 1; success = False
+                self._stats.inc('failures_after_retries'); success = False
                 self.logger.error(f"Op '{op_name}' non-retryable err: {e.__class__.__name__}: {e}")
                 if self.metrics_monitor: dur=time.monotonic()-start_t; self.metrics_monitor.record_operation_duration(op_name,dur); self.metrics_monitor.update_retry_stats(op_name, success=False, required_retries=att-1)
                 raise
-        self.stats['failures_after_retries'] += 1
+        self._stats.inc('failures_after_retries')
         if self.metrics_monitor: self.metrics_monitor.update_retry_stats(op_name, success=False, required_retries=_mr)
         if last_ex: raise last_ex
         raise Exception(f"Retry logic fail for {op_name}")
     def wrap_rns_req(self, rns_req_f, op_name_pref="RNSReq"):
-        def wr(*a,**kw): op_n=op_name_pref; dest=kw.get('destination',a[0] if a else None); op_n=f"{op_name_pref}.{dest.name_hash()[:8]}" if hasattr(dest,'name_hash') else op_n; return self.exec_w_retry(rns_req_f,*a,op_name=op_n,**kw)
+        def wr(*a,**kw): op_n=op_name_pref; dest=kw.get('destination',a[0] if a else None); op_n=f"{op_name_pref}.{dest.name_hash()[:8]}" if hasattr(dest,'name_hash') else op_n; return self.exec_w_retry(rns_req_f,*a,op_name=op_n,breaker_key=getattr(dest,'hexhash',None),**kw)
         return wr
-    def get_stats(self): return self.stats.copy()
+    def exec_many(self, ops, max_concurrency=None, op_name="BatchOp", batch_stats=None, **retry_kw):
+        """Run a batch of independent ops with bounded concurrency, yielding a BatchResult per op as each completes.
+
+        `ops` is any iterable (consumed lazily) of callables or BatchOp(func, args, kwargs, breaker_key) tuples. Every
+        item goes through `exec_w_retry` with `retry_kw`, so retry budgets, breakers and deadlines all apply; item
+        failures are reported in `BatchResult.error` rather than raised. Per-batch totals are sent to the metrics
+        monitor and, if `batch_stats` is a dict, written into it once the batch is drained. Batches share one long-lived
+        worker pool; `max_concurrency` bounds each batch's in-flight items.
+        """
+        limit = max(1, int(max_concurrency or self.batch_max_concurrency)); it = iter(enumerate(ops)); in_flight = {}
+        agg = {'items': 0, 'successes': 0, 'failures': 0, 'retries': 0}; lat = LatencyTracker(window=1024); start_t = time.monotonic()
+        def _run(op):
+            op = op if isinstance(op, BatchOp) else BatchOp(op); attempts = [0]
+            def counted(*a, **kw): attempts[0] += 1; return op.func(*a, **kw)
+            t0 = time.monotonic()
+            try: return self.exec_w_retry(counted, *op.args, op_name=op_name, breaker_key=op.breaker_key, **retry_kw, **(op.kwargs or {})), None, attempts[0], time.monotonic()-t0
+            except Exception as e: return None, e, attempts[0], time.monotonic()-t0
+        pool = self._get_batch_pool(limit)
+        try:
+            for idx, op in itertools.islice(it, limit): in_flight[self._submit(pool, _run, op)] = idx
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for f in done:
+                    idx = in_flight.pop(f); res, err, attempts, dur = f.result()
+                    agg['items'] += 1; agg['successes' if err is None else 'failures'] += 1; agg['retries'] += max(0, attempts-1); lat.record(dur)
+                    for nidx, nop in itertools.islice(it, 1): in_flight[self._submit(pool, _run, nop)] = nidx
+                    yield BatchResult(idx, res, err, attempts, dur)
+        finally:
+            for f in in_flight: f.cancel()
+            agg['duration_s'] = time.monotonic()-start_t; agg['p50_s'] = lat.percentile(50, 0.0); agg['p99_s'] = lat.percentile(99, 0.0)
+            if batch_stats is not None: batch_stats.update(agg)
+            if self.metrics_monitor: self.metrics_monitor.record_batch(op_name, agg['successes'], agg['failures'], agg['retries'], agg['duration_s'])
+            self.logger.info(f"Batch '{op_name}' done: {agg['items']} items, {agg['failures']} failed, {agg['retries']} retries in {agg['duration_s']:.2f}s (p99 {agg['p99_s']:.3f}s)")
+    def get_budget_state(self):
+        """Current token balance per operation name plus the global budget."""
+        state = {name: b.tokens for name, b in list(self.op_retry_budgets.items())}
+        state[GLOBAL_RETRY_BUDGET_NAME] = self.global_retry_budget.tokens
+        return state
+    def get_stats(self): return dict(STATS_KEYS, **self._stats.snapshot())
+    stats = property(get_stats)
+    def shutdown(self):
+        if self._hedge_pool: self._hedge_pool.shutdown(wait=False, cancel_futures=True); self._hedge_pool = None
+        if self._batch_pool: self._batch_pool.shutdown(wait=False, cancel_futures=True); self._batch_pool = None; self._batch_pool_size = 0
@@ -1,19 +1,22 @@
 
-import time, os, signal, sys, logging, threading # Added threading
+import time, os, signal, sys, logging, threading, importlib, importlib.util
 from .core.config_manager import ConfigManager
-from .core.logger import setup_logging, get_logger, update_module_log_levels, ARES_LOGGER_NAME
-from .features import request_retries, path_selection, proxying, monitoring
-from .cli.main_cli import parse_args
-
-# Attempt to import RNS
-try:
-    import RNS
-    RNS_AVAILABLE = True
-except ImportError:
-    print("CRITICAL: Reticulum (RNS) library not found. ARES cannot function.", file=sys.stderr)
-    RNS_AVAILABLE = False
-    # Optionally exit here if RNS is absolutely required
-    # sys.exit(1)
+from .core.logger import setup_logging, get_logger, update_module_log_levels, shutdown_logging, ARES_LOGGER_NAME
+from .core.circuit_breaker import CircuitBreakerRegistry
+from .core.tracing import Tracer
+from .core.scheduler import Scheduler
+from .cli.main_cli import parse_args, handle_start_command
+
+# RNS itself is imported by the background initializer; only check that it is installed here
+RNS_AVAILABLE = importlib.util.find_spec("RNS") is not None
+if not RNS_AVAILABLE: print("CRITICAL: Reticulum (RNS) library not found. ARES cannot function.", file=sys.stderr)
+RNS_FEATURE_SECTIONS = ('path_selection', 'destination_proxying')  # need a live Reticulum instance
+
+def _feature(name):
+    """Import a feature module on first use (monitoring pulls in prometheus_client, path selection/proxying pull in RNS)."""
+    return importlib.import_module(f".features.{name}", __package__)
+
+TASK_BREAKER_EVICTION = "circuit_breakers.evict_idle"
 
 DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "examples", "sample_config.json")
 DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "examples", "config_schema.json")
@@ -21,42 +24,52 @@ DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "examples",
 class ARESApp:
     def __init__(self, args):
         self.args = args; self.cli_args_config_path = args.config; self.cli_args_schema_path = args.schema
-        effective_config_path = self.cli_args_config_path or DEFAULT_CONFIG_PATH
-        config_specified_schema_path = None
-        if not self.cli_args_schema_path:
-            try:
-                peek_manager = ConfigManager(effective_config_path, schema_fp=None, validate_on_load=False)
-                config_specified_schema_path = peek_manager.get_section('ares_core').get('config_schema_path')
-            except Exception as e: print(f"Warning: Could not pre-load config '{effective_config_path}': {e}", file=sys.stderr)
+        self.started_at = time.monotonic(); effective_config_path = self.cli_args_config_path or DEFAULT_CONFIG_PATH
+        # Parse once without a schema, find the schema (CLI > config > default), then validate the parsed config
+        self.config_manager = ConfigManager(effective_config_path, schema_fp=None, validate_on_load=False)
+        config_specified_schema_path = None if self.cli_args_schema_path else self.config_manager.get_section('ares_core').get('config_schema_path')
         effective_schema_path = self.cli_args_schema_path or config_specified_schema_path or DEFAULT_SCHEMA_PATH
         if not os.path.isabs(effective_schema_path) and '~' not in effective_schema_path:
             if self.cli_args_schema_path: pass
             elif config_specified_schema_path: effective_schema_path = os.path.join(os.path.dirname(effective_config_path), effective_schema_path)
-        self.config_manager = ConfigManager(effective_config_path, effective_schema_path)
+        self.config_manager.set_schema(effective_schema_path)
         self.config = self.config_manager.get_config()
         log_config = self.config.get('logging', {}); cli_log_level = self.args.loglevel; effective_log_level = cli_log_level or log_config.get('level', 'INFO')
-        setup_logging(level=effective_log_level, log_file=log_config.get('file', 'ares.log'), max_bytes=log_config.get('max_bytes', 10*1024*1024), backup_count=log_config.get('backup_count', 5), console_output=log_config.get('console_output', True), module_levels=log_config.get('module_levels'))
+        self._setup_logging(log_config, cli_log_level)
         self.logger = get_logger("ARESApp")
         self.logger.info(f"ARES Version {self.__get_version()} initializing...")
-        self.logger.info(f"Using config: {self.config_manager.config_file_path}")
+        self.logger.info(f"Using config: {self.config_manager.config_fp}")
         if self.config_manager.schema_path and os.path.exists(self.config_manager.schema_path): self.logger.info(f"Using schema: {self.config_manager.schema_path}")
         elif self.config_manager.schema_path: self.logger.warning(f"Schema not found: {self.config_manager.schema_path}. Validation skipped.")
         if cli_log_level: self.logger.info(f"Log level overridden by CLI to: {cli_log_level}")
         else: self.logger.info(f"Effective global log level: {effective_log_level}")
 
-        self.rns_instance = self._initialize_rns() # Initialize RNS
-        if not self.rns_instance and RNS_AVAILABLE: # Check if init failed but lib was found
-             self.logger.critical("RNS initialization failed. Exiting.")
-             sys.exit(1)
-        elif not RNS_AVAILABLE:
-             self.logger.warning("RNS library not found. ARES features requiring RNS will be disabled or non-functional.")
-
-
-        self.retry_manager = None; self.path_selector = None; self.proxy_manager = None; self.metrics_monitor = None
+        self.retry_manager = None; self.path_selector = None; self.proxy_manager = None; self.metrics_monitor = None; self.breaker_registry = None; self.tracer = None
+        self.rns_instance = None; self.rns_failed = False; self.ready = threading.Event(); self._features_lock = threading.RLock()
+        # Periodic feature work (path refresh, proxy checks, breaker eviction) runs on the scheduler once `run` starts it
+        self.scheduler = Scheduler(max_workers=self.config.get('ares_core', {}).get('scheduler_workers', 2)); self._stop_event = threading.Event(); self._running = False
+        # Features that don't need Reticulum come up now; RNS starts in the background and brings the rest online
         self._initialize_features(); self._setup_signal_handlers()
-        self.logger.info("ARES initialization complete.")
-
-    def __get_version(self): try: from . import VERSION; return VERSION; except ImportError: return "unknown"
+        if RNS_AVAILABLE: threading.Thread(target=self._rns_bootstrap, daemon=True, name="ARES-RNSInit").start()
+        else: self.logger.warning("RNS library not found. ARES features requiring RNS will be disabled or non-functional."); self._mark_ready()
+        self.logger.info("ARES initialization complete (RNS starting in background)." if RNS_AVAILABLE else "ARES initialization complete.")
+    def _rns_bootstrap(self):
+        rns_instance = self._initialize_rns()
+        if rns_instance is None: self.logger.critical("RNS initialization failed. Shutting down."); self.rns_failed = True; self.ready.set(); self._stop_event.set(); return
+        with self._features_lock:
+            self.rns_instance = rns_instance
+            if self.path_selector: self.path_selector.rns_instance = rns_instance
+            self._initialize_features(changed=set(RNS_FEATURE_SECTIONS))
+        self._mark_ready()
+    def _mark_ready(self):
+        self.ready.set(); self.logger.info(f"ARES ready in {time.monotonic() - self.started_at:.3f}s.")
+
+    @staticmethod
+    def _setup_logging(log_config, cli_log_level=None):
+        setup_logging(level=cli_log_level or log_config.get('level', 'INFO'), log_file=log_config.get('file', 'ares.log'), max_bytes=log_config.get('max_bytes', 10*1024*1024), backup_count=log_config.get('backup_count', 5), console_output=log_config.get('console_output', True), module_levels=log_config.get('module_levels'), async_output=log_config.get('async_output', False), queue_size=log_config.get('queue_size', 10000), rate_limit=log_config.get('rate_limit'))
+    def __get_version(self):
+        try: from . import VERSION; return VERSION
+        except ImportError: return "unknown"
 
     def _initialize_rns(self):
         """ Initializes the Reticulum instance. """
@@ -65,6 +78,7 @@ class ARESApp:
 
         self.logger.info("Initializing Reticulum instance...")
         try:
+            import RNS
             rns_config_path_str = self.config.get('ares_core', {}).get('rns_config_path', '~/.reticulum')
             expanded_rns_config_path = os.path.expanduser(rns_config_path_str)
             if not os.path.isdir(expanded_rns_config_path):
@@ -75,8 +89,7 @@ class ARESApp:
                     self.logger.error(f"Could not create RNS config directory {expanded_rns_config_path}: {e}")
                     # Continue, RNS might handle it internally or fail later
 
-            # Initialize Reticulum. This might block if interfaces take time.
-            # Consider running this in a separate thread if it blocks too long.
+            # Initialize Reticulum. This might block while interfaces come up; runs on the ARES-RNSInit thread.
             rns_instance = RNS.Reticulum(configdir=expanded_rns_config_path, log_level=logging.WARNING) # Use a quieter log level for RNS itself?
 
             # Check if transport is enabled if ARES needs it (e.g., for proxy node)
@@ -93,32 +106,51 @@ class ARESApp:
             self.logger.critical(f"Failed to initialize Reticulum: {e}", exc_info=True) # Log traceback
             return None
 
-    def _initialize_features(self):
+    def _initialize_features(self, changed=None):
+        """Create/update/disable features from the current config. With `changed` (section names from a reload diff),
+        existing features whose section did not change are left untouched. Serialised against SIGHUP and RNS bootstrap."""
+        with self._features_lock: self._apply_features(changed)
+    def _apply_features(self, changed):
         self.logger.info("Initializing/updating ARES features..."); self.config = self.config_manager.get_config(); active_feature_count = 0
-        update_module_log_levels(self.config.get('logging', {}).get('module_levels'))
+        touched = lambda section: changed is None or section in changed
+        if changed is None: update_module_log_levels(self.config.get('logging', {}).get('module_levels'))
         monitoring_config = self.config.get('monitoring', {})
         if monitoring_config.get('enabled', True):
-            if not self.metrics_monitor: self.metrics_monitor = monitoring.MetricsMonitor(config=monitoring_config); self.metrics_monitor.start(); self.logger.info(f"Metrics Monitor initialized. Port {monitoring_config.get('prometheus_port', 9876)}.")
-            else: self.metrics_monitor.update_config(monitoring_config); self.logger.info("Metrics Monitor config updated.")
+            if not self.metrics_monitor: self.metrics_monitor = _feature('monitoring').MetricsMonitor(config=monitoring_config); self.metrics_monitor.start(); self.logger.info(f"Metrics Monitor initialized. Port {monitoring_config.get('prometheus_port', 9876)}.")
+            elif touched('monitoring'): self.metrics_monitor.update_config(monitoring_config); self.logger.info("Metrics Monitor config updated.")
+        self.scheduler.metrics_monitor = self.metrics_monitor
+        breaker_config = self.config.get('circuit_breakers', {})
+        if breaker_config.get('enabled', True):
+            if self.breaker_registry is None: self.breaker_registry = CircuitBreakerRegistry(breaker_config); self.logger.info("CircuitBreaker registry initialized.")
+            elif touched('circuit_breakers'): self.breaker_registry.update_config(breaker_config)
+        elif self.breaker_registry is not None: self.logger.info("Disabling CircuitBreaker registry."); self.breaker_registry = None
+        if self.breaker_registry is None: self.scheduler.remove_task(TASK_BREAKER_EVICTION)
+        elif touched('circuit_breakers'): self.scheduler.add_task(TASK_BREAKER_EVICTION, self.breaker_registry.evict_idle, breaker_config.get('eviction_interval_seconds', 60), jitter_s=1.0)
+        if self.retry_manager: self.retry_manager.breaker_registry = self.breaker_registry
+        tracing_config = self.config.get('tracing', {})
+        if self.tracer is None: self.tracer = Tracer(tracing_config)
+        elif touched('tracing'): self.tracer.update_config(tracing_config)
+        if self.proxy_manager: self.proxy_manager.breaker_registry = self.breaker_registry
         retry_config = self.config.get('request_retries', {})
         if retry_config.get('enabled', False):
             active_feature_count += 1
-            if not self.retry_manager: self.retry_manager = request_retries.RetryManager(config=retry_config, metrics_monitor=self.metrics_monitor); self.logger.info("RetryMan initialized.")
-            else: self.retry_manager.update_config(retry_config); self.logger.info("RetryMan config updated.")
-        elif self.retry_manager: self.logger.info("Disabling RetryMan."); self.retry_manager = None
+            if not self.retry_manager: self.retry_manager = _feature('request_retries').RetryManager(config=retry_config, metrics_monitor=self.metrics_monitor, breaker_registry=self.breaker_registry); self.logger.info("RetryMan initialized.")
+            elif touched('request_retries'): self.retry_manager.update_config(retry_config); self.logger.info("RetryMan config updated.")
+        elif self.retry_manager: self.logger.info("Disabling RetryMan."); self.retry_manager.shutdown(); self.retry_manager = None
         path_selection_config = self.config.get('path_selection', {})
         if path_selection_config.get('enabled', False):
             active_feature_count += 1
-            if not self.path_selector: self.path_selector = path_selection.PathSelector(config=path_selection_config, rns_instance=self.rns_instance, metrics_monitor=self.metrics_monitor); self.logger.info("PathSel initialized.")
-            else: self.path_selector.update_config(path_selection_config); self.logger.info("PathSel config updated.")
+            if not self.path_selector: self.path_selector = _feature('path_selection').PathSelector(config=path_selection_config, rns_instance=self.rns_instance, metrics_monitor=self.metrics_monitor); self.path_selector.register_tasks(self.scheduler); self.logger.info("PathSel initialized.")
+            elif touched('path_selection'): self.path_selector.update_config(path_selection_config); self.logger.info("PathSel config updated.")
         elif self.path_selector: self.logger.info("Disabling PathSel."); self.path_selector.stop() if hasattr(self.path_selector, 'stop') else None; self.path_selector = None
         proxy_config = self.config.get('destination_proxying', {})
         if proxy_config.get('enabled', False):
             # Only enable proxy manager if RNS is available
             if RNS_AVAILABLE and self.rns_instance:
                 active_feature_count += 1
-                if not self.proxy_manager: self.proxy_manager = proxying.ProxyManager(config=proxy_config, rns_instance=self.rns_instance, metrics_monitor=self.metrics_monitor); self.logger.info("ProxyMan initialized.")
-                else: self.proxy_manager.update_config(proxy_config); self.logger.info("ProxyMan config updated.")
+                if not self.proxy_manager: self.proxy_manager = _feature('proxying').ProxyManager(config=proxy_config, rns_instance=self.rns_instance, metrics_monitor=self.metrics_monitor, breaker_registry=self.breaker_registry, tracer=self.tracer); self.proxy_manager.register_tasks(self.scheduler); self.logger.info("ProxyMan initialized.")
+                elif touched('destination_proxying'): self.proxy_manager.update_config(proxy_config); self.logger.info("ProxyMan config updated.")
+            elif RNS_AVAILABLE and not self.rns_failed: self.logger.info("Proxying enabled; ProxyManager starts once Reticulum is up.")
             else:
                  self.logger.warning("Proxying feature enabled in config, but RNS is not available or failed to initialize. Disabling ProxyManager.")
                  if self.proxy_manager: self.proxy_manager.shutdown(); self.proxy_manager = None # Ensure shutdown if it existed
@@ -132,18 +164,26 @@ class ARESApp:
         signal.signal(signal.SIGINT,self.handle_sigint_sigterm); signal.signal(signal.SIGTERM,self.handle_sigint_sigterm); self.logger.info("SIGINT/SIGTERM handlers registered.")
 
     def handle_sighup(self, signum, frame):
-        self.logger.info(f"SIGHUP received. Reloading config & re-init features..."); self.config_manager.reload_config(); self.config = self.config_manager.get_config()
-        # Re-apply log levels *after* getting new config
-        new_log_config = self.config.get('logging', {})
-        cli_log_level = self.args.loglevel
-        effective_log_level = cli_log_level or new_log_config.get('level', 'INFO')
-        logging.getLogger(ARES_LOGGER_NAME).setLevel(getattr(logging, effective_log_level))
-        if cli_log_level: self.logger.info(f"Re-applying CLI log level override: {cli_log_level}")
-        update_module_log_levels(new_log_config.get('module_levels'))
-        # Re-initialize features
-        self._initialize_features(); self.logger.info("Config reloaded & features re-initialized.")
-
-    def handle_sigint_sigterm(self, signum, frame): self.logger.info(f"Signal {signum} received. Shutting down..."); self.shutdown(); sys.exit(0)
+        self.logger.info(f"SIGHUP received. Reloading config..."); self.config_manager.reload_config(); self.config = self.config_manager.get_config()
+        diff = self.config_manager.last_diff
+        if not diff: self.logger.info("Config unchanged; nothing to apply."); return
+        if 'logging' in diff: self._apply_logging_diff(diff)
+        self._initialize_features(changed=set(diff.sections)); self.logger.info(f"Config reloaded; applied changes to: {', '.join(sorted(diff.sections))}.")
+    def _apply_logging_diff(self, diff):
+        new_log_config = self.config.get('logging', {}); cli_log_level = self.args.loglevel
+        if diff.only_changed('logging', ('level', 'module_levels')):
+            # Level changes are applied in place; handlers, queues and files stay as they are
+            effective_log_level = cli_log_level or new_log_config.get('level', 'INFO')
+            logging.getLogger(ARES_LOGGER_NAME).setLevel(getattr(logging, effective_log_level))
+            if cli_log_level: self.logger.info(f"Re-applying CLI log level override: {cli_log_level}")
+            update_module_log_levels(new_log_config.get('module_levels'))
+        else: self._setup_logging(new_log_config, cli_log_level)
+
+    def handle_sigint_sigterm(self, signum, frame):
+        self.logger.info(f"Signal {signum} received. Shutting down...")
+        if self._running: self._stop_event.set()  # `run` wakes at once and shuts down
+        else: self.shutdown(); sys.exit(0)
+    def request_stop(self): self._stop_event.set()
 
     def run(self):
         if not RNS_AVAILABLE and not self.rns_instance :
@@ -151,30 +191,27 @@ class ARESApp:
              return # Exit run method
 
         self.logger.info("ARES running. Ctrl+C or SIGTERM to exit.")
+        self._running = True; self.scheduler.start()
         try:
-            while True:
-                # Check if RNS instance is still alive (conceptual check)
-                # if self.rns_instance and not self.rns_instance.is_running(): # Assuming RNS has such a method
-                #    self.logger.error("RNS instance appears to have stopped. Shutting down ARES.")
-                #    break
-
-                if self.path_selector: self.path_selector.periodic_update()
-                if self.proxy_manager: self.proxy_manager.periodic_check()
-                time.sleep(self.config.get('ares_core',{}).get('main_loop_sleep_interval',30)); self.logger.debug("ARES main loop tick.")
+            # Nothing to poll: features run on the scheduler, and a signal or failed RNS start sets the stop event
+            self._stop_event.wait()
+            if self.rns_failed: self.logger.critical("Reticulum failed to start; stopping.")
         except KeyboardInterrupt: self.logger.info("KeyboardInterrupt. Shutting down.")
         finally: self.shutdown()
 
     def shutdown(self):
-        self.logger.info("ARES shutting down...");
+        self.logger.info("ARES shutting down..."); self._running = False; self.scheduler.stop()
         if self.path_selector: self.path_selector.stop()
         if self.proxy_manager: self.proxy_manager.shutdown()
+        if self.retry_manager: self.retry_manager.shutdown()
+        if self.tracer: self.tracer.shutdown()
         if self.metrics_monitor: self.metrics_monitor.stop()
         # Shutdown RNS instance if ARES owns it
         if self.rns_instance and hasattr(self.rns_instance, 'exit') :
             self.logger.info("Shutting down Reticulum instance...")
             # RNS might exit automatically when program ends, but explicit call is cleaner if available
             # self.rns_instance.exit()
-        self.logger.info("ARES shutdown complete.")
+        self.logger.info("ARES shutdown complete."); shutdown_logging()
 
 def main_entry():
     args = parse_args()
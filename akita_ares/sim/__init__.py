@@ -0,0 +1,2 @@
+from .clock import SimClock, SimEvent
+from .network import SimNetwork, SimNode, SimPath, LinkProfile
@@ -0,0 +1,282 @@
+import heapq
+import itertools
+import threading
+import time as _real_time
+from contextlib import contextmanager
+from akita_ares.core.logger import get_logger
+
+logger = get_logger("Sim.Clock")
+
+
+class _Timer:
+    __slots__ = ("due", "seq", "fn", "args", "node", "cancelled")
+
+    def __init__(self, due, seq, fn, args, node):
+        self.due, self.seq, self.fn, self.args, self.node = due, seq, fn, args, node
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.due, self.seq) < (other.due, other.seq)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _Waiter:
+    __slots__ = ("participant", "woken")
+
+    def __init__(self, participant):
+        self.participant = participant
+        self.woken = False
+
+
+class SimClock:
+    """Virtual clock and discrete-event dispatcher for the simulated network.
+
+    Timers run in order of (virtual due time, insertion order) on one
+    dispatcher thread. Virtual time only moves forward when no participant is
+    runnable: threads started with `spawn` (or inside `participant()`) count as
+    running until they block in a `SimEvent.wait`/`sleep`, and the dispatcher
+    counts as running while a callback executes. So code that blocks on the
+    simulated network sees causal timestamps, while idle stretches (link
+    latency, timeouts) cost no wall time.
+
+    Code that blocks on anything the clock does not know about (a real
+    `threading.Event`, a socket) keeps its thread counted as running and
+    stalls virtual time until it returns.
+    """
+
+    def __init__(self, start: float = 1000.0):
+        self._now = float(start)
+        self.epoch = _real_time.time() - self._now
+        self._cond = threading.Condition()  # re-entrant; the network reuses it as its state lock
+        self._heap = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._waiters = set()
+        self._local = threading.local()
+        self._thread = None
+        self._stopped = False
+        self.events_run = 0
+        self.callback_errors = 0
+
+    # --- time -------------------------------------------------------------
+    def now(self) -> float:
+        return self._now
+
+    def time(self) -> float:
+        """Virtual wall-clock time (epoch seconds)."""
+        return self.epoch + self._now
+
+    def sleep(self, seconds: float):
+        SimEvent(self).wait(max(0.0, seconds))
+
+    def Event(self):
+        return SimEvent(self)
+
+    # --- scheduling -------------------------------------------------------
+    def call_at(self, due, fn, *args, node=None) -> _Timer:
+        """Run `fn(*args)` on the dispatcher at virtual time `due`, with `node` as the current node."""
+        with self._cond:
+            timer = _Timer(max(due, self._now), next(self._seq), fn, args, node)
+            heapq.heappush(self._heap, timer)
+            self._cond.notify_all()
+        return timer
+
+    def call_later(self, delay, fn, *args, node=None) -> _Timer:
+        return self.call_at(self._now + max(0.0, delay), fn, *args, node=node)
+
+    def current_node(self):
+        """The simulated node the calling thread acts for (set by `spawn`, `participant` and the dispatcher)."""
+        return getattr(self._local, "node", None)
+
+    # --- participants -----------------------------------------------------
+    @contextmanager
+    def participant(self, node=None):
+        """Count the calling thread as running (acting for `node`) for the duration of the block."""
+        prev_node, prev_depth = getattr(self._local, "node", None), getattr(self._local, "depth", 0)
+        if prev_depth == 0:
+            with self._cond:
+                self._active += 1
+        self._local.node, self._local.depth = node if node is not None else prev_node, prev_depth + 1
+        try:
+            yield self
+        finally:
+            self._local.node, self._local.depth = prev_node, prev_depth
+            if prev_depth == 0:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def spawn(self, fn, *args, node=None, name=None, **kwargs) -> threading.Thread:
+        """Run `fn` on a new participant thread. It counts as running from this call on, so the clock cannot skip ahead of it."""
+        with self._cond:
+            self._active += 1  # handed over to the thread below
+
+        def body():
+            self._local.node, self._local.depth = node, 1
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.callback_errors += 1
+                logger.error(f"Simulated participant {name or fn} failed: {e}", exc_info=True)
+            finally:
+                self._local.depth = 0
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+        t = threading.Thread(target=body, daemon=True, name=name or "ARES-SimTask")
+        t.start()
+        return t
+
+    def _is_participant(self):
+        return getattr(self._local, "depth", 0) > 0
+
+    def _wake(self, waiter):
+        with self._cond:
+            if not waiter.woken:
+                waiter.woken = True
+                self._waiters.discard(waiter)
+                if waiter.participant:
+                    self._active += 1  # the waker hands its "running" slot to the woken thread
+                self._cond.notify_all()
+
+    # --- dispatcher -------------------------------------------------------
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="ARES-SimClock")
+            self._thread.start()
+
+    def stop(self):
+        """Stop dispatching; threads still blocked in a simulated wait are released (their wait returns False)."""
+        with self._cond:
+            self._stopped = True
+            for waiter in list(self._waiters):
+                self._wake(waiter)
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5.0)
+
+    def idle(self) -> bool:
+        with self._cond:
+            return self._idle_locked()
+
+    def run_until_idle(self, timeout: float = 30.0) -> bool:
+        """Block (in real time, at most `timeout`) until nothing is runnable and no timer is pending.
+
+        Must be called from a thread that is not itself a participant. Returns False on timeout.
+        """
+        if self._is_participant():
+            raise RuntimeError("run_until_idle() called from a simulation participant")
+        with self._cond:
+            return self._cond.wait_for(lambda: self._stopped or self._idle_locked(), timeout)
+
+    def _idle_locked(self):
+        self._drop_cancelled()
+        return self._active == 0 and not self._heap
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    self._drop_cancelled()
+                    if self._heap and (self._heap[0].due <= self._now or self._active == 0):
+                        break
+                    self._cond.notify_all()  # wakes run_until_idle when there is nothing left to do
+                    self._cond.wait()
+                timer = heapq.heappop(self._heap)
+                self._now = max(self._now, timer.due)
+                self._active += 1
+            self._local.node = timer.node
+            try:
+                timer.fn(*timer.args)
+            except Exception as e:
+                self.callback_errors += 1
+                logger.error(f"Simulated event {getattr(timer.fn, '__qualname__', timer.fn)} failed: {e}", exc_info=True)
+            finally:
+                self._local.node = None
+                with self._cond:
+                    self._active -= 1
+                    self.events_run += 1
+                    self._cond.notify_all()
+
+
+class SimEvent:
+    """`threading.Event` whose `wait(timeout)` is measured on a SimClock."""
+
+    def __init__(self, clock: SimClock):
+        self._clock = clock
+        self._flag = False
+        self._waiters = []
+
+    def is_set(self) -> bool:
+        return self._flag
+
+    def set(self):
+        with self._clock._cond:
+            self._flag = True
+            for waiter in self._waiters:
+                self._clock._wake(waiter)
+            self._waiters = []
+
+    def clear(self):
+        with self._clock._cond:
+            self._flag = False
+
+    def wait(self, timeout=None) -> bool:
+        clock = self._clock
+        with clock._cond:
+            if self._flag:
+                return True
+            if threading.current_thread() is clock._thread:
+                raise RuntimeError("simulated event callbacks must not block")
+            if clock._stopped or (timeout is not None and timeout <= 0):
+                return False
+            waiter = _Waiter(clock._is_participant())
+            self._waiters.append(waiter)
+            clock._waiters.add(waiter)
+            timer = clock.call_later(timeout, clock._wake, waiter) if timeout is not None else None
+            if waiter.participant:
+                clock._active -= 1
+            clock._cond.notify_all()
+            while not waiter.woken:
+                clock._cond.wait()
+            if timer is not None:
+                timer.cancel()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            return self._flag
+
+
+class TimeShim:
+    """Stand-in for the `time` module: monotonic/time/perf_counter/sleep follow a SimClock, the rest is the real module."""
+
+    def __init__(self, clock: SimClock):
+        self._clock = clock
+        self.monotonic = self.perf_counter = clock.now
+        self.time = clock.time
+        self.sleep = clock.sleep
+
+    def __getattr__(self, name):
+        return getattr(_real_time, name)
+
+
+class ThreadingShim:
+    """Stand-in for the `threading` module whose `Event` is a SimEvent; locks and threads are the real ones."""
+
+    def __init__(self, clock: SimClock):
+        self.Event = clock.Event
+
+    def __getattr__(self, name):
+        return getattr(threading, name)
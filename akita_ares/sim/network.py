@@ -0,0 +1,591 @@
+import hashlib
+import heapq
+import random
+import types
+from collections import namedtuple
+from contextlib import contextmanager
+from akita_ares.core.logger import get_logger
+from akita_ares.sim.clock import SimClock, TimeShim, ThreadingShim
+
+logger = get_logger("Sim.Network")
+
+HEADER_BYTES = 19          # smallest Reticulum packet header
+LINK_REQUEST_BYTES = 83    # link establishment: request + proof, as in Reticulum
+LINK_PROOF_BYTES = 115
+TEARDOWN_BYTES = 35
+DEFAULT_MTU = 500
+
+LinkProfile = namedtuple("LinkProfile", ["latency_s", "bandwidth_bps", "loss", "mtu"])
+LinkProfile.__doc__ = "One direction of a simulated hop: one-way latency, bit rate (None = unlimited), loss probability per frame, MTU in bytes."
+
+
+class _Edge:
+    __slots__ = ("profile", "busy_until", "frames", "lost", "bytes")
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.busy_until = 0.0
+        self.frames = self.lost = self.bytes = 0
+
+
+class SimNetwork:
+    """Deterministic in-process stand-in for a Reticulum network.
+
+    Nodes are joined by hops with their own latency, bandwidth, loss and MTU.
+    Frames queue behind each other on a hop (so bandwidth is shared under
+    load), are lost with the hop's probability drawn from a seeded RNG, and are
+    delivered as events on a SimClock. Packets and link handshakes are
+    unreliable; link sends travel as segmented, retransmitted resources.
+
+    `install()` (or the `installed()` context manager) points the feature
+    modules' `RNS` names, and the `time`/`threading` they use, at this
+    network, so unmodified ProxyManager and PathSelector instances run on it::
+
+        net = SimNetwork(seed=1)
+        client, proxy, target = net.add_node("client"), net.add_node("proxy"), net.add_node("target")
+        net.connect("client", "proxy", latency_s=0.05); net.connect("proxy", "target", latency_s=0.2)
+        echo = target.serve("app", "echo", handler=lambda data: data)
+        with net.installed():
+            node_pm = ProxyManager({...}, rns_instance=proxy.rns)
+            with net.clock.participant():  # virtual time holds until the whole burst is launched
+                for _ in range(100): net.spawn(client_pm.send_via_proxy, echo.hexhash, b"hi", target_name=echo.name, response_callback=cb, node=client)
+            net.run_until_idle()
+
+    The stand-ins take Reticulum's own signatures (`Destination(identity,
+    direction, type, app_name, *aspects)`, `Link(destination,
+    established_callback=...)`, `Packet(destination, data)`,
+    `Identity.recall`, `Transport.request_path`); links and packets are sent
+    from the node the calling thread acts for. Two ARES-side conveniences
+    remain simplified: a link carries data with `send`/`set_resource_callback`
+    instead of Resource advertisement, and packets accept a response callback.
+
+    Runs are reproducible for a given seed as long as requests are issued in
+    a fixed order; concurrent participants draw from the RNG in the order the
+    OS schedules them.
+    """
+
+    IN, OUT = 0x11, 0x12
+    SINGLE, GROUP, PLAIN, LINK = 0x00, 0x01, 0x02, 0x03
+
+    def __init__(self, seed: int = 0, clock: SimClock = None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.clock = clock or SimClock()
+        self.nodes = {}
+        self.identities = {}
+        self.destinations = {}
+        self._edges = {}
+        self._routes = {}
+        self.undeliverable = 0
+        self._patches = None
+        self.Identity = type("Identity", (SimIdentity,), {"network": self})
+        self.Destination = type("Destination", (SimDestination,), {"network": self})
+        self.Link = type("Link", (SimLink,), {"network": self})
+        self.Packet = type("Packet", (SimPacket,), {"network": self})
+        self.Transport = type("Transport", (SimTransport,), {"network": self})
+        self.path_requests = 0
+
+    # --- topology ---------------------------------------------------------
+    def add_node(self, name, transport=True) -> "SimNode":
+        node = SimNode(self, name, transport)
+        self.nodes[name] = node
+        self.identities[node.identity.hash] = node.identity
+        return node
+
+    def connect(self, a, b, latency_s=0.05, bandwidth_bps=None, loss=0.0, mtu=DEFAULT_MTU, symmetric=True):
+        """Join nodes `a` and `b` (names or SimNodes). With `symmetric=False` only a -> b is created."""
+        a, b = self._name(a), self._name(b)
+        profile = LinkProfile(float(latency_s), bandwidth_bps, float(loss), int(mtu))
+        with self.clock._cond:
+            self._edges[(a, b)] = _Edge(profile)
+            if symmetric:
+                self._edges[(b, a)] = _Edge(profile)
+            self._routes.clear()
+
+    def update_link(self, a, b, symmetric=True, **changes):
+        """Change latency_s/bandwidth_bps/loss/mtu of an existing hop mid-run (e.g. loss=1.0 for a partition)."""
+        a, b = self._name(a), self._name(b)
+        with self.clock._cond:
+            for key in [(a, b), (b, a)] if symmetric else [(a, b)]:
+                if key in self._edges:
+                    self._edges[key].profile = self._edges[key].profile._replace(**changes)
+            self._routes.clear()
+
+    def disconnect(self, a, b):
+        a, b = self._name(a), self._name(b)
+        with self.clock._cond:
+            self._edges.pop((a, b), None)
+            self._edges.pop((b, a), None)
+            self._routes.clear()
+
+    def route(self, src, dst):
+        """Lowest-latency node path from `src` to `dst`, or None if unreachable."""
+        src, dst = self._name(src), self._name(dst)
+        with self.clock._cond:
+            key = (src, dst)
+            if key not in self._routes:
+                self._routes[key] = self._shortest(src, dst)
+            return self._routes[key]
+
+    def paths(self, src, dst, limit=5):
+        """Up to `limit` loop-free node paths from `src` to `dst`, lowest latency first."""
+        src, dst = self._name(src), self._name(dst)
+        found = []
+
+        def walk(node, path, latency):
+            if node == dst:
+                found.append((latency, path))
+                return
+            for (a, b), edge in self._edges.items():
+                if a == node and b not in path:
+                    walk(b, path + [b], latency + edge.profile.latency_s)
+
+        with self.clock._cond:
+            walk(src, [src], 0.0)
+            return [SimPath(self, p) for _, p in sorted(found)[:limit]]
+
+    # --- running ----------------------------------------------------------
+    def spawn(self, fn, *args, node=None, **kwargs):
+        """Run `fn` on a participant thread acting for `node` (see SimClock.spawn)."""
+        return self.clock.spawn(fn, *args, node=self._node(node), **kwargs)
+
+    def run_until_idle(self, timeout: float = 30.0) -> bool:
+        return self.clock.run_until_idle(timeout)
+
+    def stats(self) -> dict:
+        with self.clock._cond:
+            hops = {f"{a}>{b}": {"frames": e.frames, "lost": e.lost, "bytes": e.bytes} for (a, b), e in self._edges.items()}
+            return {"now": self.clock.now(), "events": self.clock.events_run, "undeliverable": self.undeliverable,
+                    "path_requests": self.path_requests, "frames": sum(e.frames for e in self._edges.values()), "lost": sum(e.lost for e in self._edges.values()), "hops": hops}
+
+    def install(self):
+        """Point the feature modules (and the deadline/breaker/tracing clocks) at this network, and start its clock."""
+        from akita_ares.core import deadline, circuit_breaker, tracing
+        from akita_ares.features import proxying, path_selection
+        if getattr(proxying, "_ares_sim_network", None) is not None:
+            raise RuntimeError("another SimNetwork is already installed")
+        rns = types.SimpleNamespace(Identity=self.Identity, Destination=self.Destination, Link=self.Link, Packet=self.Packet, Transport=self.Transport)
+        time_shim, threading_shim = TimeShim(self.clock), ThreadingShim(self.clock)
+        patches = [(proxying, "_ares_sim_network", self), (proxying, "RNS_AVAILABLE", True), (proxying, "RNS", rns),
+                   (proxying, "Identity", self.Identity), (proxying, "Destination", self.Destination), (proxying, "Link", self.Link),
+                   (proxying, "Packet", self.Packet), (proxying, "Transport", self.Transport), (proxying, "time", time_shim), (proxying, "threading", threading_shim),
+                   (path_selection, "RNS_AVAILABLE", True), (path_selection, "RNS", rns), (path_selection, "time", time_shim),
+                   (deadline, "time", time_shim), (circuit_breaker, "time", time_shim), (tracing, "time", time_shim)]
+        self._patches = []
+        for module, attr, value in patches:
+            self._patches.append((module, attr, getattr(module, attr, _MISSING)))
+            setattr(module, attr, value)
+        self.clock.start()
+
+    def uninstall(self):
+        self.clock.stop()
+        for module, attr, old in reversed(self._patches or []):
+            if old is _MISSING:
+                delattr(module, attr)
+            else:
+                setattr(module, attr, old)
+        self._patches = None
+
+    @contextmanager
+    def installed(self):
+        self.install()
+        try:
+            yield self
+        finally:
+            self.uninstall()
+
+    # --- transmission (caller need not hold the lock) ---------------------
+    def _traverse(self, hops, size, reliable):
+        """Virtual arrival time of a `size`-byte frame sent now along `hops`, or None if it was lost."""
+        t = self.clock.now()
+        for a, b in zip(hops, hops[1:]):
+            edge = self._edges.get((a, b))
+            if edge is None:
+                return None
+            p = edge.profile
+            ser = size * 8.0 / p.bandwidth_bps if p.bandwidth_bps else 0.0
+            while True:
+                start = max(t, edge.busy_until)
+                edge.busy_until = start + ser
+                edge.frames += 1
+                edge.bytes += size
+                if p.loss and self.rng.random() < p.loss:
+                    edge.lost += 1
+                    if not reliable or p.loss >= 1.0:
+                        return None
+                    t = edge.busy_until + 2 * p.latency_s  # lost part noticed after a round trip, then resent
+                    continue
+                t = edge.busy_until + p.latency_s
+                break
+        return t
+
+    def _send_frame(self, src, dst, size, fn, *args, hops=None):
+        """Deliver one unreliable frame; `fn(*args)` runs on `dst` when it arrives. Returns False if it cannot fit the MTU."""
+        with self.clock._cond:
+            hops = hops or self.route(src, dst)
+            if hops is None:
+                self.undeliverable += 1
+                return True
+            if size > self._path_mtu(hops):
+                return False
+            at = self._traverse(hops, size, reliable=False)
+        if at is not None:
+            self.clock.call_at(at, fn, *args, node=self.nodes[self._name(dst)])
+        return True
+
+    def _send_resource(self, src, dst, data, fn, *args):
+        """Deliver `data` reliably in MTU-sized parts; `fn(*args)` runs on `dst` when the last part arrives."""
+        with self.clock._cond:
+            hops = self.route(src, dst)
+            if hops is None:
+                self.undeliverable += 1
+                return
+            part = max(1, self._path_mtu(hops) - HEADER_BYTES)
+            at = None
+            for off in range(0, max(1, len(data)), part):
+                arrived = self._traverse(hops, min(part, len(data) - off) + HEADER_BYTES, reliable=True)
+                if arrived is None:  # a hop with total loss: the transfer never completes
+                    return
+                at = arrived if at is None else max(at, arrived)
+        self.clock.call_at(at, fn, *args, node=self.nodes[self._name(dst)])
+
+    def _path_mtu(self, hops):
+        return min(self._edges[(a, b)].profile.mtu for a, b in zip(hops, hops[1:])) if len(hops) > 1 else DEFAULT_MTU
+
+    def _shortest(self, src, dst):
+        if src not in self.nodes or dst not in self.nodes:
+            return None
+        best, queue = {src: 0.0}, [(0.0, [src])]
+        while queue:
+            latency, path = heapq.heappop(queue)
+            node = path[-1]
+            if node == dst:
+                return path
+            if latency > best.get(node, float("inf")):
+                continue
+            for (a, b), edge in self._edges.items():
+                if a == node and edge.profile.loss < 1.0:
+                    nl = latency + edge.profile.latency_s
+                    if nl < best.get(b, float("inf")):
+                        best[b] = nl
+                        heapq.heappush(queue, (nl, path + [b]))
+        return None
+
+    def _name(self, node):
+        return node.name if isinstance(node, SimNode) else node
+
+    def _node(self, node):
+        return self.nodes[node] if isinstance(node, str) else node
+
+    def _random_bytes(self, n):
+        with self.clock._cond:
+            return self.rng.getrandbits(8 * n).to_bytes(n, "big")
+
+
+_MISSING = object()
+
+
+class SimNode:
+    """One simulated Reticulum instance; `rns` is what a feature receives as its `rns_instance`."""
+
+    def __init__(self, network, name, transport=True):
+        self.network = network
+        self.name = name
+        self.transport = transport
+        self.identity = network.Identity(name)
+        self.identity.node = self
+        self.rns = SimReticulum(self)
+
+    def serve(self, *aspects, handler, processing_s=0.0):
+        """Register an IN destination that answers each packet with `handler(data)` (None = no reply) after `processing_s`.
+
+        `processing_s` may be a number or a callable of the request data.
+        """
+        dest = self.network.Destination(self.identity, SimNetwork.IN, SimNetwork.SINGLE, *aspects)
+        dest._responder = (handler, processing_s)
+        return dest
+
+    def __repr__(self):
+        return f"<SimNode {self.name}>"
+
+
+class SimReticulum:
+    def __init__(self, node):
+        self.node = node
+        self.identity = node.identity
+
+    def is_transport_enabled(self):
+        return self.node.transport
+
+
+class SimIdentity:
+    network = None
+
+    def __init__(self, name):
+        self.hash = hashlib.sha256(f"{self.network.seed}:{name}".encode()).digest()[:16]
+        self.hexhash = self.hash.hex()
+        self.node = None
+
+    @classmethod
+    def recall(cls, target_hash, from_identity_hash=False):
+        """Identity behind a destination hash (or an identity hash), as RNS.Identity.recall; every served destination counts as announced."""
+        target_hash = bytes(target_hash)
+        if from_identity_hash:
+            return cls.network.identities.get(target_hash)
+        dest = cls.network.destinations.get(target_hash)
+        return dest.identity if dest is not None else None
+
+
+class SimTransport:
+    network = None
+
+    @classmethod
+    def has_path(cls, destination_hash):
+        here, dest = cls.network.clock.current_node(), cls.network.destinations.get(bytes(destination_hash))
+        return here is not None and dest is not None and cls.network.route(here, dest.node) is not None
+
+    @classmethod
+    def request_path(cls, destination_hash):
+        with cls.network.clock._cond:
+            cls.network.path_requests += 1
+
+
+class SimDestination:
+    network = None
+    IN, OUT = SimNetwork.IN, SimNetwork.OUT
+    SINGLE, GROUP, PLAIN, LINK = SimNetwork.SINGLE, SimNetwork.GROUP, SimNetwork.PLAIN, SimNetwork.LINK
+
+    def __init__(self, identity, direction, type, app_name, *aspects):
+        self.identity = identity
+        self.direction = direction
+        self.type = type
+        self.name = ".".join((app_name,) + aspects)
+        self.hash = self.hash_from_name_and_identity(self.name, identity)
+        self.hexhash = self.hash.hex()
+        self._link_established_cb = None
+        self._responder = None
+        if self.direction == self.IN:
+            self.network.destinations[self.hash] = self
+
+    @staticmethod
+    def hash_from_name_and_identity(full_name, identity):
+        """Destination hash as Reticulum derives it: 80-bit name hash + identity hash, truncated to 128 bits."""
+        identity_hash = identity.hash if hasattr(identity, "hash") else bytes(identity)
+        name_hash = hashlib.sha256(full_name.encode()).digest()[:10]
+        return hashlib.sha256(name_hash + identity_hash).digest()[:16]
+
+    @classmethod
+    def recall(cls, destination_hash):
+        """Outbound handle to a served destination, for PathSelector's path model (not part of RNS)."""
+        target = cls.network.destinations.get(bytes(destination_hash))
+        if target is None:
+            return None
+        return cls(target.identity, cls.OUT, target.type, *target.name.split("."))
+
+    @property
+    def node(self):
+        """Node serving this destination (looked up at use time for outbound handles)."""
+        target = self if self.direction == self.IN else self.network.destinations.get(self.hash)
+        return target.identity.node if target is not None and target.identity is not None else None
+
+    @property
+    def paths(self):
+        """Candidate paths from the calling thread's node (see SimClock.current_node)."""
+        here, there = self.network.clock.current_node(), self.node
+        return self.network.paths(here, there) if here is not None and there is not None else []
+
+    def set_link_established_callback(self, cb):
+        self._link_established_cb = cb
+
+    def close(self):
+        if self.network.destinations.get(self.hash) is self:
+            del self.network.destinations[self.hash]
+
+    def _answer(self, packet, src):
+        # runs on this destination's node
+        handler, processing_s = self._responder or (None, 0.0)
+        if handler is None:
+            return
+        delay = processing_s(packet.data) if callable(processing_s) else processing_s
+        self.network.clock.call_later(delay, self._reply, packet, src, handler, node=self.node)
+
+    def _reply(self, packet, src, handler):
+        data = handler(packet.data)
+        if data is not None and packet._response_cb is not None:
+            response = self.network.Packet(None, data)  # never sent itself: only carries data/source_hash to the callback
+            response.source_hash = self.hash
+            self.network._send_frame(self.node, src, len(data) + HEADER_BYTES, packet._response_cb, response)
+
+
+class SimPacket:
+    """Single unreliable packet sent from the calling thread's node; must fit the path MTU (IOError otherwise, as in Reticulum).
+
+    `set_response_callback` is how ARES's proxy node gets the target's answer; Reticulum packets have no such hook.
+    """
+
+    network = None
+    DATA = 0x00
+
+    def __init__(self, destination, data, packet_type=DATA):
+        self.destination = destination
+        self.data = bytes(data)
+        self.packet_type = packet_type
+        self.source_hash = None
+        self._response_cb = None
+
+    def set_response_callback(self, cb):
+        self._response_cb = cb
+
+    def send(self):
+        net = self.network
+        src = net.clock.current_node()
+        dst = self.destination.node if self.destination is not None else None
+        if src is None:
+            raise RuntimeError("Packet.send() outside a simulated node; use SimNetwork.spawn or clock.participant(node)")
+        if dst is None:
+            net.undeliverable += 1
+            return False
+        if not net._send_frame(src, dst, len(self.data) + HEADER_BYTES, self._arrive, src):
+            raise IOError(f"Packet size of {len(self.data) + HEADER_BYTES} exceeds path MTU")
+        return True
+
+    def _arrive(self, src):
+        dest = self.network.destinations.get(self.destination.hash)
+        if dest is not None:
+            dest._answer(self, src)
+
+
+class SimResource:
+    """What a link's resource callback receives: the complete `data` and the receiving `link`."""
+
+    def __init__(self, data, link):
+        self.data = data
+        self.link = link
+        self.size = len(data)
+
+    def get_data_size(self):
+        return self.size
+
+
+class SimLink:
+    """Reticulum-style link from the calling thread's node: a three-frame handshake, then reliable transfer both ways.
+
+    Data goes through `send` and arrives whole at the peer's `set_resource_callback`, a simplification of
+    Reticulum's Resource advertise/accept/conclude cycle.
+    """
+
+    network = None
+    PENDING, ACTIVE, CLOSED = 0x00, 0x02, 0x04
+
+    def __init__(self, destination, established_callback=None, closed_callback=None):
+        net = self.network
+        self.destination = destination
+        self.status = self.PENDING
+        self._established_cb, self._closed_cb, self._resource_cb = established_callback, closed_callback, None
+        self.link_id = net._random_bytes(16)
+        self.node = net.clock.current_node()
+        self.peer = None
+        if self.node is None:
+            raise RuntimeError("Link() outside a simulated node; use SimNetwork.spawn or clock.participant(node)")
+        remote = destination.node
+        if remote is None:
+            net.undeliverable += 1
+        else:
+            net._send_frame(self.node, remote, LINK_REQUEST_BYTES, self._on_request, destination.hash)
+
+    @classmethod
+    def _accept(cls, peer, destination):
+        """Responder side of `peer`, created on the destination's node when the link request arrives."""
+        link = cls.__new__(cls)
+        link.destination, link.link_id, link.node, link.peer, link.status = destination, peer.link_id, destination.node, peer, cls.ACTIVE
+        link._established_cb = link._closed_cb = link._resource_cb = None
+        return link
+
+    def set_link_established_callback(self, cb):
+        self._established_cb = cb
+        if self.status == self.ACTIVE and self.peer is not None:
+            self.network.clock.call_later(0, cb, self, node=self.node)
+
+    def set_link_closed_callback(self, cb):
+        self._closed_cb = cb
+
+    def set_resource_callback(self, cb):
+        self._resource_cb = cb
+
+    def is_active(self):
+        return self.status == self.ACTIVE
+
+    def send(self, data):
+        if self.status != self.ACTIVE or self.peer is None:
+            return False
+        self.network._send_resource(self.node, self.peer.node, bytes(data), self.peer._receive, bytes(data))
+        return True
+
+    def close(self):
+        if self.status == self.CLOSED:
+            return
+        was_up, self.status = self.status == self.ACTIVE, self.CLOSED
+        if self._closed_cb is not None:
+            self.network.clock.call_later(0, self._closed_cb, self, node=self.node)  # never re-enter the caller's locks
+        if was_up and self.peer is not None:
+            self.network._send_frame(self.node, self.peer.node, TEARDOWN_BYTES, self.peer._on_teardown)
+
+    teardown = close
+
+    # --- handshake and delivery (dispatcher) ------------------------------
+    def _on_request(self, destination_hash):
+        dest = self.network.destinations.get(destination_hash)
+        if dest is None or self.status == self.CLOSED:
+            return
+        server = self.network.Link._accept(self, dest)
+        if dest._link_established_cb is not None:
+            dest._link_established_cb(server)
+        self.network._send_frame(server.node, self.node, LINK_PROOF_BYTES, self._on_proof, server)
+
+    def _on_proof(self, server):
+        if self.status != self.PENDING:
+            return
+        self.peer, self.status = server, self.ACTIVE
+        if self._established_cb is not None:
+            self._established_cb(self)
+
+    def _receive(self, data):
+        if self.status == self.ACTIVE and self._resource_cb is not None:
+            self._resource_cb(SimResource(data, self))
+
+    def _on_teardown(self):
+        if self.status != self.CLOSED:
+            self.status = self.CLOSED
+            if self._closed_cb is not None:
+                self._closed_cb(self)
+
+
+class SimPath:
+    """One candidate path for PathSelector: `path_id`, `hops`, `latency_s`, `quality` (loss) and an RTT `probe`."""
+
+    def __init__(self, network, nodes):
+        self.network = network
+        self.nodes = nodes
+        self.path_id = ">".join(nodes)
+        self.hops = len(nodes) - 1
+        edges = [network._edges[(a, b)].profile for a, b in zip(nodes, nodes[1:])]
+        self.latency_s = sum(p.latency_s for p in edges)
+        delivered = 1.0
+        for p in edges:
+            delivered *= 1.0 - p.loss
+        self.quality = 1.0 - delivered
+
+    def probe(self, timeout=None):
+        """Round trip of a small probe along this path and back; inf if lost or slower than `timeout`."""
+        net = self.network
+        with net.clock._cond:
+            start = net.clock.now()
+            there = net._traverse(self.nodes, HEADER_BYTES + 16, reliable=False)
+            back = net._traverse(list(reversed(self.nodes)), HEADER_BYTES + 16, reliable=False) if there is not None else None
+        if there is None or back is None:
+            return float("inf")
+        rtt = (there - start) + (back - start)
+        return rtt if timeout is None or rtt <= timeout else float("inf")
+
+    def __repr__(self):
+        return f"<SimPath {self.path_id}>"
@@ -0,0 +1,31 @@
+#Akita Engineering
+"""Per-event cost of the MetricsMonitor hot path (retry stats + proxied packet counters).
+
+Usage: python benchmarks/bench_metrics_hot_path.py [events_per_thread]
+"""
+import sys, os, time, threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from prometheus_client import CollectorRegistry, generate_latest
+from akita_ares.core.logger import setup_logging
+from akita_ares.features import monitoring
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+
+def make_monitor(): return monitoring.MetricsMonitor({'metrics_prefix': 'bench'}, registry=CollectorRegistry())
+
+def hot_path(mm, n):
+    for i in range(n):
+        mm.update_retry_stats("RNSReq.abcd1234", success=True, required_retries=i & 1)
+        mm.increment_proxied_packets("secure_exit_1", direction='sent_to_proxy')
+
+def run(threads, n):
+    mm = make_monitor(); workers = [threading.Thread(target=hot_path, args=(mm, n)) for _ in range(threads)]
+    t0 = time.perf_counter(); [w.start() for w in workers]; [w.join() for w in workers]; dt = time.perf_counter() - t0
+    events = threads * n * 2
+    body = generate_latest(mm.custom_registry).decode()
+    assert f'bench_proxied_packets_total{{direction="sent_to_proxy",proxy_alias="secure_exit_1"}} {float(threads * n)}' in body, "lost increments"
+    return dt / events * 1e9
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for threads in (1, 4):
+        print(f"threads={threads}: {run(threads, n):7.1f} ns/event")
@@ -0,0 +1,36 @@
+#Akita Engineering
+"""Load/chaos run of client -> proxy node -> target on the simulated Reticulum network (akita_ares.sim).
+
+Every request opens its own link to the proxy, as ProxyManager does. All of them start together, the client uplink is
+bandwidth-limited and lossy, and the run reports delivery, virtual vs wall time and per-stage latency percentiles.
+
+Usage: python benchmarks/bench_proxy_sim.py [requests] [loss] [seed]
+"""
+import sys, os, time, json
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from prometheus_client import CollectorRegistry
+from akita_ares.core.logger import setup_logging
+from akita_ares.features.monitoring import MetricsMonitor
+from akita_ares.features.proxying import ProxyManager
+from akita_ares.sim import SimNetwork
+
+def main(requests, loss, seed):
+    setup_logging(level='CRITICAL', console_output=False, log_file=None)
+    net = SimNetwork(seed=seed); client, proxy, target = net.add_node("client"), net.add_node("proxy"), net.add_node("target")
+    net.connect(client, proxy, latency_s=0.08, bandwidth_bps=64_000, loss=loss); net.connect(proxy, target, latency_s=0.15, bandwidth_bps=1_000_000)
+    echo = target.serve("bench", "echo", handler=lambda d: d, processing_s=0.02)
+    mm = MetricsMonitor({'metrics_prefix': 'bench'}, registry=CollectorRegistry()); done = []
+    with net.installed():
+        ProxyManager({'is_proxy_node': True, 'listen_on_aspect': 'exit'}, rns_instance=proxy.rns, metrics_monitor=mm)
+        route = {'alias': 'exit', 'entry_destination_name': 'ares.proxy.exit', 'exit_node_identity_hash': proxy.identity.hexhash}
+        cli = ProxyManager({'proxy_routes': [route]}, rns_instance=client.rns, metrics_monitor=mm)
+        t0, v0 = time.perf_counter(), net.clock.now()
+        with net.clock.participant():
+            for i in range(requests): net.spawn(cli.send_via_proxy, echo.hexhash, os.urandom(200), target_name=echo.name, response_callback=lambda d, e: done.append(e is None), timeout_s=60, node=client)
+        net.run_until_idle(600); wall, virtual = time.perf_counter() - t0, net.clock.now() - v0
+    stats = net.stats()
+    print(f"{sum(done)}/{requests} responses, {stats['lost']}/{stats['frames']} frames lost, {virtual:.1f}s virtual in {wall:.2f}s wall ({virtual / max(wall, 1e-9):.0f}x)")
+    print(json.dumps(mm.get_proxy_stage_stats(), indent=1, sort_keys=True))
+
+if __name__ == "__main__":
+    a = sys.argv[1:]; main(int(a[0]) if a else 200, float(a[1]) if len(a) > 1 else 0.02, int(a[2]) if len(a) > 2 else 1)
@@ -0,0 +1,53 @@
+#Akita Engineering
+"""Startup cost of the ARES daemon and CLI, each measured in a fresh interpreter.
+
+  import        - `import akita_ares.main`
+  --version     - full CLI round trip
+  configtest    - parse + validate the sample config
+  time-to-ready - process start until ARESApp.ready is set (RNS-free features up; RNS, if installed, initialising)
+
+Reference medians (5 runs, no RNS installed, jsonschema 4.26): interpreter 11 ms, import 43 ms, --version 48 ms,
+configtest 162 ms, time-to-ready 91 ms. configtest is the only case that validates: importing jsonschema alone
+costs ~75 ms of it, and building the validator and checking the sample most of the rest.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import sys, os, time, json, subprocess, tempfile, statistics
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+READY_SNIPPET = """
+import time; t0 = time.perf_counter()
+import sys; sys.path.insert(0, {root!r})
+from akita_ares.main import ARESApp
+from akita_ares.cli.main_cli import parse_args
+app = ARESApp(parse_args(['--config', {cfg!r}, '--schema', {cfg!r} + '.none', '--loglevel', 'CRITICAL']))
+app.ready.wait(60); print(time.perf_counter() - t0); app.shutdown()
+"""
+
+def timed(cmd):
+    t0 = time.perf_counter(); subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL); return time.perf_counter() - t0
+
+def ready_config(tmp):
+    with open(os.path.join(ROOT, "examples", "sample_config.json")) as f: cfg = json.load(f)
+    cfg['logging'].update(file=None, console_output=False); cfg['monitoring']['prometheus_port'] = 0
+    path = os.path.join(tmp, "bench_config.json")
+    with open(path, "w") as f: json.dump(cfg, f)
+    return path
+
+def main(runs):
+    py = sys.executable
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = ready_config(tmp); snippet = READY_SNIPPET.format(root=ROOT, cfg=cfg)
+        cases = {
+            "interpreter": lambda: timed([py, "-c", "pass"]),
+            "import": lambda: timed([py, "-c", "import akita_ares.main"]),
+            "--version": lambda: timed([py, "-m", "akita_ares.main", "--version"]),
+            "configtest": lambda: timed([py, "-m", "akita_ares.main", "configtest"]),
+            "time-to-ready": lambda: float(subprocess.run([py, "-c", snippet], cwd=tmp, capture_output=True, text=True).stdout.strip().splitlines()[-1]),
+        }
+        for name, fn in cases.items():
+            samples = [fn() for _ in range(runs)]
+            print(f"{name:>14}: median {statistics.median(samples) * 1000:7.1f} ms  (min {min(samples) * 1000:.1f} ms, {runs} runs)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
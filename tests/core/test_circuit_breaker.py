@@ -1,5 +1,5 @@
 import unittest, time
-from akita_ares.core.circuit_breaker import CircuitBreaker, CircuitBreakerState, CircuitBreakerOpenException
+from akita_ares.core.circuit_breaker import CircuitBreaker, CircuitBreakerState, CircuitBreakerOpenException, CircuitBreakerRegistry
 from akita_ares.core.logger import setup_logging 
 setup_logging(level='CRITICAL', console_output=False, log_file=None) 
 def mock_operation(fail=False, fail_times=0, success_after=0):
@@ -18,3 +18,36 @@ class TestCircuitBreaker(unittest.TestCase):
     def test_half_open_success_closes_circuit(self): rt = 0.1; cb = CircuitBreaker(1, rt); self.assertRaises(ValueError, cb.execute, mock_operation, fail=True); time.sleep(rt * 1.1); mock_operation.call_count = 0; result = cb.execute(mock_operation); self.assertEqual(result, "Success"); self.assertEqual(cb.state, CircuitBreakerState.CLOSED); self.assertEqual(cb.failure_count, 0)
     def test_half_open_failure_reopens_circuit(self): rt = 0.1; cb = CircuitBreaker(1, rt); self.assertRaises(ValueError, cb.execute, mock_operation, fail=True); time.sleep(rt * 1.1); mock_operation.call_count = 0; self.assertRaises(ValueError, cb.execute, mock_operation, fail=True); self.assertEqual(cb.state, CircuitBreakerState.OPEN); self.assertEqual(cb.failure_count, 2)
     def test_reset_after_success_in_closed(self): cb = CircuitBreaker(3, 10); self.assertRaises(ValueError, cb.execute, mock_operation, fail=True); self.assertEqual(cb.failure_count, 1); result = cb.execute(mock_operation); self.assertEqual(result, "Success"); self.assertEqual(cb.failure_count, 0); self.assertRaises(ValueError, cb.execute, mock_operation, fail=True); self.assertRaises(ValueError, cb.execute, mock_operation, fail=True); self.assertEqual(cb.failure_count, 2); self.assertEqual(cb.state, CircuitBreakerState.CLOSED)
+class TestCircuitBreakerConcurrency(unittest.TestCase):
+    def test_half_open_admits_single_trial(self):
+        cb = CircuitBreaker(1, 0.05); cb.record_failure(); time.sleep(0.06)
+        self.assertTrue(cb.allow_request()); self.assertEqual(cb.state, CircuitBreakerState.HALF_OPEN)
+        self.assertFalse(cb.allow_request()); self.assertRaises(CircuitBreakerOpenException, cb.execute, mock_operation)
+        cb.record_success(); self.assertEqual(cb.state, CircuitBreakerState.CLOSED); self.assertTrue(cb.allow_request())
+    def test_failure_rate_trigger(self):
+        cb = CircuitBreaker(100, 10, failure_rate_threshold=0.5, window_size=10, min_calls=4)
+        for failed in (False, True, False, True): cb.record_failure() if failed else cb.record_success()
+        self.assertEqual(cb.state, CircuitBreakerState.OPEN)
+    def test_rate_needs_min_calls(self):
+        cb = CircuitBreaker(100, 10, failure_rate_threshold=0.5, window_size=10, min_calls=4); cb.record_failure(); cb.record_failure()
+        self.assertEqual(cb.state, CircuitBreakerState.CLOSED); self.assertIsNone(cb.failure_rate())
+class TestCircuitBreakerRegistry(unittest.TestCase):
+    def test_lazy_creation(self):
+        reg = CircuitBreakerRegistry({'failure_threshold': 2})
+        self.assertTrue(reg.allow_request("dest")); reg.record_success("dest"); self.assertEqual(len(reg), 0)
+        reg.record_failure("dest"); reg.record_failure("dest"); self.assertEqual(len(reg), 1); self.assertFalse(reg.allow_request("dest"))
+        self.assertTrue(reg.allow_request("other"))
+    def test_max_breakers_evicts_healthy_first(self):
+        reg = CircuitBreakerRegistry({'failure_threshold': 1, 'max_breakers': 2})
+        reg.record_failure("dead"); reg.get("a"); reg.get("b")
+        self.assertEqual(len(reg), 2); self.assertIsNotNone(reg.peek("dead")); self.assertIsNone(reg.peek("a"))
+    def test_evict_idle(self):
+        reg = CircuitBreakerRegistry({'idle_eviction_seconds': 0, 'failure_threshold': 1}); reg.get("idle"); reg.record_failure("dead")
+        self.assertEqual(reg.evict_idle(), 1); self.assertEqual(list(reg.states()), ["dead"])
+    def test_update_config_reaches_live_breakers(self):
+        reg = CircuitBreakerRegistry({'failure_threshold': 5, 'recovery_timeout_seconds': 30, 'failure_rate_threshold': None})
+        reg.record_failure("live"); reg.record_failure("dead"); [reg.record_failure("dead") for _ in range(4)]; self.assertFalse(reg.allow_request("dead"))
+        reg.update_config({'failure_threshold': 2, 'recovery_timeout_seconds': 0, 'failure_rate_threshold': None, 'window_size': 5})
+        cb = reg.peek("live"); self.assertEqual((cb.failure_threshold, cb.recovery_timeout_seconds, cb._window.maxlen), (2, 0.0, 5)); self.assertEqual(cb.state, CircuitBreakerState.CLOSED)
+        reg.record_failure("live"); self.assertEqual(cb.state, CircuitBreakerState.OPEN)  # the second failure trips at the new threshold
+        self.assertTrue(reg.allow_request("dead"))  # already OPEN: the new recovery timeout applies to it at once
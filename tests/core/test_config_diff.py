@@ -0,0 +1,20 @@
+#Akita Engineering
+import unittest
+from akita_ares.core.config_diff import ConfigDiff, diff_keyed_list
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class TestConfigDiff(unittest.TestCase):
+    def test_per_section_per_key(self):
+        old = {"logging": {"level": "INFO", "file": "a.log"}, "monitoring": {"prometheus_port": 1}, "flag": 1}
+        new = {"logging": {"level": "DEBUG", "file": "a.log", "async_output": True}, "monitoring": {"prometheus_port": 1}, "flag": 2, "tracing": {"enabled": True}}
+        d = ConfigDiff(old, new)
+        self.assertEqual(set(d.sections), {"logging", "flag", "tracing"}); self.assertNotIn("monitoring", d)
+        self.assertEqual(d.section("logging").changed, {"level": ("INFO", "DEBUG")}); self.assertEqual(d.section("logging").added, {"async_output": True})
+        self.assertEqual(d.section("flag").changed, {"flag": (1, 2)}); self.assertEqual(d.changed_keys("tracing"), {"enabled"})
+        self.assertFalse(d.only_changed("logging", ("level", "module_levels"))); self.assertIn("logging.level: 'INFO' -> 'DEBUG'", d.describe())
+        self.assertFalse(ConfigDiff(old, dict(old)))
+    def test_keyed_list(self):
+        a = [{"alias": "r1", "x": 1}, {"alias": "r2", "x": 1}]; b = [{"alias": "r1", "x": 1}, {"alias": "r2", "x": 2}, {"alias": "r3"}]
+        d = diff_keyed_list(a, b, "alias")
+        self.assertEqual(set(d.added), {"r3"}); self.assertEqual(d.removed, {}); self.assertEqual(set(d.changed), {"r2"})
+if __name__ == '__main__': unittest.main()
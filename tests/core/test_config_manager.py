@@ -35,6 +35,22 @@ class TestConfigManager(unittest.TestCase):
         self.assertEqual(reloaded_config, new_config_data)
         self.assertEqual(manager.get_config(), new_config_data)
 
+    def test_reload_reports_diff_and_reuses_validator(self):
+        manager = ConfigManager(self.config_path, schema_fp=self.schema_path); validator = manager._validator; self.assertIsNotNone(validator)
+        manager.reload_config(); self.assertFalse(manager.last_diff)
+        with open(self.config_path, 'w') as f: json.dump({"logging": {"level": "WARNING"}, "ares_core": {"rns_config_path": "~/.rns_test"}}, f)
+        manager.reload_config()
+        self.assertEqual(set(manager.last_diff.sections), {"logging"}); self.assertEqual(manager.last_diff.section("logging").changed, {"level": ("DEBUG", "WARNING")})
+        self.assertIs(manager._validator, validator)
+
+    def test_set_schema_validates_parsed_config(self):
+        manager = ConfigManager(self.config_path, schema_fp=None, validate_on_load=False); manager.set_schema(self.schema_path)
+        self.assertEqual(manager.get_config(), self.valid_config_data); self.assertIsNotNone(manager._validator)
+        bad_path = os.path.join(self.temp_dir.name, 'bad.json')
+        with open(bad_path, 'w') as f: json.dump(self.invalid_config_data_for_schema, f)
+        manager = ConfigManager(bad_path, schema_fp=None, validate_on_load=False); self.assertEqual(manager.get_config(), self.invalid_config_data_for_schema)
+        manager.set_schema(self.schema_path); self.assertEqual(manager.get_config(), {})
+
     def test_reload_config_becomes_invalid(self):
         manager = ConfigManager(self.config_path, schema_fp=self.schema_path)
         original_config = manager.get_config().copy()
@@ -60,4 +76,10 @@ class TestConfigManager(unittest.TestCase):
         manager = ConfigManager(invalid_config_path, schema_fp=self.schema_path, validate_on_load=False)
         self.assertEqual(manager.get_config(), self.invalid_config_data_for_schema)
         self.assertRaises(jsonschema_exceptions.ValidationError, manager.validate_config_schema, manager.get_config())
-
+class TestShippedExamples(unittest.TestCase):
+    EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "..", "examples")
+    def test_sample_config_validates_against_shipped_schema(self):
+        manager = ConfigManager(os.path.join(self.EXAMPLES, 'sample_config.json'), schema_fp=os.path.join(self.EXAMPLES, 'config_schema.json'))
+        self.assertIsNotNone(manager._validator, "examples/config_schema.json failed to load")
+        self.assertTrue(manager.get_config(), "examples/sample_config.json was rejected by the schema")
+        manager.validate_config_schema(manager.get_config())
@@ -0,0 +1,26 @@
+#Akita Engineering
+import unittest, time
+from akita_ares.core.deadline import Deadline, DeadlineExceededException, deadline_scope, current_deadline, effective_deadline
+from akita_ares.core.circuit_breaker import CircuitBreaker, CircuitBreakerState
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class TestDeadline(unittest.TestCase):
+    def test_remaining_and_cap(self):
+        dl = Deadline(10); self.assertFalse(dl.expired()); self.assertLessEqual(dl.remaining(), 10)
+        self.assertEqual(dl.cap(1), 1); self.assertLessEqual(dl.cap(60), 10); self.assertTrue(Deadline(0).expired())
+    def test_wire_roundtrip(self):
+        dl = Deadline.from_wire_ms(Deadline(2).to_wire_ms()); self.assertGreater(dl.remaining(), 1.9); self.assertTrue(Deadline.from_wire_ms(0).expired())
+    def test_scope_nesting_only_shortens(self):
+        self.assertIsNone(current_deadline())
+        with deadline_scope(1.0) as outer:
+            self.assertIs(current_deadline(), outer)
+            with deadline_scope(60) as inner: self.assertIs(inner, outer)
+            with deadline_scope(0.1) as inner: self.assertLess(inner.remaining(), 0.2)
+        self.assertIsNone(current_deadline())
+    def test_effective_deadline_picks_earliest(self):
+        dl = Deadline(5); self.assertIs(effective_deadline(dl, 30), dl); self.assertIsNone(effective_deadline())
+    def test_circuit_breaker_skips_expired_without_counting(self):
+        cb = CircuitBreaker(1, 10); calls = []
+        with deadline_scope(0): self.assertRaises(DeadlineExceededException, cb.execute, lambda: calls.append(1))
+        self.assertEqual(calls, []); self.assertEqual(cb.state, CircuitBreakerState.CLOSED); self.assertEqual(cb.failure_count, 0)
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,17 @@
+#Akita Engineering
+import unittest, random
+from akita_ares.core.heavy_hitters import SpaceSaving
+class TestSpaceSaving(unittest.TestCase):
+    def test_exact_below_capacity(self):
+        ss = SpaceSaving(10); [ss.offer(k) for k in "aabbbc"]
+        self.assertEqual(ss.top(2), [("b", 3, 0), ("a", 2, 0)]); self.assertEqual(ss.total, 6)
+    def test_bounded_memory_keeps_heavy_hitters(self):
+        rng = random.Random(7); ss = SpaceSaving(20)
+        for i in range(20000): ss.offer(f"hot{i % 3}" if rng.random() < 0.5 else f"cold{rng.randrange(5000)}")
+        self.assertEqual(len(ss), 20); self.assertEqual({k for k, _, _ in ss.top(3)}, {"hot0", "hot1", "hot2"})
+        for key, count, err in ss.top(3): self.assertGreaterEqual(count - err, 20000 * 0.5 / 3 * 0.9)
+    def test_evicted_key_reported_and_resize(self):
+        ss = SpaceSaving(2); ss.offer("a", 5); ss.offer("b", 1)
+        self.assertEqual(ss.offer("c"), "b"); self.assertEqual(ss.count("c"), 2)
+        self.assertEqual(ss.resize(1), ["c"]); self.assertIn("a", ss)
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,20 @@
+#Akita Engineering
+import unittest, random
+from akita_ares.core.latency_histogram import LogLinearHistogram
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class TestLogLinearHistogram(unittest.TestCase):
+    def test_percentiles_within_relative_error(self):
+        h = LogLinearHistogram(); rng = random.Random(7); xs = sorted(rng.lognormvariate(-4, 1.5) for _ in range(20000))
+        for x in xs: h.record(x)
+        for q in (50, 90, 99):
+            exact = xs[int(q / 100 * len(xs)) - 1]; self.assertAlmostEqual(h.percentile(q), exact, delta=exact / h.sub_buckets)
+        self.assertEqual(h.count, 20000); self.assertEqual(h.max, xs[-1]); self.assertEqual(h.min, xs[0])
+    def test_empty_and_clamped(self):
+        h = LogLinearHistogram(highest_s=1.0); self.assertIsNone(h.percentile(50)); self.assertEqual(h.summary()['count'], 0)
+        h.record(5000.0); h.record(-1); self.assertEqual(h.percentile(100), 5000.0); self.assertLess(h.percentile(1), h.lowest_s)
+    def test_cumulative_counts(self):
+        h = LogLinearHistogram()
+        for v in (0.0005, 0.002, 0.002, 0.3, 7.0): h.record(v)
+        self.assertEqual(h.cumulative_counts([0.001, 0.01, 1.0, 10.0]), [(0.001, 1), (0.01, 3), (1.0, 4), (10.0, 5)])
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,12 @@
+#Akita Engineering
+import unittest
+from akita_ares.core.latency_tracker import LatencyTracker
+class TestLatencyTracker(unittest.TestCase):
+    def test_empty_returns_default(self): self.assertIsNone(LatencyTracker().percentile(99)); self.assertEqual(LatencyTracker().percentile(50, default=1.5), 1.5)
+    def test_percentiles(self):
+        t = LatencyTracker(window=100); [t.record(i / 100.0) for i in range(1, 101)]
+        self.assertAlmostEqual(t.percentile(50), 0.5, delta=0.011); self.assertAlmostEqual(t.percentile(99), 0.99, delta=0.011); self.assertEqual(t.percentile(100), 1.0)
+    def test_window_evicts_old_samples(self):
+        t = LatencyTracker(window=3); [t.record(v) for v in (10, 10, 1, 1, 1)]
+        self.assertEqual(len(t), 3); self.assertEqual(t.percentile(100), 1)
+if __name__ == '__main__': unittest.main()
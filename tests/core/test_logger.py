@@ -1,5 +1,5 @@
-import unittest, logging, os, tempfile
-from akita_ares.core.logger import setup_logging, get_logger, update_module_log_levels, ARES_LOGGER_NAME
+import unittest, logging, os, tempfile, queue, threading
+from akita_ares.core.logger import setup_logging, get_logger, update_module_log_levels, ARES_LOGGER_NAME, shutdown_logging, get_dropped_log_counts, DroppingQueueHandler, RateLimitFilter
 class TestLogger(unittest.TestCase):
     def setUp(self): self.temp_dir = tempfile.TemporaryDirectory(); self.log_file_path = os.path.join(self.temp_dir.name, 'test_ares.log'); root_logger = logging.getLogger(ARES_LOGGER_NAME); root_logger.handlers.clear(); root_logger.setLevel(logging.CRITICAL + 1); logging.getLogger(f"{ARES_LOGGER_NAME}.TestModule").setLevel(logging.NOTSET); logging.getLogger(f"{ARES_LOGGER_NAME}.AnotherModule").setLevel(logging.NOTSET)
     def tearDown(self):
@@ -17,3 +17,32 @@ class TestLogger(unittest.TestCase):
     def test_update_module_log_levels(self): setup_logging(level='INFO', console_output=False, log_file=None); module_levels = {f"{ARES_LOGGER_NAME}.TestModule": "DEBUG", f"{ARES_LOGGER_NAME}.AnotherModule": "WARNING", "NonAresLogger": "ERROR"}; update_module_log_levels(module_levels); self.assertEqual(get_logger().level, logging.INFO); self.assertEqual(get_logger("TestModule").level, logging.DEBUG); self.assertEqual(get_logger("AnotherModule").level, logging.WARNING)
     def test_log_file_rotation(self): setup_logging(log_file=self.log_file_path, max_bytes=50, backup_count=1, level='DEBUG', console_output=False); logger = get_logger("RotationTest"); [logger.debug(f"Line {i}") for i in range(20)]; self.assertTrue(os.path.exists(self.log_file_path))
     def test_cli_override_logging(self): config_log_config = {"level": "INFO", "module_levels": {"ARES.Module1": "DEBUG"}}; cli_override_level = "WARNING"; effective_root_level = cli_override_level or config_log_config.get('level'); setup_logging(level=effective_root_level, module_levels=config_log_config.get('module_levels'), console_output=False, log_file=None); self.assertEqual(get_logger().level, logging.WARNING); self.assertEqual(get_logger("Module1").level, logging.DEBUG)
+class _ListHandler(logging.Handler):
+    def __init__(self): super().__init__(); self.records = []
+    def emit(self, record): self.records.append(record.getMessage())
+class TestAsyncAndRateLimitedLogging(unittest.TestCase):
+    def setUp(self): self.temp_dir = tempfile.TemporaryDirectory(); self.log_file_path = os.path.join(self.temp_dir.name, 'async.log')
+    def tearDown(self): shutdown_logging(); logging.getLogger(ARES_LOGGER_NAME).handlers.clear(); self.temp_dir.cleanup()
+    def test_async_output_writes_through_listener(self):
+        setup_logging(level='DEBUG', log_file=self.log_file_path, console_output=False, async_output=True); root_logger = logging.getLogger(ARES_LOGGER_NAME)
+        self.assertEqual([type(h) for h in root_logger.handlers], [DroppingQueueHandler])
+        get_logger("AsyncTest").debug("hello %s", "world"); shutdown_logging()
+        with open(self.log_file_path) as f: self.assertIn("hello world", f.read())
+    def test_full_queue_drops_and_counts(self):
+        before = get_dropped_log_counts()['queue_full']; qh = DroppingQueueHandler(queue.Queue(maxsize=1))
+        for i in range(3): qh.handle(logging.makeLogRecord({'msg': f'm{i}', 'levelno': logging.INFO}))
+        self.assertEqual(get_dropped_log_counts()['queue_full'] - before, 2)
+    def test_drops_from_many_threads_are_all_counted(self):
+        before = get_dropped_log_counts()['queue_full']; q = queue.Queue(maxsize=1); q.put(None); qh = DroppingQueueHandler(q)
+        rec = logging.makeLogRecord({'msg': 'm', 'levelno': logging.INFO})
+        threads = [threading.Thread(target=lambda: [qh.enqueue(rec) for _ in range(5000)]) for _ in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(get_dropped_log_counts()['queue_full'] - before, 40000)
+    def test_rate_limit_per_site_with_sampling(self):
+        logger = logging.getLogger("RateLimitTest"); logger.propagate = False; h = _ListHandler(); h.addFilter(RateLimitFilter(rate_per_second=0.0001, burst=2, sample_every=5)); logger.addHandler(h); logger.setLevel(logging.DEBUG)
+        before = get_dropped_log_counts()['rate_limited']
+        for i in range(12): logger.info("packet %d", i)
+        logger.warning("never limited")
+        self.assertEqual(h.records, ["packet 0", "packet 1", "packet 6 [4 similar suppressed]", "packet 11 [4 similar suppressed]", "never limited"])
+        self.assertEqual(get_dropped_log_counts()['rate_limited'] - before, 8)
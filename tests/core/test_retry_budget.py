@@ -0,0 +1,27 @@
+#Akita Engineering
+import unittest, time
+from akita_ares.core.retry_budget import RetryBudget
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class TestRetryBudget(unittest.TestCase):
+    def test_starts_full_and_drains(self):
+        rb = RetryBudget(retry_ratio=0.1, min_retries_per_second=0, max_tokens=3)
+        self.assertTrue(all(rb.try_withdraw() for _ in range(3)))
+        self.assertFalse(rb.try_withdraw())
+    def test_successes_fund_retries_at_ratio(self):
+        rb = RetryBudget(retry_ratio=0.5, min_retries_per_second=0, max_tokens=2)
+        while rb.try_withdraw(): pass
+        rb.deposit(); self.assertFalse(rb.try_withdraw())
+        rb.deposit(); self.assertTrue(rb.try_withdraw())
+    def test_max_tokens_caps_banked_credit(self):
+        rb = RetryBudget(retry_ratio=1.0, min_retries_per_second=0, max_tokens=2)
+        for _ in range(50): rb.deposit()
+        self.assertAlmostEqual(rb.tokens, 2.0)
+    def test_min_rate_refills(self):
+        rb = RetryBudget(retry_ratio=0, min_retries_per_second=50, max_tokens=1)
+        self.assertTrue(rb.try_withdraw()); self.assertFalse(rb.try_withdraw())
+        time.sleep(0.05); self.assertTrue(rb.try_withdraw())
+    def test_update_clamps_balance(self):
+        rb = RetryBudget(retry_ratio=0.1, min_retries_per_second=0, max_tokens=10)
+        rb.update(0.2, 0, 4); self.assertAlmostEqual(rb.tokens, 4.0); self.assertEqual(rb.retry_ratio, 0.2)
+if __name__ == '__main__': unittest.main()
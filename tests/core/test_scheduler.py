@@ -0,0 +1,58 @@
+#Akita Engineering
+import unittest, threading, time
+from akita_ares.core.scheduler import Scheduler, OVERLAP_COALESCE, OVERLAP_ALLOW
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class RecordingMonitor:
+    def __init__(self): self.runs = []
+    def record_scheduled_run(self, task, dur_s, lateness_s, outcome): self.runs.append((task, dur_s, lateness_s, outcome))
+class TestScheduler(unittest.TestCase):
+    def setUp(self): self.mm = RecordingMonitor(); self.s = Scheduler(max_workers=2, metrics_monitor=self.mm)
+    def tearDown(self): self.s.stop(wait=True)
+    def wait_for(self, cond, timeout=2.0):
+        end = time.monotonic() + timeout
+        while not cond() and time.monotonic() < end: time.sleep(0.005)
+        return cond()
+    def test_tasks_run_at_their_own_interval_and_report_metrics(self):
+        fast, slow = [], []
+        self.s.add_task('fast', lambda: fast.append(1), 0.02, initial_delay_s=0); self.s.add_task('slow', lambda: slow.append(1), 10, initial_delay_s=0)
+        self.s.start(); self.assertTrue(self.wait_for(lambda: len(fast) >= 5))
+        self.assertEqual(len(slow), 1)
+        outcomes = {(t, o) for t, d, l, o in self.mm.runs}; self.assertIn(('fast', 'ok'), outcomes); self.assertIn(('slow', 'ok'), outcomes)
+        self.assertTrue(all(d is not None and d >= 0 and l >= 0 for t, d, l, o in self.mm.runs))
+    def test_failing_task_keeps_running(self):
+        calls = []
+        def boom(): calls.append(1); raise RuntimeError("x")
+        self.s.add_task('boom', boom, 0.01, initial_delay_s=0); self.s.start()
+        self.assertTrue(self.wait_for(lambda: len(calls) >= 3)); self.assertTrue(self.wait_for(lambda: self.s.stats()['boom']['errors'] >= 3))
+    def test_overlap_skip_and_coalesce(self):
+        gate = threading.Event(); runs = {'skip': 0, 'coalesce': 0}
+        def blocker(name):
+            def fn(): runs[name] += 1; gate.wait(2)
+            return fn
+        self.s.add_task('skip', blocker('skip'), 0.01, initial_delay_s=0); self.s.add_task('coalesce', blocker('coalesce'), 0.01, initial_delay_s=0, overlap=OVERLAP_COALESCE)
+        self.s.start(); self.assertTrue(self.wait_for(lambda: self.s.stats()['skip']['skipped'] >= 3))
+        self.assertEqual(runs, {'skip': 1, 'coalesce': 1})
+        gate.set(); self.assertTrue(self.wait_for(lambda: runs['coalesce'] >= 2))  # the pending run fires right after
+        self.assertIn(('skip', None), {(t, d) for t, d, l, o in self.mm.runs if o == 'skipped'})
+    def test_overlap_allow_runs_concurrently(self):
+        gate = threading.Event(); active = []
+        self.s.add_task('par', lambda: (active.append(1), gate.wait(2)), 0.01, initial_delay_s=0, overlap=OVERLAP_ALLOW)
+        self.s.start(); self.assertTrue(self.wait_for(lambda: len(active) >= 2)); gate.set()
+    def test_replace_and_remove(self):
+        a, b = [], []
+        self.s.add_task('t', lambda: a.append(1), 0.01, initial_delay_s=0); self.s.add_task('t', lambda: b.append(1), 0.01, initial_delay_s=0)
+        self.s.add_task('feature.x', lambda: None, 1); self.s.add_task('feature.y', lambda: None, 1); self.s.remove_tasks('feature.')
+        self.assertEqual(self.s.task_names(), ['t'])
+        self.s.start(); self.assertTrue(self.wait_for(lambda: len(b) >= 2)); self.assertEqual(a, [])
+        self.s.remove_task('t'); time.sleep(0.05); n = len(b); time.sleep(0.05); self.assertEqual(len(b), n)
+    def test_jitter_does_not_stretch_the_period(self):
+        stamps = []
+        self.s.add_task('j', lambda: stamps.append(time.monotonic()), 0.02, jitter_s=0.02, initial_delay_s=0); self.s.start()
+        self.assertTrue(self.wait_for(lambda: len(stamps) >= 40, timeout=5.0))
+        self.assertAlmostEqual((stamps[39] - stamps[0]) / 39, 0.02, delta=0.004)  # accumulated jitter would average 0.03
+    def test_stop_is_immediate(self):
+        self.s.add_task('far', lambda: None, 3600); self.s.start()
+        t0 = time.monotonic(); self.s.stop(); self.assertLess(time.monotonic() - t0, 0.5)
+        with self.assertRaises(ValueError): self.s.add_task('bad', lambda: None, 0)
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,14 @@
+#Akita Engineering
+import unittest, threading
+from akita_ares.core.striped_counter import StripedCounter
+class TestStripedCounter(unittest.TestCase):
+    def test_concurrent_increments_not_lost(self):
+        c = StripedCounter()
+        def work():
+            for _ in range(10000): c.inc('a'); c.inc(('x', 'y'), 2)
+        ts = [threading.Thread(target=work) for _ in range(8)]; [t.start() for t in ts]; [t.join() for t in ts]
+        snap = c.snapshot(); self.assertEqual(snap['a'], 80000); self.assertEqual(snap[('x', 'y')], 160000)
+    def test_dead_thread_cells_folded(self):
+        c = StripedCounter(); t = threading.Thread(target=c.inc, args=('k', 5)); t.start(); t.join()
+        c.inc('k'); self.assertEqual(c.get('k'), 6); self.assertEqual(len(c._cells), 1); self.assertEqual(c.get('k'), 6)
+if __name__ == '__main__': unittest.main()
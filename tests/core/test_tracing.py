@@ -0,0 +1,29 @@
+#Akita Engineering
+import unittest, os, json, tempfile
+from akita_ares.core.tracing import Tracer
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'traces.jsonl')
+    def read(self): return [json.loads(l) for l in open(self.path)]
+    def test_disabled_returns_no_span(self):
+        self.assertIsNone(Tracer({'enabled': False}).start_span('x'))
+    def test_sampled_spans_written_with_parent_links(self):
+        t = Tracer({'enabled': True, 'sample_rate': 1.0, 'file': self.path})
+        root = t.start_span('client', target='ab'); ctx = root.context(); self.assertTrue(ctx['sampled'])
+        child = t.start_span('node', parent=json.loads(json.dumps(ctx))); child.end(outcome='forwarded'); root.end(); root.end()
+        t.shutdown(); recs = self.read()
+        self.assertEqual([r['name'] for r in recs], ['node', 'client'])
+        self.assertEqual(recs[0]['trace_id'], recs[1]['trace_id']); self.assertEqual(recs[0]['parent_id'], recs[1]['span_id'])
+        self.assertEqual(recs[0]['attrs'], {'outcome': 'forwarded'}); self.assertEqual(t.stats()['emitted'], 2)
+    def test_unsampled_requests_build_no_span(self):
+        t = Tracer({'enabled': True, 'sample_rate': 0.0, 'file': self.path})
+        self.assertIsNone(t.start_span('client')); self.assertIsNone(t.start_span('node', parent={'id': 'a' * 32, 'span': 'b' * 16, 'sampled': False}))
+        t.shutdown(); self.assertEqual(self.read(), []); self.assertIsNone(t.start_span('node', parent="garbage"))
+    def test_full_queue_drops_instead_of_blocking(self):
+        t = Tracer({'enabled': True, 'sample_rate': 1.0, 'file': self.path, 'queue_size': 1})
+        t._listener.stop()  # stall the writer so the queue fills
+        for _ in range(5): t.start_span('s').end()
+        self.assertEqual(t.dropped, 4); t._listener.start(); t.shutdown()
+if __name__ == '__main__': unittest.main()
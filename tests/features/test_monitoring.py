@@ -0,0 +1,94 @@
+#Akita Engineering
+import unittest, threading, gzip, json, urllib.request
+from unittest import mock
+from prometheus_client import CollectorRegistry, generate_latest
+from akita_ares.features import monitoring
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+def make_monitor(config=None): return monitoring.MetricsMonitor(dict({'metrics_prefix': 't'}, **(config or {})), registry=CollectorRegistry())
+class TestHotPathMetrics(unittest.TestCase):
+    def test_striped_counters_exported_at_scrape(self):
+        mm = make_monitor()
+        def work():
+            for _ in range(1000): mm.update_retry_stats("op", success=True, required_retries=1); mm.increment_proxied_packets("r1")
+        ts = [threading.Thread(target=work) for _ in range(4)]; [t.start() for t in ts]; [t.join() for t in ts]
+        body = generate_latest(mm.custom_registry).decode()
+        self.assertIn('t_retry_executions_total{operation_name="op"} 4000.0', body)
+        self.assertIn('t_retry_successes_on_retry_total{operation_name="op"} 4000.0', body)
+        self.assertIn('t_proxied_packets_total{direction="sent_to_proxy",proxy_alias="r1"} 4000.0', body)
+    def test_bound_children_cached(self):
+        mm = make_monitor(); mm.record_operation_duration("op", 0.1); mm.record_operation_duration("op", 0.2)
+        self.assertEqual(len([k for k in mm._bound if k[1] == ("op",)]), 1)
+        self.assertIn('t_retry_operation_duration_seconds_count{operation_name="op"} 2.0', generate_latest(mm.custom_registry).decode())
+    def test_scheduler_run_metrics(self):
+        mm = make_monitor(); mm.record_scheduled_run("task.a", 0.02, 0.003, "ok"); mm.record_scheduled_run("task.a", None, 1.5, "skipped")
+        body = generate_latest(mm.custom_registry).decode()
+        self.assertIn('t_scheduler_task_duration_seconds_count{task="task.a"} 1.0', body)
+        self.assertIn('t_scheduler_task_lateness_seconds_count{task="task.a"} 2.0', body)
+        self.assertIn('t_scheduler_task_runs_total{outcome="skipped",task="task.a"} 1.0', body)
+class TestPerDestinationCardinality(unittest.TestCase):
+    def test_only_top_k_destinations_exported(self):
+        mm = make_monitor({'per_destination_top_k': 2})
+        for i in range(500):
+            mm.record_path_choice(f"{i:032x}", "rtt", 1.0); mm.record_path_choice("aa" * 16, "rtt", 0.1)
+            if i % 2: mm.record_path_choice("bb" * 16, "rtt", 0.2)
+        body = generate_latest(mm.custom_registry).decode()
+        series = [l for l in body.splitlines() if l.startswith('t_path_selection_chosen_metric_value{')]
+        self.assertEqual(len(series), 3)
+        self.assertIn('t_path_selection_chosen_metric_value{destination_hash="' + "aa" * 16 + '",metric_type="rtt"} 0.1', body)
+        self.assertIn('t_path_selection_chosen_metric_value{destination_hash="other",metric_type="rtt"} 1.0', body)
+        self.assertIn('t_path_selection_evaluations_total 1250.0', body)
+        self.assertLessEqual(len(mm.path_selection_chosen_metric_value._values), 2 * monitoring.SKETCH_CAPACITY_FACTOR)
+    def test_resize_on_config_update(self):
+        mm = make_monitor({'per_destination_top_k': 5}); mm.update_config({'metrics_prefix': 't', 'per_destination_top_k': 1})
+        self.assertEqual(mm.path_selection_chosen_metric_value.top_k, 1)
+class ServerMixin:
+    CONFIG = {}
+    def setUp(self):
+        self.mm = make_monitor(dict({'prometheus_port': 0}, **self.CONFIG)); self.mm.start(); self.addCleanup(self.mm.stop)
+        self.base = f"http://127.0.0.1:{self.mm._http_server.server_address[1]}"
+    def get(self, path, headers=None):
+        with urllib.request.urlopen(urllib.request.Request(self.base + path, headers=headers or {}), timeout=5) as r: return r.status, dict(r.headers), r.read()
+    def status(self, path):
+        try: return self.get(path)[0]
+        except urllib.error.HTTPError as e: return e.code
+class TestHttpServing(ServerMixin, unittest.TestCase):
+    CONFIG = {'metrics_cache_ttl_seconds': 60}
+    def test_metrics_cached_and_gzipped(self):
+        self.mm.update_retry_stats("op", success=True, required_retries=0)
+        _, hdrs, body = self.get('/metrics'); self.assertNotIn('Content-Encoding', hdrs); self.assertIn(b't_retry_executions_total{operation_name="op"} 1.0', body)
+        self.mm.update_retry_stats("op", success=True, required_retries=0)
+        _, hdrs, gz = self.get('/metrics', {'Accept-Encoding': 'gzip'})
+        self.assertEqual(hdrs['Content-Encoding'], 'gzip'); self.assertEqual(gzip.decompress(gz), body)  # served from cache within TTL
+        self.assertEqual(hdrs['Vary'], 'Accept-Encoding'); self.assertEqual(self.get('/metrics')[1]['Vary'], 'Accept-Encoding')
+    def test_health_not_blocked_by_metrics_generation(self):
+        with self.mm._scrape_lock: self.assertEqual(self.get('/health')[2], b'OK')
+        self.assertEqual(self.status('/nope'), 404)
+    def test_stats_endpoint_reports_stage_percentiles(self):
+        for ms in range(1, 101): self.mm.record_proxy_stage("r1", "proxy_to_target_rtt", ms / 1000.0)
+        stats = json.loads(self.get('/stats')[2])['proxy_stage_latency_seconds']['r1']['proxy_to_target_rtt']
+        self.assertEqual(stats['count'], 100); self.assertAlmostEqual(stats['p50'], 0.050, delta=0.004); self.assertAlmostEqual(stats['p99'], 0.099, delta=0.007)
+        body = generate_latest(self.mm.custom_registry).decode()
+        self.assertIn('t_proxy_stage_latency_seconds_bucket{le="0.05",route="r1",stage="proxy_to_target_rtt"}', body)
+        self.assertIn('t_proxy_stage_latency_seconds_count{route="r1",stage="proxy_to_target_rtt"} 100.0', body)
+class TestDebugEndpoints(ServerMixin, unittest.TestCase):
+    CONFIG = {'enable_debug_endpoints': True, 'debug_max_seconds': 2}
+    def test_profile_threads_and_alloc(self):
+        stop = threading.Event()
+        def busy_loop_for_profile():
+            while not stop.is_set(): sum(range(200))
+        t = threading.Thread(target=busy_loop_for_profile, name="busy"); t.start(); self.addCleanup(lambda: (stop.set(), t.join()))
+        collapsed = self.get('/debug/profile?seconds=0.2')[2].decode()
+        self.assertTrue(any(l.startswith('busy;') and 'busy_loop_for_profile' in l for l in collapsed.splitlines()))
+        self.assertIn('busy_loop_for_profile', self.get('/debug/profile?seconds=0.1&format=top')[2].decode())
+        self.assertIn('Thread "busy"', self.get('/debug/threads')[2].decode())
+        self.assertTrue(self.get('/debug/alloc?seconds=0.05')[2].startswith(b'Top '))
+    def test_captures_bounded_and_exclusive(self):
+        self.assertEqual(self.status('/debug/profile?seconds=99'), 400); self.assertEqual(self.status('/debug/alloc?seconds=x'), 400)
+        with self.mm._debug_lock: self.assertEqual(self.status('/debug/profile?seconds=0.1'), 409)
+        self.mm.update_config(dict(self.mm.config, enable_debug_endpoints=False)); self.assertEqual(self.status('/debug/threads'), 404)
+    def test_alloc_limit_is_checked_and_clamped(self):
+        self.assertEqual(self.status('/debug/alloc?seconds=0.01&limit=x'), 400); self.assertFalse(self.mm._debug_lock.locked())
+        with mock.patch.object(monitoring.sampling_profiler, 'allocation_top', return_value='Top') as top:
+            for q, want in (('0', 1), ('-5', 1), ('100000', 500), ('40', 40)): self.assertEqual(self.status(f'/debug/alloc?seconds=0.01&limit={q}'), 200); self.assertEqual(top.call_args.kwargs['limit'], want)
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,109 @@
+#Akita Engineering
+import unittest, os, json, tempfile, threading, time
+from unittest import mock
+from akita_ares.features import proxying
+from akita_ares.core.circuit_breaker import CircuitBreakerRegistry
+from akita_ares.sim import SimNetwork
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class FakeDestination:
+    IN, OUT, SINGLE = 0, 1, 2
+    def __init__(self, identity, direction, kind, *aspects): self.aspects = aspects; self.closed = False
+    def set_link_established_callback(self, cb): self.cb = cb
+    hexhash = "ab" * 16
+    def close(self): self.closed = True
+class FakeLink:
+    def __init__(self, destination): self.link_id = os.urandom(16); self.destination = destination
+    def is_active(self): return True
+    def close(self): pass
+    def set_resource_callback(self, cb): pass
+    def set_link_closed_callback(self, cb): pass
+class TestProxyConfigReload(unittest.TestCase):
+    def setUp(self):
+        for name, val in (('RNS_AVAILABLE', True), ('Destination', FakeDestination)):
+            p = mock.patch.object(proxying, name, val); p.start(); self.addCleanup(p.stop)
+        self.rns = mock.Mock(identity=None)
+    def test_aspect_change_keeps_links_and_drains_old_destination(self):
+        pm = proxying.ProxyManager({'is_proxy_node': True, 'listen_on_aspect': 'a'}, rns_instance=self.rns); old = pm.service_destination
+        pm.update_config({'is_proxy_node': True, 'listen_on_aspect': 'a', 'proxy_protocol_version': '1.0'}); self.assertIs(pm.service_destination, old)
+        link = FakeLink(old); pm.active_client_links[link.link_id.hex()] = link
+        pm.update_config({'is_proxy_node': True, 'listen_on_aspect': 'b'})
+        self.assertIsNot(pm.service_destination, old); self.assertEqual(pm.service_destination.aspects[-1], 'b')
+        self.assertIn(link.link_id.hex(), pm.active_client_links); pm.periodic_check(); self.assertFalse(old.closed)
+        del pm.active_client_links[link.link_id.hex()]; pm.periodic_check(); self.assertTrue(old.closed)
+    def test_route_change_resets_only_that_route_breaker(self):
+        reg = CircuitBreakerRegistry({}); r1 = {'alias': 'r1', 'entry_destination_name': 'ares.proxy.x', 'exit_node_identity_hash': 'a' * 32}
+        pm = proxying.ProxyManager({'proxy_routes': [r1, dict(r1, alias='r2')]}, rns_instance=self.rns, breaker_registry=reg)
+        reg.record_failure('proxy:r1'); reg.record_failure('proxy:r2')
+        pm.update_config({'proxy_routes': [r1, dict(r1, alias='r2', exit_node_identity_hash='b' * 32)]})
+        self.assertIsNotNone(reg.peek('proxy:r1')); self.assertIsNone(reg.peek('proxy:r2'))
+    def test_role_flip_in_both_directions_does_not_deadlock(self):
+        route = {'alias': 'r1', 'entry_destination_name': 'ares.proxy.x', 'exit_node_identity_hash': 'a' * 32}
+        pm = proxying.ProxyManager({'is_proxy_node': True, 'listen_on_aspect': 'a'}, rns_instance=self.rns); dest = pm.service_destination
+        link = FakeLink(dest); pm.active_client_links[link.link_id.hex()] = link; pm.pending_client_requests['x'] = link
+        def reload(cfg):
+            t = threading.Thread(target=pm.update_config, args=(cfg,), daemon=True); t.start(); t.join(2.0); self.assertFalse(t.is_alive(), f"update_config({cfg}) hung")
+        reload({'is_proxy_node': False, 'proxy_routes': [route]})
+        self.assertIsNone(pm.service_destination); self.assertTrue(dest.closed); self.assertEqual(pm.active_client_links, {}); self.assertEqual(pm.pending_client_requests, {})
+        self.assertEqual([r['alias'] for r in pm.proxy_routes], ['r1'])
+        reload({'is_proxy_node': True, 'listen_on_aspect': 'b'})
+        self.assertEqual(pm.service_destination.aspects[-1], 'b'); self.assertEqual(pm.proxy_routes, [])
+class TestProxyEndToEnd(unittest.TestCase):
+    """client -> proxy node -> target on the simulated network, in virtual time."""
+    def setUp(self):
+        from prometheus_client import CollectorRegistry
+        from akita_ares.features.monitoring import MetricsMonitor
+        self.net = net = SimNetwork(seed=3); self.client, self.proxy, self.target = net.add_node("client"), net.add_node("proxy"), net.add_node("target")
+        net.connect(self.client, self.proxy, latency_s=0.05); net.connect(self.proxy, self.target, latency_s=0.2)
+        self.echo = self.target.serve("app", "echo", handler=lambda d: d.upper(), processing_s=0.1)
+        net.install(); self.addCleanup(net.uninstall)
+        self.mm = MetricsMonitor({'metrics_prefix': 'e2e'}, registry=CollectorRegistry()); self.reg = CircuitBreakerRegistry({'failure_threshold': 2})
+        self.node = proxying.ProxyManager({'is_proxy_node': True, 'listen_on_aspect': 'exit'}, rns_instance=self.proxy.rns, metrics_monitor=self.mm)
+        route = {'alias': 'r1', 'entry_destination_name': 'ares.proxy.exit', 'exit_node_identity_hash': self.proxy.identity.hexhash}
+        self.cli = proxying.ProxyManager({'proxy_routes': [route]}, rns_instance=self.client.rns, metrics_monitor=self.mm, breaker_registry=self.reg)
+        self.results = []; self.ids = []
+    def send(self, data, n=1, **kw):
+        cb = lambda d, e: self.results.append((d, e, self.net.clock.now()))
+        with self.net.clock.participant():  # hold virtual time until the whole burst is launched
+            for _ in range(n): self.net.spawn(lambda: self.ids.append(self.cli.send_via_proxy(self.echo.hexhash, data, response_callback=cb, **dict({'target_name': self.echo.name}, **kw))), node=self.client)
+        self.assertTrue(self.net.run_until_idle(10))
+    def test_round_trip_records_stages_and_cleans_up(self):
+        start = self.net.clock.now(); self.send(b"ping", n=5)
+        self.assertEqual([(d, e) for d, e, _ in self.results], [(b"PING", None)] * 5)
+        stats = self.mm.get_proxy_stage_stats()
+        self.assertAlmostEqual(stats['proxy_node_service']['proxy_to_target_rtt']['p50'], 0.5, delta=0.05)  # 2 x 0.2s + 0.1s processing
+        self.assertAlmostEqual(stats['r1']['client_proxy_network_rtt']['p50'], 0.1, delta=0.02)
+        self.assertLess(self.net.clock.now() - start, 2.0)
+        self.assertEqual(self.node.active_client_links, {}); self.assertEqual(self.node.pending_client_requests, {}); self.assertEqual(self.cli.pending_request_meta, {})
+        self.assertEqual(self.net.clock.callback_errors, 0)
+    def test_partitioned_proxy_times_out_in_virtual_time_and_trips_breaker(self):
+        self.net.update_link(self.client, self.proxy, loss=1.0)
+        t0 = time.monotonic(); start = self.net.clock.now(); self.send(b"ping", n=2, timeout_s=30)
+        self.assertEqual(self.ids, [None, None]); self.assertEqual(self.results, [])
+        self.assertAlmostEqual(self.net.clock.now() - start, 30.0, delta=0.01); self.assertLess(time.monotonic() - t0, 5.0)
+        self.assertFalse(self.reg.allow_request('proxy:r1'))
+    def test_node_drops_response_after_client_deadline(self):
+        self.send(b"ping", timeout_s=0.4)  # target answers after ~0.5s at the node
+        self.assertEqual(self.results, []); self.assertIsNotNone(self.ids[0])
+        self.assertEqual(self.node.pending_client_requests, {})
+    def test_no_timeout_waits_without_limit_and_sends_no_deadline(self):
+        envelopes = []; handle = self.node._handle_proxied_request_on_link
+        self.node._handle_proxied_request_on_link = lambda res, link: (envelopes.append(json.loads(res.data)), handle(res, link))
+        self.send(b"ping", timeout_s=None)
+        self.assertEqual([(d, e) for d, e, _ in self.results], [(b"PING", None)]); self.assertNotIn('deadline_ms', envelopes[0])
+    def test_target_name_is_required_and_must_match_the_hash(self):
+        self.send(b"ping", target_name=None); self.assertEqual(self.ids, [None])
+        self.send(b"ping", target_name='app.other'); self.assertEqual(len(self.results), 1)
+        self.assertIsNone(self.results[0][0]); self.assertIn('does not match', str(self.results[0][1])); self.assertEqual(self.node.pending_client_requests, {})
+    def test_unknown_proxy_identity_requests_path_and_waits_half_the_budget(self):
+        self.cli.update_config({'proxy_routes': [{'alias': 'r1', 'entry_destination_name': 'ares.proxy.exit', 'exit_node_identity_hash': 'cd' * 16}]})
+        start = self.net.clock.now(); self.send(b"ping", timeout_s=4)
+        self.assertEqual(self.ids, [None]); self.assertEqual(self.net.stats()['path_requests'], 1); self.assertAlmostEqual(self.net.clock.now() - start, 2.0, delta=0.01)
+    def test_trace_context_only_sent_for_sampled_requests(self):
+        from akita_ares.core.tracing import Tracer
+        path = os.path.join(tempfile.mkdtemp(), 'traces.jsonl'); self.node.tracer = mock.Mock(wraps=Tracer({'enabled': True, 'sample_rate': 1.0, 'file': path}))
+        self.cli.tracer = Tracer({'enabled': True, 'sample_rate': 0.0, 'file': path}); self.send(b"ping", n=3)
+        self.assertEqual(len(self.results), 3); self.node.tracer.start_span.assert_not_called()
+        self.cli.tracer.update_config({'enabled': True, 'sample_rate': 1.0, 'file': path}); self.send(b"ping")
+        self.assertEqual(self.node.tracer.start_span.call_count, 1); self.cli.tracer.shutdown(); self.node.tracer.shutdown()
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,147 @@
+#Akita Engineering
+import unittest, threading, time
+from unittest import mock
+from concurrent.futures import Future
+from akita_ares.features.request_retries import RetryManager, BatchOp, GLOBAL_RETRY_BUDGET_NAME
+from akita_ares.core.deadline import Deadline, DeadlineExceededException, current_deadline
+from akita_ares.core.circuit_breaker import CircuitBreakerRegistry, CircuitBreakerOpenException
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class Flaky:
+    def __init__(self, fail_times): self.fail_times = fail_times; self.calls = 0
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.fail_times: raise ValueError(f"fail {self.calls}")
+        return "ok"
+def make_rm(case, breaker_registry=None, **cfg):
+    """Fast, quiet RetryManager (shut down with the test); `cfg` overrides the defaults."""
+    base = {'default_max_retries': 3, 'default_delay_seconds': 0.001, 'default_jitter_max_seconds': 0, 'log_retries': False}
+    base.update(cfg); rm = RetryManager(base, breaker_registry=breaker_registry); case.addCleanup(rm.shutdown); return rm
+HEDGE_CFG = {'default_max_retries': 0, 'hedging_enabled': True, 'hedge_initial_delay_seconds': 0.02, 'hedge_min_samples': 1000}
+class TestRetryManager(unittest.TestCase):
+    def make(self, **cfg): return make_rm(self, **cfg)
+    def test_retries_until_success(self):
+        rm = self.make(); op = Flaky(2)
+        self.assertEqual(rm.exec_w_retry(op, op_name="flaky"), "ok"); self.assertEqual(op.calls, 3)
+        self.assertEqual(rm.get_stats()['successes_on_retry'], 1)
+    def test_exhausted_budget_fails_fast(self):
+        rm = self.make(retry_budget_max_tokens=1, retry_budget_min_per_second=0, global_retry_budget_min_per_second=0)
+        op = Flaky(10)
+        self.assertRaises(ValueError, rm.exec_w_retry, op, op_name="down")
+        self.assertEqual(op.calls, 2) # first attempt + the single budgeted retry
+        op2 = Flaky(10)
+        self.assertRaises(ValueError, rm.exec_w_retry, op2, op_name="down")
+        self.assertEqual(op2.calls, 1)
+        self.assertEqual(rm.get_stats()['budget_exhausted'], 2)
+    def test_global_budget_shared_across_ops(self):
+        rm = self.make(global_retry_budget_max_tokens=1, global_retry_budget_min_per_second=0)
+        self.assertRaises(ValueError, rm.exec_w_retry, Flaky(10), op_name="a")
+        op = Flaky(10); self.assertRaises(ValueError, rm.exec_w_retry, op, op_name="b"); self.assertEqual(op.calls, 1)
+        self.assertGreaterEqual(rm.get_budget_state()["b"], 1) # per-op token refunded when the global budget refuses
+    def test_budget_disabled(self):
+        rm = self.make(retry_budget_enabled=False, retry_budget_max_tokens=1, global_retry_budget_max_tokens=1)
+        op = Flaky(10); self.assertRaises(ValueError, rm.exec_w_retry, op, op_name="x"); self.assertEqual(op.calls, 4)
+        self.assertIn(GLOBAL_RETRY_BUDGET_NAME, rm.get_budget_state())
+    def test_per_op_budgets_are_bounded_lru(self):
+        from prometheus_client import CollectorRegistry
+        from akita_ares.features.monitoring import MetricsMonitor
+        mm = MetricsMonitor({'metrics_prefix': 'rb'}, registry=CollectorRegistry()); rm = self.make(max_tracked_operations=3); rm.metrics_monitor = mm
+        for name in ("a", "b", "c"): rm.exec_w_retry(lambda: "ok", op_name=name); time.sleep(0.002)
+        rm.exec_w_retry(lambda: "ok", op_name="a"); rm.exec_w_retry(lambda: "ok", op_name="d")
+        self.assertEqual(sorted(rm.op_retry_budgets), ["a", "c", "d"])
+        series = {s.labels['operation_name'] for m in mm.retry_budget_tokens.collect() for s in m.samples}
+        self.assertEqual(series, {"a", "c", "d", GLOBAL_RETRY_BUDGET_NAME})
+        rm.update_config(dict(rm.config, max_tracked_operations=1)); self.assertEqual(list(rm.op_retry_budgets), ["d"])
+    def test_latency_trackers_only_when_read_and_bounded(self):
+        rm = self.make(max_tracked_operations=2)
+        for name in ("a", "b", "c"): rm.exec_w_retry(Flaky(1), op_name=name)
+        self.assertEqual(rm.latency_trackers, {})  # no hedging, no deadline: nothing reads them
+        for name in ("a", "b", "c"): rm.exec_w_retry(Flaky(1), op_name=name, deadline=Deadline(5)); time.sleep(0.002)
+        self.assertEqual(sorted(rm.latency_trackers), ["b", "c"])
+class TestHedging(unittest.TestCase):
+    def make(self, **cfg): return make_rm(self, **dict(HEDGE_CFG, **cfg))
+    def test_fast_op_is_not_hedged(self):
+        rm = self.make(); self.assertEqual(rm.exec_w_retry(lambda: "ok", op_name="fast"), "ok")
+        self.assertEqual(rm.get_stats()['hedges_issued'], 0)
+    def test_hedge_wins_over_stalled_primary(self):
+        rm = self.make(); release = threading.Event(); calls = []
+        def op():
+            calls.append(1)
+            if len(calls) == 1: release.wait(2); return "slow"
+            return "fast"
+        t0 = time.monotonic(); self.assertEqual(rm.exec_w_retry(op, op_name="stall"), "fast")
+        self.assertLess(time.monotonic() - t0, 1); release.set()
+        self.assertEqual(rm.get_stats()['hedges_issued'], 1); self.assertEqual(rm.get_stats()['hedges_won'], 1)
+    def test_hedge_budget_caps_hedges(self):
+        rm = self.make(hedge_budget_ratio=0, hedge_budget_max_tokens=1)
+        op = lambda: time.sleep(0.05) or "ok"
+        for _ in range(3): rm.exec_w_retry(op, op_name="capped")
+        self.assertEqual(rm.get_stats()['hedges_issued'], 1)
+    def test_hedge_op_func_used_for_second_attempt(self):
+        rm = self.make(); release = threading.Event()
+        self.assertEqual(rm.exec_w_retry(lambda: release.wait(2) and "primary", op_name="alt", hedge_op_func=lambda: "alt_route"), "alt_route"); release.set()
+    def test_cancelled_primary_records_no_primary_latency(self):
+        rm = self.make(); rm.metrics_monitor = mm = mock.Mock(); queued = Future()  # a primary still waiting for a worker
+        submits = iter([lambda *a, **kw: queued, rm._submit])
+        with mock.patch.object(rm, '_submit', side_effect=lambda *a, **kw: next(submits)(*a, **kw)):
+            self.assertEqual(rm.exec_w_retry(lambda: "hedge", op_name="queued"), "hedge")
+        self.assertTrue(queued.cancelled()); self.assertEqual([c.args[1] for c in mm.record_hedge_latency.call_args_list], ['effective'])
+class TestDeadlines(unittest.TestCase):
+    def make(self): return make_rm(self, default_max_retries=5, default_delay_seconds=0.2, default_backoff_factor=1)
+    def test_retry_skipped_when_backoff_outlives_deadline(self):
+        rm = self.make(); op = Flaky(10); t0 = time.monotonic()
+        self.assertRaises(ValueError, rm.exec_w_retry, op, op_name="dl", deadline=Deadline(0.3))
+        self.assertEqual(op.calls, 2); self.assertLess(time.monotonic() - t0, 0.35); self.assertEqual(rm.get_stats()['deadline_exceeded'], 1)
+    def test_expired_deadline_never_calls_op(self):
+        rm = self.make(); op = Flaky(0)
+        self.assertRaises(DeadlineExceededException, rm.exec_w_retry, op, op_name="dl", deadline=Deadline(0)); self.assertEqual(op.calls, 0)
+    def test_attempt_timeout_shrunk_and_scope_visible(self):
+        rm = self.make(); seen = {}
+        def op(timeout=None): seen['timeout'] = timeout; seen['scope'] = current_deadline(); return "ok"
+        rm.exec_w_retry(op, op_name="dl", deadline=Deadline(2), attempt_timeout_s=30, timeout_kw='timeout')
+        self.assertLessEqual(seen['timeout'], 2); self.assertIsNotNone(seen['scope'])
+class TestBreakerIntegration(unittest.TestCase):
+    def test_open_breaker_fails_fast(self):
+        reg = CircuitBreakerRegistry({'failure_threshold': 2})
+        rm = make_rm(self, breaker_registry=reg, default_max_retries=5)
+        op = Flaky(100); self.assertRaises(CircuitBreakerOpenException, rm.exec_w_retry, op, op_name="d", breaker_key="abc")
+        self.assertEqual(op.calls, 2)
+        op2 = Flaky(0); self.assertRaises(CircuitBreakerOpenException, rm.exec_w_retry, op2, op_name="d", breaker_key="abc"); self.assertEqual(op2.calls, 0)
+        self.assertEqual(rm.exec_w_retry(op2, op_name="d", breaker_key="other"), "ok")
+class TestExecMany(unittest.TestCase):
+    def make(self, **cfg): return make_rm(self, **dict({'default_max_retries': 2}, **cfg))
+    def test_streams_all_results_with_retries(self):
+        rm = self.make(); stats = {}
+        ops = [Flaky(1), BatchOp(lambda x: x * 2, (21,)), Flaky(5)]
+        results = {r.index: r for r in rm.exec_many(ops, max_concurrency=2, op_name="ingest", batch_stats=stats)}
+        self.assertEqual(results[0].result, "ok"); self.assertEqual(results[0].attempts, 2)
+        self.assertEqual(results[1].result, 42); self.assertIsInstance(results[2].error, ValueError)
+        self.assertEqual((stats['items'], stats['successes'], stats['failures'], stats['retries']), (3, 2, 1, 3))
+    def test_concurrency_is_bounded_and_input_lazy(self):
+        rm = self.make(); lock = threading.Lock(); state = {'now': 0, 'peak': 0}; pulled = []
+        def op():
+            with lock: state['now'] += 1; state['peak'] = max(state['peak'], state['now'])
+            time.sleep(0.01)
+            with lock: state['now'] -= 1
+        def gen():
+            for i in range(20): pulled.append(i); yield op
+        stream = rm.exec_many(gen(), max_concurrency=3); next(stream)
+        self.assertLessEqual(len(pulled), 4)
+        list(stream); self.assertLessEqual(state['peak'], 3); self.assertEqual(len(pulled), 20)
+    def test_batches_reuse_one_pool(self):
+        rm = self.make(); before = threading.active_count()
+        for _ in range(50): list(rm.exec_many([lambda: "ok"] * 8, max_concurrency=4))
+        self.assertLessEqual(threading.active_count() - before, rm.batch_max_concurrency)
+        self.assertLessEqual(len(rm._stats._cells), rm.batch_max_concurrency + 1)
+    def test_concurrent_batches_with_different_concurrency(self):
+        rm = self.make(batch_max_concurrency=2); op = lambda: time.sleep(0.005) or "ok"
+        small = rm.exec_many([op] * 10, max_concurrency=2); first = next(small)  # holds the 2-worker pool
+        big = list(rm.exec_many([op] * 10, max_concurrency=8))  # needs a bigger pool
+        rest = [first] + list(small)
+        for results in (rest, big): self.assertEqual(sorted(r.index for r in results), list(range(10))); self.assertTrue(all(r.error is None for r in results))
+    def test_open_breaker_fails_items_fast(self):
+        reg = CircuitBreakerRegistry({'failure_threshold': 1}); reg.record_failure("dead")
+        rm = make_rm(self, breaker_registry=reg); op = Flaky(0)
+        [res] = list(rm.exec_many([BatchOp(op, breaker_key="dead")]))
+        self.assertIsInstance(res.error, CircuitBreakerOpenException); self.assertEqual(op.calls, 0)
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1 @@
+#Akira Engineering
@@ -0,0 +1,80 @@
+#Akita Engineering
+import unittest, time
+from akita_ares.sim import SimClock, SimNetwork
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class TestSimClock(unittest.TestCase):
+    def setUp(self): self.clock = SimClock(start=0.0); self.clock.start(); self.addCleanup(self.clock.stop)
+    def test_timers_fire_in_virtual_order_without_wall_time(self):
+        fired = []
+        for due in (3600.0, 5.0, 5.0, 60.0): self.clock.call_at(due, lambda d=due: fired.append((d, self.clock.now())))
+        t0 = time.monotonic(); self.assertTrue(self.clock.run_until_idle(5)); self.assertLess(time.monotonic() - t0, 1.0)
+        self.assertEqual(fired, [(5.0, 5.0), (5.0, 5.0), (60.0, 60.0), (3600.0, 3600.0)])
+    def test_participant_waits_measure_virtual_time(self):
+        out = {}; ev = self.clock.Event()
+        def waiter():
+            out['timed_out'] = ev.wait(10.0); out['t1'] = self.clock.now()
+            self.clock.call_later(2.0, ev.set); out['set'] = ev.wait(30.0); out['t2'] = self.clock.now()
+        self.clock.spawn(waiter); self.assertTrue(self.clock.run_until_idle(5))
+        self.assertEqual(out, {'timed_out': False, 't1': 10.0, 'set': True, 't2': 12.0})
+    def test_clock_does_not_pass_a_running_participant(self):
+        seen = []
+        self.clock.call_at(1.0, lambda: seen.append('timer'))
+        with self.clock.participant():
+            time.sleep(0.05); seen.append(('busy', self.clock.now()))
+        self.assertTrue(self.clock.run_until_idle(5)); self.assertEqual(seen, [('busy', 0.0), 'timer'])
+class TestSimNetwork(unittest.TestCase):
+    def build(self, seed=1, **hop):
+        net = SimNetwork(seed=seed); a, b, c = net.add_node("a"), net.add_node("b"), net.add_node("c")
+        net.connect(a, b, **dict({'latency_s': 0.1}, **hop)); net.connect(b, c, latency_s=0.1); net.connect(a, c, latency_s=0.5)
+        return net, a, b, c
+    def test_routes_and_paths_follow_latency(self):
+        net, a, b, c = self.build()
+        self.assertEqual(net.route(a, c), ['a', 'b', 'c']); self.assertEqual([p.path_id for p in net.paths(a, c)], ['a>b>c', 'a>c'])
+        net.update_link(a, b, loss=1.0); self.assertEqual(net.route(a, c), ['a', 'c'])
+    def test_packet_mtu_bandwidth_and_response(self):
+        net, a, b, c = self.build(bandwidth_bps=8000, mtu=200); got = []
+        dest = c.serve("svc", handler=lambda d: d[::-1], processing_s=0.5)
+        with net.installed():
+            out = net.Destination(net.Identity.recall(dest.hash), net.Destination.OUT, net.Destination.SINGLE, "svc"); self.assertEqual(out.hash, dest.hash)
+            pkt = net.Packet(out, b"x" * 81)  # 100 bytes on the wire: 0.1s at 8 kbit/s on a<->b, each way
+            pkt.set_response_callback(lambda r: got.append((r.data, r.source_hash, round(net.clock.now() - start, 6))))
+            with net.clock.participant(a):
+                with self.assertRaises(IOError): net.Packet(out, b"x" * 300).send()
+                start = net.clock.now(); pkt.send()
+            self.assertTrue(net.run_until_idle(5))
+        self.assertEqual(got, [(b"x" * 81, dest.hash, round((0.1 + 0.1) + 0.1 + 0.5 + 0.1 + (0.1 + 0.1), 6))])
+    def test_lossy_hop_is_reproducible_and_resources_are_reliable(self):
+        def run(seed):
+            net, a, b, c = self.build(seed=seed, loss=0.3); got = []
+            with net.installed():
+                dest = b.serve("svc", handler=lambda d: None)
+                def client():
+                    up = net.clock.Event(); out = net.Destination(net.Identity.recall(dest.hash), net.Destination.OUT, net.Destination.SINGLE, "svc")
+                    link = net.Link(out, established_callback=lambda l: up.set())
+                    if up.wait(5): link.send(b"y" * 5000)
+                dest.set_link_established_callback(lambda l: l.set_resource_callback(lambda r: got.append((len(r.data), net.clock.now()))))
+                for _ in range(10): net.spawn(client, node=a); net.run_until_idle(5)
+                return got, net.stats()['lost']
+        first, lost = run(7); self.assertEqual(run(7), (first, lost)); self.assertGreater(lost, 0)
+        self.assertTrue(all(size == 5000 for size, _ in first)); self.assertLess(len(first), 10)  # some handshakes were lost; every transfer completed
+    def test_path_selector_probes_simulated_paths(self):
+        from akita_ares.features.path_selection import PathSelector
+        net, a, b, c = self.build(); dest = c.serve("svc", handler=lambda d: None)
+        with net.installed():
+            rtt, hops = (PathSelector({'default_metric': m}, rns_instance=a.rns) for m in ('rtt', 'hops'))
+            with net.clock.participant(a): best_rtt, best_hops = rtt.get_best_path(dest.hexhash), hops.get_best_path(dest.hexhash)
+        self.assertEqual((best_rtt.path_id, best_hops.path_id), ('a>b>c', 'a>c'))
+        self.assertAlmostEqual(rtt.path_metrics_cache['a>b>c']['rtt']['value'], 0.4)
+    def test_stand_ins_take_reticulum_signatures(self):
+        net, a, b, c = self.build(); dest = c.serve("app", "svc", handler=lambda d: None)
+        with net.installed():
+            self.assertIs(net.Identity.recall(dest.hash), c.identity); self.assertIs(net.Identity.recall(c.identity.hash, from_identity_hash=True), c.identity)
+            self.assertIsNone(net.Identity.recall(b"\0" * 16)); self.assertFalse(hasattr(net.Identity, 'request')); self.assertFalse(hasattr(net.Destination, 'ummutable'))
+            self.assertEqual(net.Destination.hash_from_name_and_identity("app.svc", c.identity.hash), dest.hash); self.assertEqual(dest.hexhash, dest.hash.hex())
+            with self.assertRaises(TypeError): net.Destination(dest.hash, net.Destination.OUT)
+            with net.clock.participant(a):
+                self.assertTrue(net.Transport.has_path(dest.hash)); net.Transport.request_path(dest.hash)
+                with self.assertRaises(TypeError): net.Link(dest, a.identity, _peer=None)
+        self.assertEqual(net.stats()['path_requests'], 1)
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,31 @@
+#Akita Engineering
+import unittest, os, json, tempfile, subprocess, sys, threading, time
+from unittest import mock
+from akita_ares import main
+from akita_ares.cli.main_cli import parse_args
+from akita_ares.core.logger import setup_logging
+setup_logging(level='CRITICAL', console_output=False, log_file=None)
+class TestLazyStartup(unittest.TestCase):
+    def test_main_import_defers_heavy_dependencies(self):
+        code = "import sys, akita_ares.main; print(sorted(m for m in ('jsonschema', 'prometheus_client', 'RNS', 'akita_ares.features.monitoring') if m in sys.modules))"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.path.join(os.path.dirname(__file__), ".."))
+        self.assertEqual(out.stdout.strip().splitlines()[-1], "[]")
+    def test_version_flag_parses_without_command(self):
+        with self.assertRaises(SystemExit) as cm: parse_args(['--version'])
+        self.assertEqual(cm.exception.code, 0); self.assertEqual(parse_args(['--loglevel', 'DEBUG']).command, 'start')
+class TestARESAppRun(unittest.TestCase):
+    def test_run_uses_scheduler_and_stops_immediately(self):
+        cfg = {'logging': {'console_output': False, 'file': None}, 'monitoring': {'enabled': False}, 'path_selection': {'enabled': True}}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f: json.dump(cfg, f)
+        self.addCleanup(os.remove, f.name)
+        with mock.patch.object(main.ARESApp, '_setup_signal_handlers'):  # keep the test runner's SIGINT/SIGTERM/SIGHUP handlers
+            app = main.ARESApp(parse_args(['--config', f.name, '--schema', f.name + '.none', '--loglevel', 'CRITICAL']))
+        self.assertEqual(app.scheduler.task_names(), ['circuit_breakers.evict_idle', 'path_selection.refresh'])
+        with mock.patch.object(main, 'RNS_AVAILABLE', True):  # let `run` proceed without Reticulum installed
+            t = threading.Thread(target=app.run); t.start()
+            for _ in range(100):
+                if app._running: break
+                time.sleep(0.01)
+            t0 = time.monotonic(); app.request_stop(); t.join(2); self.assertFalse(t.is_alive()); self.assertLess(time.monotonic() - t0, 1.0)
+        self.assertEqual(app.scheduler.task_names(), ['circuit_breakers.evict_idle'])  # PathSelector.stop removed its task
+if __name__ == '__main__': unittest.main()